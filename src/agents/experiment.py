@@ -2,19 +2,27 @@
 
 import hashlib
 import json
+import math
 import os
 import random
 from pathlib import Path
+from typing import Optional
 
 import torch
 import yaml
 
+from ..compute.heartbeat import Heartbeat, RunCancelled, heartbeat_path
+from ..compute.memory_planner import (
+    DEFAULT_SAFETY, GIB, calibrate, estimate_peak_gb, load_calibration_records,
+    model_spec, plan_batch,
+)
+from ..eval.sequential import AMBIGUOUS, LOSS, sequential_verdict
 from ..utils.log import get_logger
 
 LOGGER = get_logger(__name__)
 
 
-def run_experiment(project_dir: Path, repo_root: Path) -> None:
+def run_experiment(project_dir: Path, repo_root: Path, heartbeat: Heartbeat = None) -> None:
     plan_dir = project_dir / "01_plan"
     config = yaml.safe_load((plan_dir / "config.yaml").read_text())
 
@@ -23,72 +31,256 @@ def run_experiment(project_dir: Path, repo_root: Path) -> None:
     runs_dir = project_dir / "02_exp" / "runs"
     runs_dir.mkdir(parents=True, exist_ok=True)
 
+    seq_cfg = config.get("sequential", {})
+    min_seeds = seq_cfg.get("min_seeds", len(seeds))
+    max_seeds = max(seq_cfg.get("max_seeds", len(seeds)), min_seeds)
+    seed_pool = _seed_pool(seeds, max_seeds)
+    early_cfg = config.get("early_stop", {})
+    if heartbeat is None:
+        heartbeat = Heartbeat(heartbeat_path(project_dir), project_id=project_dir.name)
+
+    values = {"baseline": [], "treatment": []}
+    baseline_rungs = {}  # rung fraction -> baseline mini-eval rates at that rung
+    looks = []
     run_idx = 0
-    for group_name in ("baseline", "treatment"):
-        cfg = config.get(group_name, {})
-        cfg_hash = hashlib.sha256(
-            json.dumps(cfg, sort_keys=True).encode()
-        ).hexdigest()[:16]
-
-        for seed in seeds:
+    for pair_idx, seed in enumerate(seed_pool, 1):
+        dominated = False
+        for group_name in ("baseline", "treatment"):
             run_idx += 1
-            run_id = f"run_{run_idx:04d}"
-            run_dir = runs_dir / run_id
-            run_dir.mkdir(parents=True, exist_ok=True)
-
-            try:
-                metrics = _train_and_evaluate(base_model, cfg, seed, run_dir)
-                status = "SUCCESS"
-            except Exception as exc:
-                LOGGER.error("run %s failed: %s", run_id, exc, exc_info=True)
-                metrics = {
-                    "element_accuracy": 0.0,
-                    "action_f1": 0.0,
-                    "step_success_rate": 0.0,
-                    "error": str(exc),
-                }
-                status = "FAIL"
-
-            result = {
-                "run_id": run_id,
-                "group": group_name,
-                "model": base_model,
-                "primary_metric": {
-                    "name": config.get("primary_metric", "step_success_rate"),
-                    "value": metrics.get("step_success_rate", 0.0),
-                    "higher_is_better": True,
-                },
-                "secondary_metrics": {
-                    "element_accuracy": metrics.get("element_accuracy", 0.0),
-                    "action_f1": metrics.get("action_f1", 0.0),
-                    "step_success_rate": metrics.get("step_success_rate", 0.0),
-                },
-                "seed": seed,
-                "config_hash": f"sha256:{cfg_hash}",
-                "config": cfg,
-                "status": status,
-            }
-
-            (run_dir / "metrics.json").write_text(json.dumps(result, indent=2))
-            LOGGER.info(
-                "%s group=%s seed=%d step_sr=%.4f elem_acc=%.4f action_f1=%.4f (%s)",
-                run_id, group_name, seed,
-                metrics.get("step_success_rate", 0),
-                metrics.get("element_accuracy", 0),
-                metrics.get("action_f1", 0),
-                status,
+            controller = None
+            if early_cfg.get("enabled") and (group_name == "baseline" or baseline_rungs):
+                # baseline runs only record their rungs; treatment runs are
+                # compared with the baseline at the same fraction of training
+                controller = DominanceController(
+                    baseline_rungs=(None if group_name == "baseline" else
+                                    {r: sum(v) / len(v) for r, v in baseline_rungs.items()}),
+                    rungs=early_cfg.get("rungs", DominanceController.DEFAULT_RUNGS),
+                    z=early_cfg.get("z", 1.645),
+                    mini_eval_samples=early_cfg.get("mini_eval_samples", 64),
+                )
+            result = _execute_run(
+                config, group_name, base_model, seed, runs_dir / f"run_{run_idx:04d}",
+                controller=controller, heartbeat=heartbeat,
             )
-
+            if result["status"] == "SUCCESS":
+                values[group_name].append(result["primary_metric"]["value"])
+                if group_name == "baseline":
+                    for rung in result.get("rungs", []):
+                        baseline_rungs.setdefault(rung["rung"], []).append(
+                            rung["step_success_rate"])
+            dominated = dominated or result["status"] == "ABORTED"
+
+        if dominated:
+            looks.append({
+                "verdict": LOSS,
+                "reason": "treatment run aborted as dominated by baseline",
+                "seeds_run": pair_idx,
+                "n_baseline": len(values["baseline"]),
+                "n_treatment": len(values["treatment"]),
+            })
+            LOGGER.info("treatment dominated after %d seeds, not allocating more", pair_idx)
+            break
+
+        if pair_idx < min_seeds:
+            continue
+
+        look = sequential_verdict(
+            values["baseline"],
+            values["treatment"],
+            alpha=seq_cfg.get("alpha", 0.05),
+            max_looks=max_seeds - min_seeds + 1,
+            min_effect=seq_cfg.get("min_effect", 0.0),
+        )
+        look["seeds_run"] = pair_idx
+        looks.append(look)
+        LOGGER.info(
+            "sequential look after %d seeds: verdict=%s diff=%+.4f ci=[%s, %s]",
+            pair_idx, look["verdict"], look["diff"], look["ci_low"], look["ci_high"],
+        )
+        if look["verdict"] != AMBIGUOUS:
+            break
+        if not values["baseline"] or not values["treatment"]:
+            LOGGER.warning("a group has no successful runs, not allocating more seeds")
+            break
+
+    if looks:
+        (project_dir / "02_exp" / "sequential.json").write_text(json.dumps(
+            {"min_seeds": min_seeds, "max_seeds": max_seeds, "looks": looks}, indent=2
+        ))
     LOGGER.info("experiment done: %d runs in %s", run_idx, runs_dir)
 
 
+def _seed_pool(seeds: list, max_seeds: int) -> list:
+    """Configured seeds first, then deterministic extra seeds up to max_seeds."""
+    pool = list(seeds[:max_seeds])
+    extra = max(pool, default=0)
+    while len(pool) < max_seeds:
+        extra += 101
+        pool.append(extra)
+    return pool
+
+
+def _execute_run(
+    config: dict,
+    group_name: str,
+    base_model: str,
+    seed: int,
+    run_dir: Path,
+    controller: "DominanceController" = None,
+    heartbeat: Heartbeat = None,
+) -> dict:
+    """Train + evaluate one (group, seed) and write its metrics.json."""
+    cfg = config.get(group_name, {})
+    cfg_hash = hashlib.sha256(
+        json.dumps(cfg, sort_keys=True).encode()
+    ).hexdigest()[:16]
+    run_id = run_dir.name
+    run_dir.mkdir(parents=True, exist_ok=True)
+    stale_failure = run_dir / "failure.json"
+    if stale_failure.exists():
+        stale_failure.unlink()
+    if heartbeat is not None:
+        heartbeat.check_cancelled()
+        heartbeat.beat(
+            phase="starting_run", run_id=run_id, group=group_name, seed=seed,
+            step=None, max_steps=None, loss=None, tokens_per_sec=None,
+            eval_done=None, eval_total=None,
+        )
+
+    try:
+        metrics = _train_and_evaluate(base_model, cfg, seed, run_dir, controller, heartbeat)
+        status = "ABORTED" if "abort_reason" in metrics else "SUCCESS"
+    except RunCancelled:
+        raise
+    except Exception as exc:
+        LOGGER.error("run %s failed: %s", run_id, exc, exc_info=True)
+        metrics = {
+            "element_accuracy": 0.0,
+            "action_f1": 0.0,
+            "step_success_rate": 0.0,
+            "error": str(exc),
+        }
+        if getattr(exc, "record", None):
+            metrics["failure"] = exc.record
+        status = "FAIL"
+
+    result = {
+        "run_id": run_id,
+        "group": group_name,
+        "model": base_model,
+        "primary_metric": {
+            "name": config.get("primary_metric", "step_success_rate"),
+            "value": metrics.get("step_success_rate", 0.0),
+            "higher_is_better": True,
+        },
+        "secondary_metrics": {
+            "element_accuracy": metrics.get("element_accuracy", 0.0),
+            "action_f1": metrics.get("action_f1", 0.0),
+            "step_success_rate": metrics.get("step_success_rate", 0.0),
+        },
+        "seed": seed,
+        "config_hash": f"sha256:{cfg_hash}",
+        "config": cfg,
+        "status": status,
+    }
+    if status == "ABORTED":
+        result["abort_reason"] = metrics["abort_reason"]
+    if controller is not None and controller.history:
+        result["rungs"] = controller.history
+    if "failure" in metrics:
+        result["failure"] = metrics["failure"]
+    if "memory" in metrics:
+        result["memory"] = metrics["memory"]
+
+    (run_dir / "metrics.json").write_text(json.dumps(result, indent=2))
+    LOGGER.info(
+        "%s group=%s seed=%d step_sr=%.4f elem_acc=%.4f action_f1=%.4f (%s)",
+        run_id, group_name, seed,
+        metrics.get("step_success_rate", 0),
+        metrics.get("element_accuracy", 0),
+        metrics.get("action_f1", 0),
+        status,
+    )
+    return result
+
+
+class DominanceController:
+    """Successive-halving style early stop for treatment runs.
+
+    At each rung (a fraction of total training steps) the trainer callback runs
+    a mini-eval on a fixed subset of eval examples.  step_success_rate is a
+    proportion, so a one-sided Wilson upper bound is used: if even the
+    optimistic estimate falls below the baseline's mean at the same rung, the
+    run is dominated and training stops.  Baseline runs get a controller
+    without baseline_rungs, which only records its rungs (history).
+    """
+
+    DEFAULT_RUNGS = (0.25, 0.5, 0.75)
+
+    def __init__(
+        self,
+        baseline_rungs: Optional[dict] = None,
+        rungs: tuple = DEFAULT_RUNGS,
+        z: float = 1.645,
+        mini_eval_samples: int = 64,
+    ):
+        self.baseline_rungs = baseline_rungs  # rung fraction -> baseline mean
+        self.rungs = tuple(sorted(rungs))
+        self.z = z
+        self.mini_eval_samples = mini_eval_samples
+        self.history = []
+        self.last_metrics = {}
+        self.abort_reason = None
+        self._step_rung = {}
+
+    def rung_steps(self, max_steps: int) -> set:
+        self._step_rung = {max(1, int(max_steps * r)): r for r in self.rungs if 0 < r < 1}
+        return set(self._step_rung)
+
+    def upper_bound(self, rate: float, n: int) -> float:
+        if n <= 0:
+            return 1.0
+        z2 = self.z ** 2
+        centre = rate + z2 / (2 * n)
+        margin = self.z * math.sqrt(rate * (1 - rate) / n + z2 / (4 * n * n))
+        return min(1.0, (centre + margin) / (1 + z2 / n))
+
+    def observe(self, step: int, metrics: dict) -> bool:
+        """Record a rung result. Returns True if the run should stop."""
+        rate = metrics.get("step_success_rate", 0.0)
+        ucb = self.upper_bound(rate, metrics.get("n_samples", 0))
+        rung = self._step_rung.get(step)
+        self.last_metrics = metrics
+        self.history.append({"rung": rung, "step": step, "step_success_rate": rate,
+                             "ucb": round(ucb, 4)})
+        baseline = (self.baseline_rungs or {}).get(rung)
+        LOGGER.info("rung %s at step %d: step_sr=%.4f ucb=%.4f baseline=%s",
+                    rung, step, rate, ucb, "-" if baseline is None else f"{baseline:.4f}")
+        if baseline is not None and ucb < baseline:
+            self.abort_reason = (
+                f"dominated at step {step}: step_success_rate upper bound {ucb:.4f} "
+                f"< baseline mean {baseline:.4f} at rung {rung}"
+            )
+            return True
+        return False
+
+
 def _train_and_evaluate(
     base_model: str,
     cfg: dict,
     seed: int,
     run_dir: Path,
+    controller: "DominanceController" = None,
+    heartbeat: Heartbeat = None,
+    load_model=None,
 ) -> dict:
-    """Run one training + evaluation cycle."""
+    """Run one training + evaluation cycle.
+
+    With a DominanceController the run may stop at a rung; the partial
+    mini-eval metrics are then returned together with an abort_reason.
+    `load_model(base_model, cfg, seed)` replaces the real model loader
+    (preflight uses a tiny random model).
+    """
     random.seed(seed)
     torch.manual_seed(seed)
 
@@ -100,6 +292,7 @@ def _train_and_evaluate(
     augmentation = cfg.get("augmentation", "none")
     data_cfg = cfg.get("data", {})
 
+    _beat(heartbeat, phase="loading_data")
     data = load_mind2web(
         data_processing=data_processing,
         prompt_design=prompt_design,
@@ -113,11 +306,31 @@ def _train_and_evaluate(
     LOGGER.info("train=%d examples (after augmentation), eval=%d",
                 len(train_examples), len(eval_examples))
 
-    model, tokenizer = _load_model_with_lora(base_model, cfg, seed)
-
-    _finetune(model, tokenizer, train_examples, cfg, seed, run_dir)
-
-    metrics = run_model_evaluation(model, tokenizer, eval_examples)
+    _beat(heartbeat, phase="loading_model")
+    model, tokenizer = (load_model or _load_model_with_lora)(base_model, cfg, seed)
+
+    callbacks = []
+    if heartbeat is not None:
+        from .train_callbacks import ProgressCallback
+        callbacks.append(ProgressCallback(heartbeat))
+    if controller is not None:
+        from .train_callbacks import DominanceCallback
+        mini_eval = eval_examples[:controller.mini_eval_samples]
+        callbacks.append(DominanceCallback(controller, model, tokenizer, mini_eval))
+
+    memory = _finetune(model, tokenizer, train_examples, cfg, seed, run_dir, callbacks=callbacks)
+
+    if controller is not None and controller.abort_reason:
+        metrics = dict(controller.last_metrics)
+        metrics["abort_reason"] = controller.abort_reason
+    else:
+        _beat(heartbeat, phase="evaluating", eval_done=0, eval_total=len(eval_examples))
+        metrics = run_model_evaluation(
+            model, tokenizer, eval_examples,
+            on_progress=lambda done, total: _beat(heartbeat, eval_done=done, eval_total=total),
+        )
+    if memory:
+        metrics["memory"] = memory
 
     del model
     torch.cuda.empty_cache()
@@ -125,10 +338,15 @@ def _train_and_evaluate(
     return metrics
 
 
+def _beat(heartbeat: Heartbeat, **fields) -> None:
+    if heartbeat is not None:
+        heartbeat.check_cancelled()
+        heartbeat.beat(**fields)
+
+
 def _load_model_with_lora(base_model: str, cfg: dict, seed: int):
     """Load base model and apply LoRA adapter."""
     from transformers import AutoModelForCausalLM, AutoTokenizer
-    from peft import LoraConfig, get_peft_model
 
     hf_token = os.environ.get("HF_TOKEN")
 
@@ -145,12 +363,18 @@ def _load_model_with_lora(base_model: str, cfg: dict, seed: int):
         trust_remote_code=True,
     )
 
-    lora_cfg = cfg.get("lora", {})
     model_config_name = cfg.get("model_config", "lora_r16")
-
     if "qlora" in model_config_name.lower():
         LOGGER.info("using QLoRA 4-bit quantization")
 
+    return _apply_lora(model, cfg), tokenizer
+
+
+def _apply_lora(model, cfg: dict):
+    """Wrap model with the LoRA adapter described by cfg["lora"]."""
+    from peft import LoraConfig, get_peft_model
+
+    lora_cfg = cfg.get("lora", {})
     lora_config = LoraConfig(
         r=lora_cfg.get("rank", 16),
         lora_alpha=lora_cfg.get("alpha", 32),
@@ -165,14 +389,25 @@ def _load_model_with_lora(base_model: str, cfg: dict, seed: int):
     total = sum(p.numel() for p in model.parameters())
     LOGGER.info("LoRA applied: trainable=%d / total=%d (%.2f%%)",
                 trainable, total, 100.0 * trainable / total)
+    return model
 
-    return model, tokenizer
 
+def _finetune(
+    model,
+    tokenizer,
+    train_examples: list,
+    cfg: dict,
+    seed: int,
+    run_dir: Path,
+    callbacks: list = None,
+) -> dict:
+    """Fine-tune model on training examples using SFTTrainer.
 
-def _finetune(model, tokenizer, train_examples: list, cfg: dict, seed: int, run_dir: Path):
-    """Fine-tune model on training examples using SFTTrainer."""
+    Returns the memory record (batch plan inputs + observed peak) on GPU.
+    """
     from trl import SFTTrainer, SFTConfig, DataCollatorForCompletionOnlyLM
     from datasets import Dataset
+    from .train_callbacks import DivergenceCallback, TrainingDivergedError
 
     train_cfg = cfg.get("train", {})
 
@@ -187,16 +422,21 @@ def _finetune(model, tokenizer, train_examples: list, cfg: dict, seed: int, run_
     ds = ds.map(_format_for_sft)
 
     output_dir = str(run_dir / "checkpoints")
+    batch, grad_accum, memory = _plan_batch(model, cfg, run_dir)
 
     training_args = SFTConfig(
         output_dir=output_dir,
         num_train_epochs=train_cfg.get("num_train_epochs", 3),
-        per_device_train_batch_size=train_cfg.get("per_device_train_batch_size", 4),
-        gradient_accumulation_steps=train_cfg.get("gradient_accumulation_steps", 4),
+        max_steps=train_cfg.get("max_steps", -1),
+        per_device_train_batch_size=batch,
+        gradient_accumulation_steps=grad_accum,
         learning_rate=train_cfg.get("learning_rate", 2e-5),
         warmup_ratio=train_cfg.get("warmup_ratio", 0.1),
         max_seq_length=train_cfg.get("max_seq_length", 2048),
-        logging_steps=10,
+        max_grad_norm=train_cfg.get("max_grad_norm", 1.0),
+        logging_steps=train_cfg.get("logging_steps", 5),
+        logging_nan_inf_filter=False,
+        include_num_input_tokens_seen=True,
         save_strategy="no",
         bf16=torch.cuda.is_available(),
         seed=seed,
@@ -204,11 +444,22 @@ def _finetune(model, tokenizer, train_examples: list, cfg: dict, seed: int, run_
         dataset_text_field="text",
     )
 
+    div_cfg = cfg.get("divergence", {})
+    divergence = DivergenceCallback(
+        run_dir,
+        spike_factor=div_cfg.get("spike_factor", 4.0),
+        patience=div_cfg.get("patience", 2),
+        warmup_logs=div_cfg.get("warmup_logs", 3),
+        max_grad_norm_seen=div_cfg.get("max_grad_norm_seen", 1000.0),
+        min_loss_delta=div_cfg.get("min_loss_delta", 1.0),
+    )
+
     trainer = SFTTrainer(
         model=model,
         args=training_args,
         train_dataset=ds,
         processing_class=tokenizer,
+        callbacks=[divergence] + list(callbacks or []),
     )
 
     LOGGER.info("starting fine-tuning: epochs=%d, lr=%s, batch=%d, seq_len=%d",
@@ -217,5 +468,74 @@ def _finetune(model, tokenizer, train_examples: list, cfg: dict, seed: int, run_
                 training_args.per_device_train_batch_size,
                 training_args.max_seq_length)
 
+    if memory is not None:
+        torch.cuda.reset_peak_memory_stats()
     trainer.train()
+    if divergence.failure:
+        raise TrainingDivergedError(divergence.failure)
     LOGGER.info("fine-tuning complete")
+
+    if memory is not None:
+        memory["peak_gb"] = round(torch.cuda.max_memory_allocated() / GIB, 3)
+        LOGGER.info("peak memory %.2f GiB (estimated %.2f GiB)",
+                    memory["peak_gb"], memory["estimated_peak_gb"])
+    return memory
+
+
+def _plan_batch(model, cfg: dict, run_dir: Path) -> tuple:
+    """Pick per-device batch / grad accumulation that fit in GPU memory.
+
+    The effective batch from the config is preserved.  Without CUDA, or with
+    train.auto_batch disabled, the configured values are used unchanged.
+    """
+    train_cfg = cfg.get("train", {})
+    lora_cfg = cfg.get("lora", {})
+    batch = train_cfg.get("per_device_train_batch_size", 4)
+    grad_accum = train_cfg.get("gradient_accumulation_steps", 4)
+    if not torch.cuda.is_available():
+        return batch, grad_accum, None
+
+    hf_config = model.config.to_dict()
+    n_params = sum(p.numel() for p in model.parameters())
+    record = {
+        "model": getattr(model.config, "_name_or_path", ""),
+        "hf_config": {k: hf_config[k] for k in (
+            "hidden_size", "num_hidden_layers", "vocab_size", "intermediate_size",
+            "num_attention_heads", "num_key_value_heads", "head_dim",
+        ) if k in hf_config},
+        "n_params": n_params,
+        "static_gb": round(torch.cuda.memory_allocated() / GIB, 3),
+        "seq_len": train_cfg.get("max_seq_length", 2048),
+        "rank": lora_cfg.get("rank", 16),
+        "target_modules": lora_cfg.get("target_modules", ["q_proj", "v_proj", "k_proj", "o_proj"]),
+        "quantized_4bit": "qlora" in cfg.get("model_config", "").lower(),
+    }
+
+    if train_cfg.get("auto_batch", True):
+        gpu_gb = torch.cuda.get_device_properties(0).total_memory / GIB
+        # run_dir = projects/<id>/02_exp/runs/<run>; calibrate on every project
+        calibration = calibrate(load_calibration_records(run_dir.parents[3]))
+        plan = plan_batch(
+            model_spec(record["model"], record["hf_config"], n_params),
+            gpu_gb, batch * grad_accum, record["seq_len"], record["rank"],
+            record["target_modules"], record["quantized_4bit"], calibration,
+            train_cfg.get("memory_safety", DEFAULT_SAFETY), record["static_gb"],
+        )
+        if not plan.fits:
+            LOGGER.warning("no batch fits in %.0f GiB by estimate (%.1f GiB at batch=1)",
+                           gpu_gb, plan.estimated_peak_gb)
+        LOGGER.info("batch plan: batch=%d x accum=%d (was %d x %d), est=%.1f/%.0f GiB, cal=%.2f",
+                    plan.per_device_train_batch_size, plan.gradient_accumulation_steps,
+                    batch, grad_accum, plan.estimated_peak_gb, gpu_gb, calibration)
+        batch, grad_accum = plan.per_device_train_batch_size, plan.gradient_accumulation_steps
+        record["estimated_peak_gb"] = plan.estimated_peak_gb
+    else:
+        record["estimated_peak_gb"] = estimate_peak_gb(
+            model_spec(record["model"], record["hf_config"], n_params),
+            batch, record["seq_len"], record["rank"], record["target_modules"],
+            record["quantized_4bit"], static_gb=record["static_gb"],
+        )["total_gb"]
+
+    record["batch"] = batch
+    record["gradient_accumulation_steps"] = grad_accum
+    return batch, grad_accum, record
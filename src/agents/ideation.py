@@ -35,7 +35,7 @@ def run_ideation(project_dir: Path, repo_root: Path) -> None:
     )
 
     router = get_router("azure_gpt4o")
-    raw = router.generate(IDEATION_SYSTEM, user_prompt, json_mode=True)
+    raw = router.generate(IDEATION_SYSTEM, user_prompt, json_mode=True, prompt_type="ideation")
 
     try:
         result = json.loads(raw)
@@ -1,13 +1,21 @@
 """Free-form research ideation agent for GUI Agent action planning."""
 
+import contextvars
 import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
 import yaml
 
 from ..llm.prompts import IDEATION_ENHANCED_SYSTEM, IDEATION_ENHANCED_USER
 from ..llm.router import get_router
+from ..llm.structured import generate_json
+from ..llm.tool_schemas import RESEARCH_IDEA_SCHEMA
+from ..orchestrator.gates import check_idea
 from ..utils.log import get_logger
+from ..utils.time import utc_now
+from .preflight import dimension_values
 
 LOGGER = get_logger(__name__)
 
@@ -15,6 +23,19 @@ REQUIRED_METHOD_KEYS = [
     "training_strategy", "data_processing", "prompt_design",
     "model_config", "augmentation", "key_innovation",
 ]
+REJECTED_IDEAS_FILE = "rejected_ideas.json"
+# method fields that describe what is run; key_innovation is free text
+NOVELTY_KEYS = REQUIRED_METHOD_KEYS[:5]
+
+
+def record_rejected_idea(project_dir: Path, reason: str) -> None:
+    """Remember an idea dropped after planning so the next ideation avoids it."""
+    idea = json.loads((project_dir / "00_idea" / "idea.json").read_text())
+    path = project_dir / "00_idea" / REJECTED_IDEAS_FILE
+    rejected = json.loads(path.read_text()) if path.exists() else []
+    rejected.append({"title": idea.get("title", idea.get("hypothesis", "")), "reason": reason,
+                     "method": idea.get("method", {})})
+    path.write_text(json.dumps(rejected, indent=2))
 
 
 def _load_configs(repo_root: Path):
@@ -24,9 +45,11 @@ def _load_configs(repo_root: Path):
 
 
 def _format_dimensions(ts: dict) -> str:
+    # only values the pipeline implements, so ideas do not die in preflight
+    values = dimension_values(ts)
     lines = []
     for dim in ts.get("exploration_dimensions", []):
-        examples = ", ".join(dim.get("examples", []))
+        examples = ", ".join(values.get(dim["name"], []))
         lines.append(f"- **{dim['name']}**: {dim.get('description', '')}  Examples: {examples}")
     return "\n".join(lines)
 
@@ -41,11 +64,12 @@ def _get_history_and_patterns(repo_root: Path, kg_cfg: dict, ts: dict):
     top_patterns = "No patterns available."
 
     try:
+        from ..knowledge import history_digest
         from ..knowledge.kg_store import KnowledgeGraph
         from ..knowledge.pattern_ranker import rank_patterns, format_patterns_for_prompt
 
         kg = KnowledgeGraph(repo_root / kg_cfg["kg_db_path"])
-        history = kg.get_history_summary()
+        history = history_digest.read(kg, history_digest.digest_config(repo_root))
         if history:
             history_summary = history
 
@@ -62,35 +86,116 @@ def _get_history_and_patterns(repo_root: Path, kg_cfg: dict, ts: dict):
     return history_summary, top_patterns
 
 
-def run_ideation_enhanced(project_dir: Path, repo_root: Path) -> None:
-    ts, kg_cfg = _load_configs(repo_root)
+def _method_signature(method: dict) -> dict:
+    """Non-empty method choices, normalised, keyed by dimension."""
+    sig = {k: str(method.get(k) or "").strip().lower() for k in NOVELTY_KEYS}
+    return {k: v for k, v in sig.items() if v}
 
-    history_summary, top_patterns = _get_history_and_patterns(repo_root, kg_cfg, ts)
 
-    user_prompt = IDEATION_ENHANCED_USER.format(
-        base_model=ts.get("base_model", "Qwen/Qwen3-4B-Instruct-2507"),
-        primary_metric=ts.get("primary_metric", "step_success_rate"),
-        higher_is_better=ts.get("higher_is_better", True),
-        dimensions_text=_format_dimensions(ts),
-        baseline_text=_format_baseline(ts),
-        history_summary=history_summary,
-        top_patterns=top_patterns,
-    )
+def _similarity(a: dict, b: dict) -> float:
+    """Jaccard similarity over the dimensions both signatures record."""
+    shared = a.keys() & b.keys()
+    if not shared:
+        return 0.0
+    same = sum(a[k] == b[k] for k in shared)
+    return same / (2 * len(shared) - same)
 
-    LOGGER.info("using free-form enhanced ideation for GUI Agent research")
-    router = get_router("azure_gpt4o")
-    raw = router.generate(IDEATION_ENHANCED_SYSTEM, user_prompt, json_mode=True)
-    idea = json.loads(raw)
 
-    if "method" not in idea or not isinstance(idea["method"], dict):
-        raise ValueError("LLM output missing 'method' dict")
-    for key in REQUIRED_METHOD_KEYS:
-        if key not in idea["method"]:
-            idea["method"][key] = "default"
+def _novelty(idea: dict, seen: list[dict]) -> float:
+    """1 - the highest Jaccard similarity between the idea's method choices
+    and any past experiment, rejected idea or already-chosen candidate."""
+    sig = _method_signature(idea.get("method", {}))
+    overlap = max((_similarity(sig, other) for other in seen), default=0.0)
+    return round(1.0 - overlap, 4)
 
-    if "hypothesis" not in idea or not idea["hypothesis"]:
-        raise ValueError("LLM output missing 'hypothesis'")
 
+def _seen_signatures(repo_root: Path, kg_cfg: dict, project_dir: Path) -> list[dict]:
+    """Method choices of past experiments and of ideas rejected for this project."""
+    seen = []
+    try:
+        from ..knowledge.history_digest import method_choices
+        from ..knowledge.kg_store import KnowledgeGraph
+        kg = KnowledgeGraph(repo_root / kg_cfg["kg_db_path"])
+        try:
+            # older history rows keep strategy/data/prompt values only
+            for t in kg.get_tried_combinations():
+                seen.append(_method_signature(method_choices(t)))
+        finally:
+            kg.close()
+    except Exception as exc:
+        LOGGER.warning("knowledge graph unavailable for novelty scoring: %s", exc)
+    rejected_path = project_dir / "00_idea" / REJECTED_IDEAS_FILE
+    if rejected_path.exists():
+        seen.extend(_method_signature(r.get("method", {}))
+                    for r in json.loads(rejected_path.read_text()))
+    return seen
+
+
+def _generate_candidates(router, user_prompt: str, ts: dict, k: int) -> tuple[list, list]:
+    """K concurrent ideation calls; returns (valid ideas, error messages).
+
+    With K > 1 each call is nudged towards a different exploration dimension
+    so the batch does not collapse onto one idea."""
+    dims = [d["name"] for d in ts.get("exploration_dimensions", [])]
+
+    def one(i: int) -> dict:
+        prompt = user_prompt
+        if k > 1 and dims:
+            prompt += (f"\n\nCandidate {i + 1} of {k}: centre the change on the "
+                       f"'{dims[i % len(dims)]}' dimension.")
+        idea = generate_json(router, IDEATION_ENHANCED_SYSTEM, prompt, RESEARCH_IDEA_SCHEMA,
+                             prompt_type="ideation")
+        ok, msg = check_idea(idea)
+        if not ok:
+            router.invalidate(IDEATION_ENHANCED_SYSTEM, prompt, json_mode=True)
+            raise ValueError(f"LLM output fails Gate A: {msg}")
+        return idea
+
+    ideas, errors = [], []
+    with ThreadPoolExecutor(max_workers=k) as pool:
+        # each worker gets a copy of the caller's context for token accounting
+        futures = [pool.submit(contextvars.copy_context().run, one, i) for i in range(k)]
+        for future in futures:
+            try:
+                ideas.append(future.result())
+            except Exception as exc:
+                errors.append(f"{type(exc).__name__}: {exc}")
+    return ideas, errors
+
+
+def _open_queue(repo_root: Path, kg_cfg: dict):
+    from ..knowledge.kg_store import KnowledgeGraph
+    return KnowledgeGraph(repo_root / kg_cfg["kg_db_path"])
+
+
+def _take_from_queue(repo_root: Path, kg_cfg: dict, project_dir: Path, seen: list[dict],
+                     idea_cfg: dict):
+    """Best queued runner-up that is still novel enough, or None."""
+    queue_cfg = idea_cfg.get("queue", {})
+    if not queue_cfg.get("enabled", True):
+        return None
+    since = (datetime.now(timezone.utc)
+             - timedelta(hours=queue_cfg.get("max_age_hours", 72))).isoformat()
+    kg = _open_queue(repo_root, kg_cfg)
+    try:
+        queued = kg.take_queued_ideas(project_dir.name, since)
+        scored = sorted(((_novelty(q["idea"], seen), q) for q in queued),
+                        key=lambda pair: -pair[0])
+        min_novelty = idea_cfg.get("min_novelty", 0.2)
+        best = scored[0] if scored and scored[0][0] >= min_novelty else None
+        keep = [q["id"] for novelty, q in scored
+                if novelty >= min_novelty and (best is None or q is not best[1])]
+        kg.return_queued_ideas(keep)
+    finally:
+        kg.close()
+    if best is None:
+        return None
+    LOGGER.info("using queued idea %d (novelty %.2f), %d left in queue",
+                best[1]["id"], best[0], len(keep))
+    return best[1]["idea"], best[0]
+
+
+def _write_idea(project_dir: Path, idea: dict) -> None:
     idea_dir = project_dir / "00_idea"
     idea_dir.mkdir(parents=True, exist_ok=True)
     (idea_dir / "idea.json").write_text(json.dumps(idea, indent=2))
@@ -114,9 +219,96 @@ def run_ideation_enhanced(project_dir: Path, repo_root: Path) -> None:
     ]
     (idea_dir / "idea.md").write_text("\n".join(md_lines))
 
+
+def _ideation_cfg(repo_root: Path) -> dict:
+    sys_path = repo_root / "config" / "system.yaml"
+    if sys_path.exists():
+        return (yaml.safe_load(sys_path.read_text()) or {}).get("ideation", {})
+    return {}
+
+
+def run_ideation_enhanced(project_dir: Path, repo_root: Path) -> None:
+    """Write 00_idea/idea.json.
+
+    A still-novel runner-up from an earlier batch is used when the idea
+    queue has one.  Otherwise ideation.batch_size candidates are generated
+    concurrently, Gate-A checked, and the most novel (least similar to past
+    experiments and rejected ideas) is kept; the other novel candidates
+    are queued for later projects.
+    """
+    ts, kg_cfg = _load_configs(repo_root)
+    idea_cfg = _ideation_cfg(repo_root)
+    seen = _seen_signatures(repo_root, kg_cfg, project_dir)
+
+    try:
+        queued = _take_from_queue(repo_root, kg_cfg, project_dir, seen, idea_cfg)
+    except Exception as exc:
+        LOGGER.warning("idea queue unavailable: %s", exc)
+        queued = None
+    if queued is not None:
+        idea, novelty = queued
+        _write_idea(project_dir, idea)
+        LOGGER.info("ideation done (queued): title=%s, novelty=%.2f",
+                    idea.get("title", "?"), novelty)
+        return
+
+    history_summary, top_patterns = _get_history_and_patterns(repo_root, kg_cfg, ts)
+    rejected_path = project_dir / "00_idea" / REJECTED_IDEAS_FILE
+    if rejected_path.exists():
+        rejected = json.loads(rejected_path.read_text())
+        history_summary += (
+            "\n\nEarlier ideas for this project were rejected before running; propose a "
+            "treatment that differs in what is actually trained or evaluated:\n"
+            + "\n".join(f"- {r['title']} ({r['reason']})" for r in rejected)
+        )
+
+    user_prompt = IDEATION_ENHANCED_USER.format(
+        base_model=ts.get("base_model", "Qwen/Qwen3-4B-Instruct-2507"),
+        primary_metric=ts.get("primary_metric", "step_success_rate"),
+        higher_is_better=ts.get("higher_is_better", True),
+        dimensions_text=_format_dimensions(ts),
+        baseline_text=_format_baseline(ts),
+        history_summary=history_summary,
+        top_patterns=top_patterns,
+    )
+
+    k = max(int(idea_cfg.get("batch_size", 1)), 1)
+    LOGGER.info("using free-form enhanced ideation for GUI Agent research (%d candidates)", k)
+    router = get_router("azure_gpt4o")
+    candidates, errors = _generate_candidates(router, user_prompt, ts, k)
+    for err in errors:
+        LOGGER.warning("ideation candidate rejected: %s", err)
+    if not candidates:
+        raise ValueError("no valid ideation candidate: " + "; ".join(errors))
+
+    # greedy: most novel first, then re-score the rest against what was kept
+    ranked = []
+    pool = list(candidates)
+    while pool:
+        scored = [(_novelty(c, seen + [_method_signature(r.get("method", {}))
+                                       for r, _ in ranked]), c) for c in pool]
+        novelty, best = max(scored, key=lambda pair: pair[0])
+        ranked.append((best, novelty))
+        pool.remove(best)
+    idea, novelty = ranked[0]
+    _write_idea(project_dir, idea)
+
+    runners_up = [(c, n) for c, n in ranked[1:] if n >= idea_cfg.get("min_novelty", 0.2)]
+    if runners_up and idea_cfg.get("queue", {}).get("enabled", True):
+        try:
+            kg = _open_queue(repo_root, kg_cfg)
+            try:
+                kg.enqueue_ideas(runners_up, project_dir.name, utc_now())
+            finally:
+                kg.close()
+        except Exception as exc:
+            LOGGER.warning("could not queue runner-up ideas: %s", exc)
+
     LOGGER.info(
-        "ideation done (enhanced): title=%s, strategy=%s, prompt=%s",
+        "ideation done (enhanced): title=%s, strategy=%s, prompt=%s, novelty=%.2f, "
+        "%d/%d valid, %d queued",
         idea.get("title", "?"),
         idea["method"]["training_strategy"],
         idea["method"]["prompt_design"],
+        novelty, len(candidates), k, len(runners_up),
     )
@@ -56,7 +56,7 @@ def run_planning(project_dir: Path, repo_root: Path) -> None:
         seeds=seeds,
         primary_metric=ts["baseline"]["primary_metric"],
     )
-    raw = router.generate(PLANNING_SYSTEM, user_prompt, json_mode=True)
+    raw = router.generate(PLANNING_SYSTEM, user_prompt, json_mode=True, prompt_type="planning")
 
     try:
         llm_plan = json.loads(raw)
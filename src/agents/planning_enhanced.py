@@ -7,10 +7,46 @@ import yaml
 
 from ..llm.prompts import PLANNING_SYSTEM, PLANNING_USER
 from ..llm.router import get_router
+from ..llm.structured import generate_json
+from ..llm.tool_schemas import EXPERIMENT_PLAN_SCHEMA
 from ..utils.log import get_logger
+from .preflight import SECTION_KEYS, implemented_values, normalize_config
 
 LOGGER = get_logger(__name__)
 
+PREFLIGHT_ERRORS_FILE = "preflight_errors.json"
+
+
+def record_preflight_errors(project_dir: Path, error_msg: str) -> None:
+    """Remember why a plan failed preflight so the next planning call fixes it."""
+    idea = json.loads((project_dir / "00_idea" / "idea.json").read_text())
+    path = project_dir / "01_plan" / PREFLIGHT_ERRORS_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    failures = json.loads(path.read_text()) if path.exists() else []
+    failures.append({"idea": idea.get("title", idea.get("hypothesis", "")),
+                     "error": error_msg[:2000]})
+    path.write_text(json.dumps(failures, indent=2))
+
+
+def _preflight_feedback(project_dir: Path, idea: dict) -> str:
+    """Prompt text listing earlier preflight failures of plans for this idea."""
+    path = project_dir / "01_plan" / PREFLIGHT_ERRORS_FILE
+    if not path.exists():
+        return ""
+    title = idea.get("title", idea.get("hypothesis", ""))
+    errors = [f["error"] for f in json.loads(path.read_text()) if f.get("idea") == title]
+    if not errors:
+        return ""
+    return ("\n\nEarlier plans for this idea failed preflight validation; the new plan "
+            "must not repeat these problems:\n" + "\n".join(f"- {e}" for e in errors))
+
+
+def _allowed_values() -> str:
+    """Prompt text listing the values and keys preflight.validate_config accepts."""
+    lines = [f"- {field}: {', '.join(values)}" for field, values in implemented_values().items()]
+    lines += [f"- {section} keys: {', '.join(sorted(keys))}" for section, keys in SECTION_KEYS.items()]
+    return "\n".join(lines)
+
 
 def run_planning_enhanced(project_dir: Path, repo_root: Path) -> None:
     ts = yaml.safe_load(
@@ -31,11 +67,14 @@ def run_planning_enhanced(project_dir: Path, repo_root: Path) -> None:
         max_train_samples=ts.get("baseline", {}).get("data", {}).get("max_train_samples", 2000),
         max_eval_samples=ts.get("baseline", {}).get("data", {}).get("max_eval_samples", 500),
         primary_metric=ts.get("primary_metric", "step_success_rate"),
+        allowed_values=_allowed_values(),
     )
+    # also makes the prompt, and so the response cache key, differ per attempt
+    user_prompt += _preflight_feedback(project_dir, idea)
 
     router = get_router("azure_gpt4o")
-    raw = router.generate(PLANNING_SYSTEM, user_prompt, json_mode=True)
-    plan = json.loads(raw)
+    plan = generate_json(router, PLANNING_SYSTEM, user_prompt, EXPERIMENT_PLAN_SCHEMA,
+                         prompt_type="planning")
 
     plan_dir = project_dir / "01_plan"
     plan_dir.mkdir(parents=True, exist_ok=True)
@@ -44,11 +83,15 @@ def run_planning_enhanced(project_dir: Path, repo_root: Path) -> None:
         "base_model": ts.get("base_model", "Qwen/Qwen3-4B-Instruct-2507"),
         "benchmark": ts.get("benchmark", "mind2web"),
         "seeds": ts.get("constraints", {}).get("seeds", [42, 123]),
+        "sequential": ts.get("constraints", {}).get("sequential", {}),
+        "early_stop": ts.get("constraints", {}).get("early_stop", {}),
         "primary_metric": ts.get("primary_metric", "step_success_rate"),
         "evaluation_metrics": ts.get("evaluation_metrics", []),
         "baseline": plan.get("baseline", ts.get("baseline", {})),
         "treatment": plan.get("treatment", {}),
     }
+    for note in normalize_config(config):
+        LOGGER.info("plan config: %s", note)
     (plan_dir / "config.yaml").write_text(yaml.dump(config, default_flow_style=False))
 
     (plan_dir / "plan.json").write_text(json.dumps(plan, indent=2))
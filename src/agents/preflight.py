@@ -0,0 +1,260 @@
+"""Pre-flight check of a plan before it is queued on a GPU.
+
+Two layers:
+  1. strict validation of 01_plan/config.yaml -- unknown keys and values the
+     data pipeline would silently replace with a default (e.g. an
+     unimplemented prompt_design) are errors here.  Keys older planners wrote
+     (train.lr, data.batch_size, ...) are first rewritten to the ones the
+     trainer reads;
+  2. a CPU smoke run of the real _train_and_evaluate path for both groups
+     with a tiny randomly initialised model of the same architecture, a few
+     examples and a single optimizer step, in a subprocess with a timeout.
+
+The smoke run is skipped when torch/transformers/trl/peft are not installed
+on the orchestrator host.
+"""
+
+import argparse
+import copy
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import yaml
+
+from ..utils.log import get_logger
+
+LOGGER = get_logger(__name__)
+
+SMOKE_DEPS = ("torch", "transformers", "trl", "peft", "datasets")
+
+GROUP_KEYS = {
+    "training_strategy", "data_processing", "prompt_design", "model_config",
+    "augmentation", "train", "lora", "data", "divergence",
+}
+TRAIN_KEYS = {
+    "learning_rate", "num_train_epochs", "warmup_ratio", "per_device_train_batch_size",
+    "max_seq_length", "gradient_accumulation_steps", "max_grad_norm", "logging_steps",
+    "auto_batch", "memory_safety", "max_steps",
+}
+LORA_KEYS = {"rank", "alpha", "dropout", "target_modules"}
+DATA_KEYS = {"max_train_samples", "max_eval_samples"}
+SECTION_KEYS = {"train": TRAIN_KEYS, "lora": LORA_KEYS, "data": DATA_KEYS}
+# keys older planners wrote, mapped to the ones _train_and_evaluate reads
+LEGACY_KEYS = {
+    ("train", "lr"): ("train", "learning_rate"),
+    ("train", "epochs"): ("train", "num_train_epochs"),
+    ("data", "batch_size"): ("train", "per_device_train_batch_size"),
+    ("data", "max_seq_length"): ("train", "max_seq_length"),
+}
+# blocks older planners wrote that nothing in the pipeline reads
+UNUSED_KEYS = ("gen",)
+POSITIVE_NUMBERS = (
+    ("train", "learning_rate"), ("train", "num_train_epochs"),
+    ("train", "per_device_train_batch_size"), ("train", "max_seq_length"),
+    ("train", "gradient_accumulation_steps"), ("lora", "rank"), ("lora", "alpha"),
+    ("data", "max_train_samples"), ("data", "max_eval_samples"),
+)
+
+TINY_MODEL = {
+    "hidden_size": 64,
+    "intermediate_size": 128,
+    "num_hidden_layers": 2,
+    "num_attention_heads": 4,
+    "num_key_value_heads": 2,
+    "head_dim": 16,
+}
+
+
+def implemented_values() -> dict:
+    """Allowed values of the dimensions the data pipeline dispatches on."""
+    from ..data.mind2web import IMPLEMENTED_DIMENSIONS
+
+    return IMPLEMENTED_DIMENSIONS
+
+
+def dimension_values(ts: dict) -> dict:
+    """Values to offer per taskspace exploration dimension: its examples,
+    restricted to the implemented ones where validate_config checks them."""
+    dims = {d["name"]: list(d.get("examples") or []) for d in ts.get("exploration_dimensions", [])}
+    for name, allowed in implemented_values().items():
+        if name in dims:
+            dims[name] = [v for v in dims[name] if v in allowed] or list(allowed)
+    return dims
+
+
+def normalize_config(config: dict) -> list[str]:
+    """Rewrite legacy keys of both groups in place; return what was changed."""
+    notes = []
+    for group in ("baseline", "treatment"):
+        cfg = config.get(group)
+        if not isinstance(cfg, dict):
+            continue
+        for key in UNUSED_KEYS:
+            if key in cfg:
+                del cfg[key]
+                notes.append(f"{group}.{key}: dropped (not read by the pipeline)")
+        for (section, key), (new_section, new_key) in LEGACY_KEYS.items():
+            block = cfg.get(section)
+            if not isinstance(block, dict) or key not in block:
+                continue
+            value = block.pop(key)
+            target = cfg.setdefault(new_section, {})
+            if isinstance(target, dict) and new_key not in target:
+                target[new_key] = value
+                notes.append(f"{group}.{section}.{key} -> {new_section}.{new_key}")
+            else:
+                notes.append(f"{group}.{section}.{key}: dropped ({new_section}.{new_key} is set)")
+            if not block:
+                del cfg[section]
+    return notes
+
+
+def validate_config(config: dict) -> list[str]:
+    """Return a list of problems with a plan config (empty if valid)."""
+    errors = []
+    for group in ("baseline", "treatment"):
+        cfg = config.get(group)
+        if not isinstance(cfg, dict) or not cfg:
+            errors.append(f"{group}: missing or empty")
+            continue
+        for key in sorted(set(cfg) - GROUP_KEYS):
+            errors.append(f"{group}: unknown key '{key}'")
+        for section, allowed in SECTION_KEYS.items():
+            block = cfg.get(section, {})
+            if not isinstance(block, dict):
+                errors.append(f"{group}.{section}: expected a mapping, got {type(block).__name__}")
+                continue
+            for key in sorted(set(block) - allowed):
+                errors.append(f"{group}.{section}: unknown key '{key}'")
+
+        for field, allowed in implemented_values().items():
+            value = cfg.get(field)
+            if value is not None and value not in allowed:
+                errors.append(f"{group}.{field}: unsupported value '{value}' "
+                              f"(implemented: {', '.join(allowed)})")
+
+        for section, key in POSITIVE_NUMBERS:
+            value = (cfg.get(section) or {}).get(key) if isinstance(cfg.get(section), dict) else None
+            if value is None:
+                continue
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+                errors.append(f"{group}.{section}.{key}: expected a positive number, got {value!r}")
+
+    if config.get("baseline") == config.get("treatment"):
+        errors.append("treatment is identical to baseline")
+    return errors
+
+
+def _smoke_config(cfg: dict) -> dict:
+    cfg = copy.deepcopy(cfg)
+    train = cfg.setdefault("train", {})
+    train.update({
+        "max_steps": 1,
+        "num_train_epochs": 1,
+        "per_device_train_batch_size": 1,
+        "gradient_accumulation_steps": 1,
+        "max_seq_length": min(train.get("max_seq_length", 2048), 256),
+        "logging_steps": 1,
+        "auto_batch": False,
+    })
+    cfg["data"] = {**cfg.get("data", {}), "max_train_samples": 4, "max_eval_samples": 2}
+    return cfg
+
+
+def _load_tiny_model(base_model: str, cfg: dict, seed: int):
+    """Tokenizer of the real base model + a randomly initialised tiny model of
+    the same architecture, wrapped with the plan's LoRA adapter."""
+    import torch
+    from transformers import AutoConfig, AutoModelForCausalLM, AutoTokenizer
+
+    from .experiment import _apply_lora
+
+    hf_token = os.environ.get("HF_TOKEN")
+    tokenizer = AutoTokenizer.from_pretrained(base_model, token=hf_token, trust_remote_code=True)
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    model_config = AutoConfig.from_pretrained(base_model, token=hf_token, trust_remote_code=True)
+    for key, value in TINY_MODEL.items():
+        if hasattr(model_config, key):
+            setattr(model_config, key, value)
+    model_config.vocab_size = len(tokenizer)
+    torch.manual_seed(seed)
+    model = AutoModelForCausalLM.from_config(model_config, torch_dtype=torch.float32,
+                                             trust_remote_code=True)
+    return _apply_lora(model, cfg), tokenizer
+
+
+def smoke_run(project_dir: Path, out_dir: Path) -> dict:
+    """Run the real train/eval path for each group on CPU (subprocess entry)."""
+    from .experiment import _train_and_evaluate
+
+    config = yaml.safe_load((project_dir / "01_plan" / "config.yaml").read_text())
+    base_model = config.get("base_model", "Qwen/Qwen3-4B-Instruct-2507")
+    seed = config.get("seeds", [42])[0]
+    results = {}
+    for group in ("baseline", "treatment"):
+        run_dir = out_dir / group
+        run_dir.mkdir(parents=True, exist_ok=True)
+        metrics = _train_and_evaluate(
+            base_model, _smoke_config(config[group]), seed, run_dir, load_model=_load_tiny_model,
+        )
+        results[group] = {k: v for k, v in metrics.items() if isinstance(v, (int, float))}
+    return results
+
+
+def run_preflight(project_dir: Path, repo_root: Path, pf_cfg: dict = None) -> tuple[bool, str]:
+    """Validate the plan and smoke-run it on CPU. Returns (ok, message)."""
+    pf_cfg = pf_cfg or {}
+    config_path = project_dir / "01_plan" / "config.yaml"
+    config = yaml.safe_load(config_path.read_text())
+
+    notes = normalize_config(config)
+    if notes:
+        # rewritten so the experiment trains with what the plan asked for
+        LOGGER.info("preflight normalised legacy plan keys: %s", "; ".join(notes))
+        config_path.write_text(yaml.dump(config, default_flow_style=False))
+    errors = validate_config(config)
+    if errors:
+        return False, "ValueError: invalid plan config: " + "; ".join(errors)
+
+    if not pf_cfg.get("smoke_run", True):
+        return True, "config valid (smoke run disabled)"
+    missing = [m for m in SMOKE_DEPS if importlib.util.find_spec(m) is None]
+    if missing:
+        LOGGER.warning("skipping preflight smoke run, not installed here: %s", ", ".join(missing))
+        return True, "config valid (smoke run skipped)"
+
+    timeout = pf_cfg.get("timeout_minutes", 15) * 60
+    with tempfile.TemporaryDirectory(prefix="fars_preflight_") as tmp:
+        cmd = [sys.executable, "-m", "src.agents.preflight", str(project_dir), "--out", tmp]
+        env = dict(os.environ, CUDA_VISIBLE_DEVICES="")
+        LOGGER.info("preflight smoke run for %s", project_dir.name)
+        try:
+            proc = subprocess.run(cmd, cwd=str(repo_root), env=env, capture_output=True,
+                                  text=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return False, f"preflight smoke run exceeded {timeout // 60} minutes"
+    if proc.returncode != 0:
+        return False, "smoke run failed:\n" + proc.stderr[-2000:]
+
+    report = proc.stdout.strip().splitlines()[-1] if proc.stdout.strip() else "{}"
+    (project_dir / "01_plan" / "preflight.json").write_text(report)
+    return True, "smoke run passed"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preflight CPU smoke run")
+    parser.add_argument("project_dir", type=Path)
+    parser.add_argument("--out", type=Path, required=True)
+    args = parser.parse_args()
+    # last stdout line is the machine-readable result read by run_preflight
+    print(json.dumps(smoke_run(args.project_dir.resolve(), args.out)))
+
+
+if __name__ == "__main__":
+    main()
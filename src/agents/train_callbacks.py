@@ -0,0 +1,177 @@
+"""Trainer callbacks used by the experiment agent during fine-tuning.
+
+Imported lazily from agents/experiment.py so transformers is only required
+on the GPU node.
+"""
+
+import json
+import math
+import time
+from pathlib import Path
+
+from transformers import TrainerCallback
+
+from ..utils.log import get_logger
+
+LOGGER = get_logger(__name__)
+
+
+class DominanceCallback(TrainerCallback):
+    """Run mini-evals at the controller's rungs and stop dominated runs."""
+
+    def __init__(self, controller, model, tokenizer, eval_examples: list):
+        self.controller = controller
+        self.model = model
+        self.tokenizer = tokenizer
+        self.eval_examples = eval_examples
+        self._rungs = set()
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        self._rungs = self.controller.rung_steps(state.max_steps)
+        LOGGER.info("early-stop rungs at steps %s (max_steps=%d)",
+                    sorted(self._rungs), state.max_steps)
+
+    def on_step_end(self, args, state, control, **kwargs):
+        if state.global_step not in self._rungs:
+            return control
+
+        from ..data.gui_eval import run_model_evaluation
+
+        metrics = run_model_evaluation(self.model, self.tokenizer, self.eval_examples)
+        self.model.train()
+        if self.controller.observe(state.global_step, metrics):
+            LOGGER.warning("stopping run early: %s", self.controller.abort_reason)
+            control.should_training_stop = True
+        return control
+
+
+class TrainingDivergedError(RuntimeError):
+    """Raised after training was stopped because loss or grad-norm diverged."""
+
+    def __init__(self, record: dict):
+        super().__init__(f"training diverged: {record['reason']} at step {record['step']}")
+        self.record = record
+
+
+def _finite_or_str(value):
+    if value is None:
+        return None
+    value = float(value)
+    return value if math.isfinite(value) else str(value)
+
+
+class DivergenceCallback(TrainerCallback):
+    """Watch logged loss/grad-norm and stop training as soon as they diverge.
+
+    Triggers on a non-finite loss or grad-norm, a grad-norm above
+    max_grad_norm_seen, or a loss that stays above spike_factor times the best
+    loss so far for `patience` consecutive logs (after `warmup_logs`).  The
+    rise must also exceed min_loss_delta, so a run whose loss is already near
+    zero is not stopped for noise.  A structured record is written to
+    <run_dir>/failure.json for recovery.
+    """
+
+    def __init__(
+        self,
+        run_dir: Path,
+        spike_factor: float = 4.0,
+        patience: int = 2,
+        warmup_logs: int = 3,
+        max_grad_norm_seen: float = 1000.0,
+        min_loss_delta: float = 1.0,
+    ):
+        self.run_dir = run_dir
+        self.spike_factor = spike_factor
+        self.min_loss_delta = min_loss_delta
+        self.patience = patience
+        self.warmup_logs = warmup_logs
+        self.max_grad_norm_seen = max_grad_norm_seen
+        self.failure = None
+        self._n_logs = 0
+        self._best_loss = None
+        self._spikes = 0
+
+    def _check(self, loss, grad_norm) -> str:
+        if loss is not None and not math.isfinite(loss):
+            return "nan_loss"
+        if grad_norm is not None and not math.isfinite(grad_norm):
+            return "nan_grad_norm"
+        if grad_norm is not None and grad_norm > self.max_grad_norm_seen:
+            return "grad_norm_explosion"
+        if loss is None:
+            return ""
+
+        self._n_logs += 1
+        if self._best_loss is None or loss < self._best_loss:
+            self._best_loss = loss
+        rise = loss - self._best_loss
+        threshold = max(self.min_loss_delta, (self.spike_factor - 1) * self._best_loss)
+        if self._n_logs > self.warmup_logs and rise > threshold:
+            self._spikes += 1
+        else:
+            self._spikes = 0
+        return "loss_explosion" if self._spikes >= self.patience else ""
+
+    def on_log(self, args, state, control, logs=None, **kwargs):
+        logs = logs or {}
+        loss = logs.get("loss")
+        grad_norm = logs.get("grad_norm")
+        reason = self._check(
+            float(loss) if loss is not None else None,
+            float(grad_norm) if grad_norm is not None else None,
+        )
+        if not reason:
+            return control
+
+        self.failure = {
+            "kind": "divergence",
+            "reason": reason,
+            "step": state.global_step,
+            "max_steps": state.max_steps,
+            "loss": _finite_or_str(loss),
+            "best_loss": self._best_loss,
+            "grad_norm": _finite_or_str(grad_norm),
+            "learning_rate": logs.get("learning_rate"),
+        }
+        (self.run_dir / "failure.json").write_text(json.dumps(self.failure, indent=2))
+        LOGGER.error("divergence detected (%s) at step %d, stopping run", reason, state.global_step)
+        control.should_training_stop = True
+        return control
+
+
+class ProgressCallback(TrainerCallback):
+    """Write step, loss and throughput to the job heartbeat at most every interval seconds."""
+
+    def __init__(self, heartbeat, interval: float = 15.0):
+        self.heartbeat = heartbeat
+        self.interval = interval
+        self._last_time = None
+        self._last_tokens = 0
+        self._loss = None
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        self._last_time = time.monotonic()
+        self._last_tokens = state.num_input_tokens_seen or 0
+        self.heartbeat.beat(phase="training", step=state.global_step, max_steps=state.max_steps)
+
+    def on_log(self, args, state, control, logs=None, **kwargs):
+        loss = (logs or {}).get("loss")
+        if loss is not None and math.isfinite(float(loss)):
+            self._loss = float(loss)
+
+    def on_step_end(self, args, state, control, **kwargs):
+        self.heartbeat.check_cancelled()
+        now = time.monotonic()
+        if now - self._last_time < self.interval:
+            return control
+        tokens = state.num_input_tokens_seen or 0
+        tokens_per_sec = (tokens - self._last_tokens) / (now - self._last_time)
+        self._last_time, self._last_tokens = now, tokens
+        self.heartbeat.beat(
+            phase="training",
+            step=state.global_step,
+            max_steps=state.max_steps,
+            loss=self._loss,
+            tokens_per_sec=round(tokens_per_sec, 1),
+        )
+        return control
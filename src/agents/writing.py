@@ -1,21 +1,90 @@
-"""Writing agent: GPT-4o writes paper, then render via Jinja2 templates."""
+"""Writing agent: GPT-4o writes paper, then render via Jinja2 templates.
 
+writing.mode in system.yaml:
+    stream   -- one call, streamed straight into paper.md; logs time to
+                first token and when each required section appears
+    sections -- one call per section, run concurrently; each section is
+                appended to paper.md as soon as all earlier ones are done
+"""
+
+import contextvars
 import csv
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 from jinja2 import Environment, FileSystemLoader
 
 from ..llm.router import get_router
-from ..llm.prompts import WRITING_SYSTEM, WRITING_USER
+from ..llm.prompts import WRITING_SECTION_USER, WRITING_SYSTEM, WRITING_USER
 from ..utils.log import get_logger
 
 LOGGER = get_logger(__name__)
 
 TEMPLATES_DIR = Path(__file__).resolve().parent.parent / "paper" / "templates"
 
-
-def run_writing(project_dir: Path) -> None:
+SECTIONS = ["Introduction", "Method", "Results", "Limitations", "Conclusion"]
+REQUIRED_HEADINGS = ["## Results", "## Method", "## Limitations"]  # gate C
+
+
+def _stream_paper(router, user_prompt: str, paper_path: Path) -> str:
+    start = time.monotonic()
+    pending = list(REQUIRED_HEADINGS)
+    keep = max(len(h) for h in REQUIRED_HEADINGS)
+    parts, tail = [], ""
+    with paper_path.open("w") as f:
+        for chunk in router.generate_stream(WRITING_SYSTEM, user_prompt, prompt_type="writing"):
+            if not parts:
+                LOGGER.info("writing: first token after %.2fs", time.monotonic() - start)
+            f.write(chunk)
+            f.flush()
+            parts.append(chunk)
+            # a heading can straddle chunks, so search the previous tail too
+            window = tail + chunk
+            for heading in [h for h in pending if h in window]:
+                pending.remove(heading)
+                LOGGER.info("writing: %s after %.1fs", heading, time.monotonic() - start)
+            tail = window[-keep:]
+    LOGGER.info("writing: streamed %d chars in %.1fs%s", sum(map(len, parts)),
+                time.monotonic() - start, f", missing {pending}" if pending else "")
+    return "".join(parts)
+
+
+def _section_text(section: str, text: str) -> str:
+    text = text.strip()
+    if not text.startswith(f"## {section}"):
+        text = f"## {section}\n\n{text}"
+    return text
+
+
+def _write_sections(router, fields: dict, paper_path: Path, workers: int) -> str:
+    start = time.monotonic()
+    prompts = {
+        sec: WRITING_SECTION_USER.format(section=sec, sections=", ".join(SECTIONS), **fields)
+        for sec in SECTIONS
+    }
+    done, flushed = {}, 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool, paper_path.open("w") as f:
+        # each worker gets a copy of the caller's context for token accounting
+        futures = {
+            pool.submit(contextvars.copy_context().run, router.generate, WRITING_SYSTEM,
+                        prompts[sec], False, None, "writing_section"): sec
+            for sec in SECTIONS
+        }
+        for future in as_completed(futures):
+            sec = futures[future]
+            done[sec] = _section_text(sec, future.result())
+            LOGGER.info("writing: %s done after %.1fs", sec, time.monotonic() - start)
+            while flushed < len(SECTIONS) and SECTIONS[flushed] in done:
+                f.write(("\n\n" if flushed else "") + done[SECTIONS[flushed]])
+                f.flush()
+                flushed += 1
+    return "\n\n".join(done[sec] for sec in SECTIONS)
+
+
+def run_writing(project_dir: Path, cfg: dict = None) -> None:
+    cfg = cfg or {}
     env = Environment(loader=FileSystemLoader(str(TEMPLATES_DIR)))
 
     idea = json.loads((project_dir / "00_idea" / "idea.json").read_text())
@@ -41,7 +110,7 @@ def run_writing(project_dir: Path) -> None:
         method_desc = f"Actions: {idea['actions']}"
 
     router = get_router("azure_gpt4o")
-    user_prompt = WRITING_USER.format(
+    fields = dict(
         project_id=project_id,
         title=title,
         hypothesis=idea["hypothesis"],
@@ -49,19 +118,26 @@ def run_writing(project_dir: Path) -> None:
         analysis=analysis,
         summary_csv=summary_csv_text,
     )
-    paper_text = router.generate(WRITING_SYSTEM, user_prompt, json_mode=False)
-
-    if "## Results" not in paper_text:
-        paper_text = "## Results\n\n" + paper_text
-    if "## Method" not in paper_text:
-        paper_text = "## Method\n\nSee plan.md for details.\n\n" + paper_text
-    if "## Limitations" not in paper_text:
-        paper_text += "\n\n## Limitations\n\n- Toy experiment with limited seeds.\n"
 
     paper_dir = project_dir / "04_paper"
     paper_dir.mkdir(parents=True, exist_ok=True)
-
-    (paper_dir / "paper.md").write_text(paper_text)
+    paper_path = paper_dir / "paper.md"
+
+    if cfg.get("mode", "stream") == "sections":
+        paper_text = _write_sections(router, fields, paper_path,
+                                     cfg.get("section_workers", len(SECTIONS)))
+    else:
+        paper_text = _stream_paper(router, WRITING_USER.format(**fields), paper_path)
+
+    patched = paper_text
+    if "## Results" not in patched:
+        patched = "## Results\n\n" + patched
+    if "## Method" not in patched:
+        patched = "## Method\n\nSee plan.md for details.\n\n" + patched
+    if "## Limitations" not in patched:
+        patched += "\n\n## Limitations\n\n- Toy experiment with limited seeds.\n"
+    if patched != paper_text:
+        paper_path.write_text(patched)
 
     repro_tmpl = env.get_template("reproducibility.md.j2")
     repro_ctx = {"project_id": project_id}
@@ -0,0 +1,387 @@
+"""Compute backends the RUN stage submits experiments to.
+
+    slurm  -- one sbatch job per project (sbatch_gen + slurm_runner)
+    pilot  -- queue work for long-lived pilot allocations (pilot_worker)
+    local  -- subprocesses on this machine, sharing its GPUs/slots between daemons
+
+Selected by `compute.backend` in config/system.yaml.  Every backend returns
+the same terminal states as slurm_runner.poll_job (COMPLETED, FAILED,
+CANCELLED, TIMEOUT, STALLED, ...), so recovery handles them uniformly.
+"""
+
+import fcntl
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from ..utils.log import get_logger
+from .heartbeat import StallWatcher, format_progress
+
+LOGGER = get_logger(__name__)
+
+
+class ComputeBackend:
+    """submit() starts the experiment for a project and returns a job handle;
+    wait() blocks until it reaches a terminal state."""
+
+    name = "base"
+
+    def submit(self, project_dir: Path, repo_root: Path, meta: dict) -> str:
+        raise NotImplementedError
+
+    def wait(self, handle: str, timeout_minutes: float,
+             heartbeat_path: Path = None, stall_minutes: float = None) -> str:
+        raise NotImplementedError
+
+    def cancel(self, handle: str) -> None:
+        raise NotImplementedError
+
+    def failure_detail(self, handle: str) -> str:
+        """Tail of the job's error output, appended to the failure reason."""
+        return ""
+
+
+class SlurmBackend(ComputeBackend):
+    name = "slurm"
+
+    def __init__(self, slurm_cfg: dict):
+        self.slurm_cfg = slurm_cfg
+        self._log_dirs = {}
+        self._project_dirs = {}
+
+    def submit(self, project_dir: Path, repo_root: Path, meta: dict) -> str:
+        from .runtime_model import predict_time_limit, write_runtime_record
+        from .sbatch_gen import generate_sbatch_script
+        from .slurm_runner import submit_job
+
+        pid = meta["project_id"]
+        log_dir = repo_root / "artifacts" / "slurm_logs" / pid
+        prediction = predict_time_limit(
+            project_dir, self.slurm_cfg, scale=meta.get("slurm_time_scale", 1.0)
+        )
+        LOGGER.info("requesting --time=%s (predicted %s s from %d past jobs)",
+                    prediction["time"], prediction["predicted_seconds"],
+                    prediction["n_history"])
+        script = generate_sbatch_script(
+            project_dir, repo_root, log_dir, self.slurm_cfg, time_limit=prediction["time"]
+        )
+        job_id = submit_job(script, "fars_" + pid, log_dir, self.slurm_cfg)
+        meta["slurm_job_id"] = job_id
+        write_runtime_record(project_dir, job_id, prediction)
+        handle = str(job_id)
+        self._log_dirs[handle] = log_dir
+        self._project_dirs[handle] = project_dir
+        return handle
+
+    def wait(self, handle: str, timeout_minutes: float,
+             heartbeat_path: Path = None, stall_minutes: float = None) -> str:
+        from .runtime_model import finish_runtime_record
+        from .slurm_runner import poll_job
+
+        job_state = poll_job(int(handle), timeout_minutes=timeout_minutes,
+                             heartbeat_path=heartbeat_path, stall_minutes=stall_minutes)
+        if handle in self._project_dirs:
+            finish_runtime_record(self._project_dirs[handle], job_state)
+        return job_state
+
+    def cancel(self, handle: str) -> None:
+        subprocess.run(["scancel", handle], capture_output=True)
+
+    def failure_detail(self, handle: str, max_chars: int = 2000) -> str:
+        log_dir = self._log_dirs.get(handle)
+        return _tail(log_dir / f"{handle}.err", max_chars) if log_dir else ""
+
+
+class PilotBackend(ComputeBackend):
+    name = "pilot"
+
+    def __init__(self, repo_root: Path, slurm_cfg: dict, pilot_cfg: dict):
+        self.repo_root = repo_root
+        self.slurm_cfg = slurm_cfg
+        self.pilot_cfg = pilot_cfg
+
+    def _queue(self):
+        from ..orchestrator.work_queue import WorkQueue
+        return WorkQueue(self.repo_root / "artifacts" / "fars.db")
+
+    def submit(self, project_dir: Path, repo_root: Path, meta: dict) -> str:
+        from .pilot_worker import ensure_pilots
+
+        queue = self._queue()
+        try:
+            work_id = queue.enqueue(meta["project_id"], str(project_dir),
+                                    self.pilot_cfg.get("max_attempts", 2))
+        finally:
+            queue.close()
+        meta["pilot_work_id"] = work_id
+        if self.pilot_cfg.get("submit_pilots", True):
+            ensure_pilots(repo_root, self.slurm_cfg, self.pilot_cfg)
+        return str(work_id)
+
+    def wait(self, handle: str, timeout_minutes: float,
+             heartbeat_path: Path = None, stall_minutes: float = None) -> str:
+        from .pilot_worker import wait_for_work
+
+        queue = self._queue()
+        try:
+            return wait_for_work(queue, int(handle), timeout_minutes,
+                                 heartbeat_path=heartbeat_path, stall_minutes=stall_minutes)
+        finally:
+            queue.close()
+
+    def cancel(self, handle: str) -> None:
+        queue = self._queue()
+        try:
+            queue.cancel(int(handle))
+        finally:
+            queue.close()
+
+    def failure_detail(self, handle: str) -> str:
+        queue = self._queue()
+        try:
+            item = queue.get(int(handle))
+        finally:
+            queue.close()
+        return (item or {}).get("error") or ""
+
+
+@dataclass
+class LocalJob:
+    handle: str
+    project_dir: Path
+    log_path: Path
+    err_path: Path
+    timeout_seconds: float
+    state: str = "PENDING"
+    proc: Optional[subprocess.Popen] = None
+    cancel_requested: bool = False
+    devices: list = field(default_factory=list)
+    leases: list = field(default_factory=list)
+
+
+class LocalBackend(ComputeBackend):
+    """Run run_experiment_standalone.py in subprocesses on this machine.
+
+    Each daemon drives one project at a time, so parallelism comes from
+    running several daemons against one pool of slots: `gpus` split into
+    groups of `gpus_per_job`, or `max_workers` CPU slots when no GPUs are
+    listed.  A slot is leased through an exclusive fcntl lock per device
+    under artifacts/local_slots, so N daemons get N distinct devices and a
+    daemon waits in submit() while every slot is busy.  Each job has its
+    own timeout, stdout/stderr logs and can be cancelled; the whole process
+    group is killed so dataloader workers die too.
+    """
+
+    name = "local"
+
+    def __init__(self, repo_root: Path, local_cfg: dict):
+        self.repo_root = repo_root
+        self.cfg = local_cfg
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._counter = 0
+
+    def _slots(self) -> list[list[str]]:
+        gpus = [str(g) for g in self.cfg.get("gpus", [])]
+        if gpus:
+            per_job = max(int(self.cfg.get("gpus_per_job", 1)), 1)
+            return [gpus[i:i + per_job] for i in range(0, len(gpus) - per_job + 1, per_job)]
+        return [[] for _ in range(max(int(self.cfg.get("max_workers", 1)), 1))]
+
+    def _try_lease(self, names: list[str], handle: str) -> Optional[list]:
+        """Lock every named lease file without blocking; None if one is held."""
+        lease_dir = self.repo_root / "artifacts" / "local_slots"
+        lease_dir.mkdir(parents=True, exist_ok=True)
+        held = []
+        for name in names:
+            f = open(lease_dir / f"{name}.lock", "a+")
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                _release(held)
+                return None
+            f.truncate(0)
+            f.write(f"{handle} pid={os.getpid()}\n")
+            f.flush()
+            held.append(f)
+        return held
+
+    def _lease_slot(self, job: LocalJob) -> None:
+        """Block until a slot is free, then lease it to the job."""
+        poll_seconds = self.cfg.get("slot_poll_seconds", 5)
+        slots = self._slots()
+        if not slots:
+            raise ValueError("compute.local: fewer gpus than gpus_per_job")
+        waiting = False
+        while True:
+            for i, devices in enumerate(slots):
+                names = [f"gpu_{d}" for d in devices] or [f"cpu_{i}"]
+                leases = self._try_lease(names, job.handle)
+                if leases is not None:
+                    job.devices, job.leases = devices, leases
+                    return
+            if not waiting:
+                LOGGER.info("local job %s waiting for a free slot", job.handle)
+                waiting = True
+            time.sleep(poll_seconds)
+
+    def submit(self, project_dir: Path, repo_root: Path, meta: dict) -> str:
+        with self._lock:
+            self._counter += 1
+            handle = f"local-{os.getpid()}-{self._counter}"
+        log_dir = repo_root / "artifacts" / "local_logs" / meta["project_id"]
+        log_dir.mkdir(parents=True, exist_ok=True)
+        job = LocalJob(
+            handle=handle,
+            project_dir=project_dir,
+            log_path=log_dir / f"{handle}.out",
+            err_path=log_dir / f"{handle}.err",
+            timeout_seconds=self.cfg.get("timeout_minutes", 120) * 60,
+        )
+        self._jobs[handle] = job
+        meta["local_job"] = handle
+
+        self._lease_slot(job)
+        env = dict(os.environ)
+        if job.devices:
+            env["CUDA_VISIBLE_DEVICES"] = ",".join(job.devices)
+        cmd = [sys.executable, "src/compute/run_experiment_standalone.py",
+               str(project_dir), str(repo_root)]
+        try:
+            with open(job.log_path, "w") as out, open(job.err_path, "w") as err:
+                # the job shares the lease fds, so its devices stay leased
+                # for as long as it runs, even if this daemon dies first
+                job.proc = subprocess.Popen(cmd, cwd=str(repo_root), stdout=out, stderr=err,
+                                            env=env, start_new_session=True,
+                                            pass_fds=[f.fileno() for f in job.leases])
+        except OSError as exc:
+            LOGGER.error("local job %s could not start: %s", handle, exc)
+            self._finish(job, "FAILED")
+            return handle
+        job.state = "RUNNING"
+        LOGGER.info("local job %s started for %s pid=%d devices=%s", handle,
+                    meta["project_id"], job.proc.pid, ",".join(job.devices) or "cpu")
+        return handle
+
+    @staticmethod
+    def _kill(job: LocalJob) -> None:
+        if job.proc is None or job.proc.poll() is not None:
+            return
+        try:
+            os.killpg(job.proc.pid, signal.SIGTERM)
+            job.proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            os.killpg(job.proc.pid, signal.SIGKILL)
+            job.proc.wait()
+        except ProcessLookupError:
+            pass
+
+    def _finish(self, job: LocalJob, state: str) -> str:
+        job.state = state
+        _release(job.leases)
+        job.leases = []
+        LOGGER.info("local job %s finished: %s", job.handle, state)
+        return state
+
+    def poll(self, handle: str) -> str:
+        job = self._jobs[handle]
+        if job.state == "RUNNING" and job.proc.poll() is not None:
+            if job.cancel_requested:
+                return self._finish(job, "CANCELLED")
+            return self._finish(job, "COMPLETED" if job.proc.returncode == 0 else "FAILED")
+        return job.state
+
+    def wait(self, handle: str, timeout_minutes: float,
+             heartbeat_path: Path = None, stall_minutes: float = None) -> str:
+        job = self._jobs[handle]
+        timeout = min(timeout_minutes * 60, job.timeout_seconds)
+        deadline = time.monotonic() + timeout
+        watcher = None
+        while self.poll(handle) == "RUNNING":
+            try:
+                job.proc.wait(timeout=5)
+                continue
+            except subprocess.TimeoutExpired:
+                pass
+            if time.monotonic() > deadline:
+                LOGGER.error("local job %s exceeded %.0f min, cancelling", handle, timeout / 60)
+                self._kill(job)
+                return self._finish(job, "TIMEOUT")
+            if heartbeat_path is not None and stall_minutes:
+                if watcher is None:
+                    watcher = StallWatcher(heartbeat_path, stall_minutes * 60)
+                hb = watcher.observe()
+                if hb is not None:
+                    LOGGER.info("local job %s progress: %s", handle, format_progress(hb))
+                elif watcher.is_stalled():
+                    LOGGER.error("local job %s heartbeat stale, cancelling", handle)
+                    self._kill(job)
+                    return self._finish(job, "STALLED")
+        return job.state
+
+    def cancel(self, handle: str) -> None:
+        job = self._jobs.get(handle)
+        if job is None:
+            return
+        job.cancel_requested = True
+        self._kill(job)
+
+    def failure_detail(self, handle: str, max_chars: int = 2000) -> str:
+        job = self._jobs.get(handle)
+        return _tail(job.err_path, max_chars) if job else ""
+
+
+def _release(leases: list) -> None:
+    # close rather than LOCK_UN: the lock is released once no process
+    # (job, or a straggling worker of it) holds the file open any more
+    for f in leases:
+        f.close()
+
+
+def _tail(path: Path, max_chars: int) -> str:
+    try:
+        text = path.read_text()
+    except OSError:
+        return ""
+    return text[-max_chars:]
+
+
+_BACKENDS = {}
+_BACKENDS_LOCK = threading.Lock()
+
+
+def get_backend(repo_root: Path, sys_cfg: dict) -> ComputeBackend:
+    """Backend named by compute.backend (default slurm). Instances are kept per
+    process so a job handle stays valid for the life of the daemon."""
+    compute_cfg = sys_cfg.get("compute", {})
+    name = compute_cfg.get("backend")
+    if name is None:
+        name = "pilot" if sys_cfg.get("pilot", {}).get("enabled") else "slurm"
+
+    with _BACKENDS_LOCK:
+        backend = _BACKENDS.get((name, repo_root))
+        if backend is None:
+            slurm_cfg = sys_cfg.get("slurm", {})
+            if name == "slurm":
+                backend = SlurmBackend(slurm_cfg)
+            elif name == "pilot":
+                backend = PilotBackend(repo_root, slurm_cfg, sys_cfg.get("pilot", {}))
+            elif name == "local":
+                backend = LocalBackend(repo_root, compute_cfg.get("local", {}))
+            else:
+                raise ValueError(f"unknown compute backend: {name}")
+            _BACKENDS[(name, repo_root)] = backend
+    # slurm/pilot settings may be edited between ticks
+    if isinstance(backend, SlurmBackend):
+        backend.slurm_cfg = sys_cfg.get("slurm", {})
+    elif isinstance(backend, PilotBackend):
+        backend.slurm_cfg = sys_cfg.get("slurm", {})
+        backend.pilot_cfg = sys_cfg.get("pilot", {})
+    return backend
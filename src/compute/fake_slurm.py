@@ -0,0 +1,451 @@
+"""Self-contained Slurm emulator for orchestration tests and benchmarks.
+
+`install` writes sbatch/squeue/sacct/scancel/sinfo wrappers into a bin
+directory; put it first on PATH and slurm_runner, partition_chooser and
+pilot_worker talk to the emulator instead of a cluster.  All state lives in
+one JSON file guarded by an flock, and time advances lazily: every command
+first moves jobs along (PENDING -> RUNNING after the queue delay, RUNNING ->
+terminal when the script exits or an injected failure fires).
+
+Scripts run as detached `bash` subprocesses with SLURM_JOB_ID set and their
+output sent to the #SBATCH -o/-e paths.  Injected outcomes (PREEMPTED,
+NODE_FAIL, OUT_OF_MEMORY, TIMEOUT) are drawn per job from configured
+probabilities, or forced with FAKE_SLURM_OUTCOME at submit time.
+
+Usage:
+    python -m src.compute.fake_slurm install /tmp/fakebin --outcome PREEMPTED=0.2
+    PATH=/tmp/fakebin:$PATH python -m src.daemon --once
+    python -m src.compute.fake_slurm bench --jobs 40 --outcome NODE_FAIL=0.1 ...
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import random
+import re
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from .runtime_model import parse_slurm_time
+
+STATE_ENV = "FAKE_SLURM_STATE"
+OUTCOME_ENV = "FAKE_SLURM_OUTCOME"
+COMMANDS = ("sbatch", "squeue", "sacct", "scancel", "sinfo")
+INJECTABLE = ("PREEMPTED", "NODE_FAIL", "OUT_OF_MEMORY", "TIMEOUT")
+
+DEFAULT_CONFIG = {
+    "queue_delay": [0.0, 0.0],     # seconds a job stays PENDING, uniform range
+    "fail_after": [0.5, 2.0],      # seconds of RUNNING before an injected failure
+    "outcomes": {},                # e.g. {"PREEMPTED": 0.1, "NODE_FAIL": 0.05}
+    "partitions": ["scavenge_gpu", "gpu", "gpu_h200"],
+    "nodes_per_partition": 4,
+    "seed": 0,
+}
+
+_SBATCH_DIRECTIVE = re.compile(r"^#SBATCH[ \t]+(\S+)(?:[ \t=]+(\S+))?", re.M)
+
+
+def _now() -> float:
+    return time.time()
+
+
+def _parse_directives(script: Path) -> dict:
+    opts = {}
+    for flag, value in _SBATCH_DIRECTIVE.findall(script.read_text()):
+        if "=" in flag:
+            flag, value = flag.split("=", 1)
+        opts[flag] = value
+    return {
+        "partition": opts.get("-p") or opts.get("--partition") or "gpu",
+        "name": opts.get("-J") or opts.get("--job-name") or script.stem,
+        "time": opts.get("--time") or opts.get("-t") or "01:00:00",
+        "out": opts.get("-o") or opts.get("--output"),
+        "err": opts.get("-e") or opts.get("--error"),
+    }
+
+
+class FakeSlurm:
+    def __init__(self, state_path: Path):
+        self.state_path = Path(state_path)
+
+    @contextmanager
+    def _locked(self):
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.state_path.with_suffix(".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                state = json.loads(self.state_path.read_text())
+            except (FileNotFoundError, json.JSONDecodeError):
+                state = {"next_id": 1000, "jobs": {}, "config": dict(DEFAULT_CONFIG)}
+            self._advance(state)
+            yield state
+            tmp = self.state_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(state, indent=1))
+            tmp.replace(self.state_path)
+
+    def configure(self, **config) -> None:
+        with self._locked() as state:
+            state["config"].update({k: v for k, v in config.items() if v is not None})
+
+    # -- job lifecycle ----------------------------------------------------
+
+    def _advance(self, state: dict) -> None:
+        now = _now()
+        for job_id, job in state["jobs"].items():
+            if job["state"] == "PENDING" and now >= job["start_at"]:
+                self._launch(job_id, job)
+            elif job["state"] == "RUNNING":
+                exit_file = Path(job["exit_file"])
+                if exit_file.exists() and exit_file.read_text().strip():
+                    code = int(exit_file.read_text().strip())
+                    self._finish(job, "COMPLETED" if code == 0 else "FAILED", code)
+                elif job["outcome"] and now - job["started_at"] >= job["fail_after"]:
+                    self._kill(job)
+                    self._finish(job, job["outcome"], 137 if job["outcome"] == "OUT_OF_MEMORY" else 1)
+                elif now - job["started_at"] > job["time_limit"]:
+                    self._kill(job)
+                    self._finish(job, "TIMEOUT", 1)
+
+    def _launch(self, job_id: str, job: dict) -> None:
+        env = dict(os.environ, SLURM_JOB_ID=job_id, SLURM_JOB_PARTITION=job["partition"])
+        env.pop(OUTCOME_ENV, None)
+        stderr = "&1" if job["err"] == job["out"] else f'"{job["err"]}"'
+        cmd = f'bash "{job["script"]}" > "{job["out"]}" 2>{stderr}; echo $? > "{job["exit_file"]}"'
+        proc = subprocess.Popen(
+            ["/bin/sh", "-c", cmd], cwd=job["cwd"], env=env,
+            # the job must not hold sbatch's stdout/stderr open, or whoever reads
+            # `sbatch --parsable` blocks until the job ends
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        job.update(state="RUNNING", pid=proc.pid, started_at=_now())
+
+    @staticmethod
+    def _kill(job: dict) -> None:
+        try:
+            os.killpg(job["pid"], signal.SIGKILL)
+        except (ProcessLookupError, PermissionError, TypeError):
+            pass
+
+    @staticmethod
+    def _finish(job: dict, final_state: str, exit_code: int) -> None:
+        job.update(state=final_state, exit_code=exit_code, ended_at=_now())
+
+    # -- commands ---------------------------------------------------------
+
+    def sbatch(self, argv: list) -> tuple[int, str, str]:
+        parser = argparse.ArgumentParser(prog="sbatch", add_help=False)
+        parser.add_argument("--parsable", action="store_true")
+        parser.add_argument("--test-only", action="store_true")
+        parser.add_argument("-p", "--partition")
+        parser.add_argument("-J", "--job-name")
+        parser.add_argument("script")
+        args, _ = parser.parse_known_args(argv)
+        script = Path(args.script).resolve()
+        if not script.exists():
+            return 1, "", f"sbatch: error: Unable to open file {args.script}\n"
+        opts = _parse_directives(script)
+        partition = args.partition or opts["partition"]
+
+        with self._locked() as state:
+            cfg = state["config"]
+            if partition not in cfg["partitions"]:
+                return 1, "", "sbatch: error: invalid partition specified: %s\n" % partition
+            job_id = str(state["next_id"])
+            rng = random.Random(f"{cfg['seed']}:{job_id}")
+            delay = rng.uniform(*cfg["queue_delay"])
+            if args.test_only:
+                start = datetime.fromtimestamp(_now() + delay).strftime("%Y-%m-%dT%H:%M:%S")
+                return 0, "", (f"sbatch: Job {job_id} to start at {start} using 1 processors "
+                               f"on nodes fake1 in partition {partition}\n")
+
+            state["next_id"] += 1
+            outcome = os.environ.get(OUTCOME_ENV) or None
+            if outcome is None:
+                roll = rng.random()
+                for name, prob in cfg["outcomes"].items():
+                    if roll < prob:
+                        outcome = name
+                        break
+                    roll -= prob
+            job_dir = self.state_path.parent / "jobs"
+            job_dir.mkdir(parents=True, exist_ok=True)
+            out = (opts["out"] or str(Path.cwd() / "slurm-%j.out")).replace("%j", job_id)
+            err = (opts["err"] or opts["out"] or str(Path.cwd() / "slurm-%j.out")).replace("%j", job_id)
+            state["jobs"][job_id] = {
+                "name": args.job_name or opts["name"],
+                "script": str(script),
+                "cwd": str(Path.cwd()),
+                "partition": partition,
+                "state": "PENDING",
+                "submitted_at": _now(),
+                "start_at": _now() + delay,
+                "time_limit": parse_slurm_time(opts["time"]),
+                "outcome": outcome if outcome in INJECTABLE else None,
+                "fail_after": rng.uniform(*cfg["fail_after"]),
+                "out": out,
+                "err": err,
+                "exit_file": str(job_dir / f"{job_id}.exit"),
+                "pid": None,
+            }
+            self._advance(state)
+        return 0, (job_id if args.parsable else f"Submitted batch job {job_id}") + "\n", ""
+
+    def squeue(self, argv: list) -> tuple[int, str, str]:
+        parser = argparse.ArgumentParser(prog="squeue", add_help=False)
+        parser.add_argument("-j", "--jobs")
+        parser.add_argument("-n", "--name")
+        parser.add_argument("-t", "--states")
+        parser.add_argument("-o", "--format", default="%i %j %T")
+        parser.add_argument("-h", "--noheader", action="store_true")
+        parser.add_argument("--me", action="store_true")
+        args, _ = parser.parse_known_args(argv)
+        wanted = set(args.states.split(",")) if args.states else {"PENDING", "RUNNING"}
+        lines = []
+        with self._locked() as state:
+            for job_id, job in state["jobs"].items():
+                if job["state"] not in ("PENDING", "RUNNING") or job["state"] not in wanted:
+                    continue
+                if args.jobs and job_id not in args.jobs.split(","):
+                    continue
+                if args.name and job["name"] != args.name:
+                    continue
+                lines.append(args.format.replace("%i", job_id).replace("%j", job["name"])
+                             .replace("%T", job["state"]).replace("%P", job["partition"]))
+        if not args.noheader:
+            lines.insert(0, args.format.replace("%i", "JOBID").replace("%j", "NAME")
+                         .replace("%T", "STATE").replace("%P", "PARTITION"))
+        return 0, "\n".join(lines) + ("\n" if lines else ""), ""
+
+    def sacct(self, argv: list) -> tuple[int, str, str]:
+        parser = argparse.ArgumentParser(prog="sacct", add_help=False)
+        parser.add_argument("-j", "--jobs")
+        parser.add_argument("--format", "-o", default="JobID,State")
+        args, _ = parser.parse_known_args(argv)
+        fields = [f.strip() for f in args.format.split(",")]
+        lines = []
+        with self._locked() as state:
+            for job_id in (args.jobs or "").split(","):
+                job = state["jobs"].get(job_id)
+                if job is None:
+                    continue
+                end = job.get("ended_at") or _now()
+                values = {
+                    "JobID": job_id,
+                    "State": job["state"],
+                    "ElapsedRaw": str(int(end - job["started_at"])) if job.get("started_at") else "0",
+                    "Partition": job["partition"],
+                    "ExitCode": f"{job.get('exit_code', 0)}:0",
+                }
+                lines.append("|".join(values.get(f, "") for f in fields))
+        return 0, "\n".join(lines) + ("\n" if lines else ""), ""
+
+    def scancel(self, argv: list) -> tuple[int, str, str]:
+        with self._locked() as state:
+            for job_id in argv:
+                job = state["jobs"].get(job_id)
+                if job and job["state"] in ("PENDING", "RUNNING"):
+                    if job["state"] == "RUNNING":
+                        self._kill(job)
+                    self._finish(job, "CANCELLED", 0)
+        return 0, "", ""
+
+    def sinfo(self, argv: list) -> tuple[int, str, str]:
+        parser = argparse.ArgumentParser(prog="sinfo", add_help=False)
+        parser.add_argument("-p", "--partition")
+        args, _ = parser.parse_known_args(argv)
+        with self._locked() as state:
+            cfg = state["config"]
+            if args.partition and args.partition not in cfg["partitions"]:
+                return 0, "", ""
+            busy = sum(1 for j in state["jobs"].values()
+                       if j["state"] == "RUNNING" and j["partition"] == args.partition)
+        total = cfg["nodes_per_partition"]
+        idle = max(total - busy, 0)
+        out = f"idle {idle}\n" + (f"alloc {total - idle}\n" if total > idle else "")
+        return 0, out, ""
+
+
+# -- installation -------------------------------------------------------------
+
+WRAPPER = """#!/bin/sh
+export {state_env}="${{{state_env}:-{state}}}"
+export PYTHONPATH="{repo_root}${{PYTHONPATH:+:$PYTHONPATH}}"
+exec "{python}" -m src.compute.fake_slurm {command} "$@"
+"""
+
+
+def install(bin_dir: Path, state_path: Path = None, **config) -> Path:
+    """Write the command wrappers and initialise the state file."""
+    bin_dir = Path(bin_dir).resolve()
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    state_path = Path(state_path or bin_dir / "fake_slurm.json").resolve()
+    repo_root = Path(__file__).resolve().parents[2]
+    for command in COMMANDS:
+        path = bin_dir / command
+        path.write_text(WRAPPER.format(
+            state_env=STATE_ENV, state=state_path, repo_root=repo_root,
+            python=sys.executable, command=command,
+        ))
+        path.chmod(0o755)
+    FakeSlurm(state_path).configure(**config)
+    return state_path
+
+
+# -- benchmark ----------------------------------------------------------------
+
+BENCH_SCRIPT = """#!/bin/bash
+#SBATCH -J {name}
+#SBATCH -p scavenge_gpu
+#SBATCH --time=00:30:00
+#SBATCH -o {log_dir}/%j.out
+#SBATCH -e {log_dir}/%j.err
+sleep {seconds}
+"""
+
+
+def bench(
+    jobs: int = 20,
+    concurrency: int = 8,
+    job_seconds: float = 1.0,
+    poll_interval: float = 0.5,
+    max_attempts: int = 4,
+    **config,
+) -> dict:
+    """Drive `jobs` projects through submit/poll/recover against the emulator.
+
+    Measures end-to-end throughput and recovery latency: the time from a
+    failure being detected to the retried job completing.
+    """
+    import logging
+
+    from ..orchestrator.recovery import handle_slurm_failure
+    from .slurm_runner import poll_job, submit_job
+
+    logging.getLogger("src").setLevel(logging.WARNING)
+    work = Path(tempfile.mkdtemp(prefix="fake_slurm_bench_"))
+    state_path = install(work / "bin", **config)
+    os.environ["PATH"] = f"{work / 'bin'}{os.pathsep}{os.environ['PATH']}"
+    os.environ[STATE_ENV] = str(state_path)
+    slurm_cfg = {"fallback_partitions": []}
+
+    def drive(i: int) -> dict:
+        project_dir = work / "projects" / f"bench_{i:03d}"
+        (project_dir / "01_plan").mkdir(parents=True)
+        (project_dir / "01_plan" / "config.yaml").write_text("baseline: {}\ntreatment: {}\n")
+        log_dir = work / "logs" / project_dir.name
+        script = project_dir / "run.sbatch"
+        script.write_text(BENCH_SCRIPT.format(name=project_dir.name, log_dir=log_dir,
+                                              seconds=job_seconds))
+        meta, failures, failed_at = {}, [], None
+        started = time.monotonic()
+        for _ in range(max_attempts):
+            job_id = submit_job(script, project_dir.name, log_dir, slurm_cfg)
+            job_state = poll_job(job_id, timeout_minutes=10, poll_interval=poll_interval,
+                                 max_poll_interval=poll_interval * 4)
+            if job_state == "COMPLETED":
+                break
+            failures.append(job_state)
+            failed_at = failed_at or time.monotonic()
+            handle_slurm_failure(job_state, project_dir, meta)
+        done = time.monotonic()
+        return {
+            "completed": job_state == "COMPLETED",
+            "seconds": done - started,
+            "failures": failures,
+            "recovery_seconds": done - failed_at if failed_at and job_state == "COMPLETED" else None,
+        }
+
+    t0 = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(drive, range(jobs)))
+    wall = time.monotonic() - t0
+
+    recoveries = sorted(r["recovery_seconds"] for r in results if r["recovery_seconds"] is not None)
+    failure_counts = {}
+    for r in results:
+        for f in r["failures"]:
+            failure_counts[f] = failure_counts.get(f, 0) + 1
+
+    def pct(values, q):
+        return round(values[min(int(q * len(values)), len(values) - 1)], 2) if values else None
+
+    return {
+        "jobs": jobs,
+        "completed": sum(r["completed"] for r in results),
+        "wall_seconds": round(wall, 2),
+        "throughput_per_min": round(60 * jobs / wall, 1),
+        "mean_job_seconds": round(statistics.mean(r["seconds"] for r in results), 2),
+        "failures": failure_counts,
+        "recovery_p50_seconds": pct(recoveries, 0.5),
+        "recovery_p95_seconds": pct(recoveries, 0.95),
+        "state_file": str(state_path),
+    }
+
+
+def _parse_outcomes(values: list) -> dict:
+    outcomes = {}
+    for item in values or []:
+        name, prob = item.split("=")
+        if name not in INJECTABLE:
+            raise SystemExit(f"unknown outcome {name}; choose from {INJECTABLE}")
+        outcomes[name] = float(prob)
+    return outcomes
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        state_path = os.environ.get(STATE_ENV)
+        if not state_path:
+            sys.stderr.write(f"{sys.argv[1]}: {STATE_ENV} is not set\n")
+            sys.exit(1)
+        rc, out, err = getattr(FakeSlurm(Path(state_path)), sys.argv[1])(sys.argv[2:])
+        sys.stdout.write(out)
+        sys.stderr.write(err)
+        sys.exit(rc)
+
+    parser = argparse.ArgumentParser(description="Fake Slurm emulator")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("install", "bench"):
+        p = sub.add_parser(name)
+        p.add_argument("--queue-delay", type=float, nargs=2, metavar=("MIN", "MAX"))
+        p.add_argument("--fail-after", type=float, nargs=2, metavar=("MIN", "MAX"))
+        p.add_argument("--outcome", action="append", metavar="STATE=PROB")
+        p.add_argument("--seed", type=int)
+    sub.choices["install"].add_argument("bin_dir", type=Path)
+    sub.choices["install"].add_argument("--state", type=Path)
+    b = sub.choices["bench"]
+    b.add_argument("--jobs", type=int, default=20)
+    b.add_argument("--concurrency", type=int, default=8)
+    b.add_argument("--job-seconds", type=float, default=1.0)
+    b.add_argument("--poll-interval", type=float, default=0.5)
+    b.add_argument("--max-attempts", type=int, default=4)
+    args = parser.parse_args()
+
+    config = {
+        "queue_delay": args.queue_delay,
+        "fail_after": args.fail_after,
+        "outcomes": _parse_outcomes(args.outcome) if args.outcome else None,
+        "seed": args.seed,
+    }
+    if args.command == "install":
+        state_path = install(args.bin_dir, args.state, **config)
+        print(f"installed fake Slurm in {args.bin_dir.resolve()} (state {state_path})")
+        print(f"export PATH={args.bin_dir.resolve()}:$PATH")
+    else:
+        result = bench(args.jobs, args.concurrency, args.job_seconds, args.poll_interval,
+                       args.max_attempts, **config)
+        print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
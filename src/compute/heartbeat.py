@@ -0,0 +1,110 @@
+"""Atomic progress heartbeat written by the experiment job and read by the daemon."""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from ..utils.log import get_logger
+from ..utils.time import utc_now
+
+LOGGER = get_logger(__name__)
+
+HEARTBEAT_FILE = "heartbeat.json"
+
+
+def heartbeat_path(project_dir: Path) -> Path:
+    return project_dir / "02_exp" / HEARTBEAT_FILE
+
+
+class RunCancelled(Exception):
+    """The run's work item was cancelled (or its lease lost) while it ran."""
+
+
+class Heartbeat:
+    """Accumulates progress fields and rewrites the heartbeat file atomically.
+
+    Every beat increments `seq`; the daemon detects stalls by watching for seq
+    changes, so clock skew between the GPU node and the daemon host is moot.
+    A pilot worker sets `cancelled` when the daemon cancels the item; the
+    experiment checks it at every progress point (check_cancelled).
+    """
+
+    def __init__(self, path: Path, **fields):
+        self.path = path
+        self.fields = dict(fields)
+        self.seq = 0
+        self.cancelled = threading.Event()
+
+    def check_cancelled(self) -> None:
+        if self.cancelled.is_set():
+            raise RunCancelled(f"work for {self.fields.get('project_id', '?')} was cancelled")
+
+    def beat(self, **fields) -> None:
+        """Rewrite the heartbeat file.  It is advisory, so a failed write (full or
+        flaky shared filesystem) is logged and the run carries on."""
+        self.fields.update(fields)
+        self.seq += 1
+        payload = {**self.fields, "seq": self.seq, "pid": os.getpid(), "updated_at": utc_now()}
+        tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(json.dumps(payload, indent=2))
+            os.replace(tmp, self.path)
+        except OSError as exc:
+            LOGGER.warning("heartbeat write to %s failed: %s", self.path, exc)
+
+
+def read_heartbeat(path: Path) -> Optional[dict]:
+    try:
+        return json.loads(path.read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def format_progress(hb: dict) -> str:
+    """One-line progress summary for the daemon log."""
+    parts = [f"phase={hb.get('phase', '?')}"]
+    if hb.get("run_id"):
+        parts.append(f"run={hb['run_id']}({hb.get('group', '?')}, seed={hb.get('seed', '?')})")
+    if hb.get("step") is not None:
+        parts.append(f"step={hb['step']}/{hb.get('max_steps') or '?'}")
+    if hb.get("loss") is not None:
+        parts.append(f"loss={hb['loss']:.4f}")
+    if hb.get("tokens_per_sec"):
+        parts.append(f"tok/s={hb['tokens_per_sec']:.0f}")
+    if hb.get("eval_done") is not None:
+        parts.append(f"eval={hb['eval_done']}/{hb.get('eval_total', '?')}")
+    return " ".join(parts)
+
+
+class StallWatcher:
+    """Tracks heartbeat changes seen by the poller and reports staleness."""
+
+    def __init__(self, path: Path, stall_seconds: float):
+        self.path = path
+        self.stall_seconds = stall_seconds
+        self._last_seq = None
+        self._last_change = None
+
+    def observe(self) -> Optional[dict]:
+        """Read the heartbeat; returns it if it changed since the last call."""
+        now = time.monotonic()
+        if self._last_change is None:
+            self._last_change = now
+        hb = read_heartbeat(self.path)
+        if hb is None or hb.get("seq") == self._last_seq:
+            return None
+        self._last_seq = hb.get("seq")
+        self._last_change = now
+        return hb
+
+    def stale_for(self) -> float:
+        if self._last_change is None:
+            return 0.0
+        return time.monotonic() - self._last_change
+
+    def is_stalled(self) -> bool:
+        return self.stale_for() > self.stall_seconds
@@ -0,0 +1,252 @@
+"""GPU-memory-aware batch size planner for LoRA fine-tuning.
+
+Estimates peak training memory analytically (weights + LoRA optimizer state +
+activations + logits + fixed overhead) and picks the largest per-device batch
+that fits, keeping the effective batch (batch x accumulation) constant.  The
+activation/logit terms are scaled by a factor calibrated from the peak memory
+recorded in past runs' metrics.json, so the model tightens as history grows.
+
+Pure Python; nothing here needs a GPU.
+
+Usage:
+    python -m src.compute.memory_planner <config.yaml> --gpu h200
+"""
+
+import argparse
+import json
+import re
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Optional
+
+import yaml
+
+GIB = 1024 ** 3
+
+DEFAULT_SAFETY = 1.1
+ACT_BYTES_PER_HIDDEN = 34.0   # per token per layer, bf16, no recomputation (Korthikanti et al.)
+LOGIT_BYTES = 10.0            # per token per vocab entry: bf16 logits + fp32 upcast + grad
+TRAINABLE_BYTES = 16.0        # per LoRA param: weight + grad + Adam m/v + fp32 master
+FIXED_OVERHEAD_GB = 1.5       # CUDA context, allocator fragmentation, kernels
+
+GPU_MEMORY_GB = {
+    "h200": 141,
+    "h100": 80,
+    "a100": 80,
+    "a100_40g": 40,
+    "l40s": 48,
+    "a40": 48,
+    "a6000": 48,
+    "rtx_5000_ada": 32,
+    "a5000": 24,
+    "rtx_3090": 24,
+    "v100": 32,
+}
+
+
+@dataclass
+class ModelSpec:
+    n_params: float
+    hidden: int
+    layers: int
+    vocab: int
+    intermediate: int
+    heads: int
+    kv_heads: int
+    head_dim: int
+
+
+MODEL_SPECS = {
+    "Qwen/Qwen3-4B-Instruct-2507": ModelSpec(
+        n_params=4.02e9, hidden=2560, layers=36, vocab=151936,
+        intermediate=9728, heads=32, kv_heads=8, head_dim=128,
+    ),
+}
+
+
+def model_spec(name: str, hf_config: Optional[dict] = None, n_params: float = None) -> ModelSpec:
+    """Resolve a ModelSpec from an HF config dict, the known table, or the model name."""
+    if hf_config:
+        hidden = hf_config["hidden_size"]
+        heads = hf_config.get("num_attention_heads", max(hidden // 128, 1))
+        return ModelSpec(
+            n_params=n_params or 12 * hf_config["num_hidden_layers"] * hidden ** 2,
+            hidden=hidden,
+            layers=hf_config["num_hidden_layers"],
+            vocab=hf_config.get("vocab_size", 32000),
+            intermediate=hf_config.get("intermediate_size", 4 * hidden),
+            heads=heads,
+            kv_heads=hf_config.get("num_key_value_heads", heads),
+            head_dim=hf_config.get("head_dim", hidden // heads),
+        )
+    if name in MODEL_SPECS:
+        return MODEL_SPECS[name]
+
+    m = re.search(r"(\d+(?:\.\d+)?)\s*[bB]\b", name)
+    params = float(m.group(1)) * 1e9 if m else 7e9
+    layers = 32 if params >= 5e9 else 28
+    hidden = int((params / (12 * layers)) ** 0.5 // 128 * 128) or 1024
+    heads = max(hidden // 128, 1)
+    return ModelSpec(
+        n_params=params, hidden=hidden, layers=layers, vocab=32000,
+        intermediate=int(hidden * 8 / 3), heads=heads, kv_heads=heads, head_dim=128,
+    )
+
+
+def lora_param_count(spec: ModelSpec, rank: int, target_modules: list[str]) -> int:
+    q_out = spec.heads * spec.head_dim
+    kv_out = spec.kv_heads * spec.head_dim
+    dims = {
+        "q_proj": (spec.hidden, q_out),
+        "k_proj": (spec.hidden, kv_out),
+        "v_proj": (spec.hidden, kv_out),
+        "o_proj": (q_out, spec.hidden),
+        "gate_proj": (spec.hidden, spec.intermediate),
+        "up_proj": (spec.hidden, spec.intermediate),
+        "down_proj": (spec.intermediate, spec.hidden),
+    }
+    per_layer = sum(rank * sum(dims[m]) for m in target_modules if m in dims)
+    return per_layer * spec.layers
+
+
+def estimate_peak_gb(
+    spec: ModelSpec,
+    batch: int,
+    seq_len: int,
+    rank: int = 16,
+    target_modules: list[str] = None,
+    quantized_4bit: bool = False,
+    calibration: float = 1.0,
+    static_gb: float = None,
+) -> dict:
+    """Estimate peak memory in GiB. static_gb overrides the weight estimate
+    (e.g. torch.cuda.memory_allocated() measured after loading)."""
+    target_modules = target_modules or ["q_proj", "v_proj", "k_proj", "o_proj"]
+    if static_gb is None:
+        bytes_per_param = 0.55 if quantized_4bit else 2.0
+        static_gb = spec.n_params * bytes_per_param / GIB
+    trainable_gb = lora_param_count(spec, rank, target_modules) * TRAINABLE_BYTES / GIB
+    tokens = batch * seq_len
+    act_gb = tokens * spec.layers * spec.hidden * ACT_BYTES_PER_HIDDEN / GIB
+    logits_gb = tokens * spec.vocab * LOGIT_BYTES / GIB
+    dynamic_gb = (act_gb + logits_gb) * calibration
+    return {
+        "static_gb": round(static_gb, 3),
+        "trainable_gb": round(trainable_gb, 3),
+        "dynamic_gb": round(dynamic_gb, 3),
+        "total_gb": round(static_gb + trainable_gb + dynamic_gb + FIXED_OVERHEAD_GB, 3),
+    }
+
+
+def calibrate(records: list[dict], default: float = 1.0) -> float:
+    """Fit the dynamic-memory scale from past runs.
+
+    Each record holds the planner inputs plus the observed peak_gb. The
+    largest observed/predicted ratio of the dynamic part is used (clipped to
+    [0.5, 3.0]) so the planner stays on the safe side of every run seen.
+    """
+    ratios = []
+    for r in records:
+        try:
+            spec = model_spec(r["model"], r.get("hf_config"), r.get("n_params"))
+            est = estimate_peak_gb(
+                spec, r["batch"], r["seq_len"], r.get("rank", 16), r.get("target_modules"),
+                r.get("quantized_4bit", False), 1.0, r.get("static_gb"),
+            )
+        except (KeyError, TypeError):
+            continue
+        fixed = est["total_gb"] - est["dynamic_gb"]
+        if est["dynamic_gb"] > 0 and r.get("peak_gb"):
+            ratios.append((r["peak_gb"] - fixed) / est["dynamic_gb"])
+    if not ratios:
+        return default
+    return round(min(max(max(ratios), 0.5), 3.0), 3)
+
+
+def load_calibration_records(projects_dir: Path, limit: int = 200) -> list[dict]:
+    """Collect memory records written by past runs (metrics.json -> memory)."""
+    records = []
+    for mf in sorted(projects_dir.glob("*/02_exp/runs/*/metrics.json"), reverse=True):
+        try:
+            mem = json.loads(mf.read_text()).get("memory")
+        except (json.JSONDecodeError, OSError):
+            continue
+        if mem and mem.get("peak_gb"):
+            records.append(mem)
+        if len(records) >= limit:
+            break
+    return records
+
+
+@dataclass
+class BatchPlan:
+    per_device_train_batch_size: int
+    gradient_accumulation_steps: int
+    estimated_peak_gb: float
+    gpu_memory_gb: float
+    calibration: float
+    fits: bool
+
+
+def plan_batch(
+    spec: ModelSpec,
+    gpu_memory_gb: float,
+    effective_batch: int,
+    seq_len: int,
+    rank: int = 16,
+    target_modules: list[str] = None,
+    quantized_4bit: bool = False,
+    calibration: float = 1.0,
+    safety: float = DEFAULT_SAFETY,
+    static_gb: float = None,
+) -> BatchPlan:
+    """Largest per-device batch dividing effective_batch whose estimate fits."""
+    effective_batch = max(int(effective_batch), 1)
+    candidates = [b for b in range(effective_batch, 0, -1) if effective_batch % b == 0]
+    est = None
+    for b in candidates:
+        est = estimate_peak_gb(spec, b, seq_len, rank, target_modules,
+                               quantized_4bit, calibration, static_gb)
+        if est["total_gb"] * safety <= gpu_memory_gb:
+            return BatchPlan(b, effective_batch // b, est["total_gb"],
+                             gpu_memory_gb, calibration, True)
+    return BatchPlan(1, effective_batch, est["total_gb"], gpu_memory_gb, calibration, False)
+
+
+def gpu_memory_from_name(name: str) -> Optional[float]:
+    """Map a GPU/gres name (e.g. 'NVIDIA H200', 'gpu:rtx_5000_ada:4') to GiB."""
+    key = name.lower().replace("nvidia", "").replace(" ", "_").strip("_")
+    for gpu, mem in sorted(GPU_MEMORY_GB.items(), key=lambda kv: -len(kv[0])):
+        if gpu in key:
+            return float(mem)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan per-device batch size for a project config")
+    parser.add_argument("config", type=Path, help="01_plan/config.yaml")
+    parser.add_argument("--gpu", default="h200", help="GPU type or memory in GiB")
+    parser.add_argument("--projects-dir", type=Path, default=Path("projects"))
+    args = parser.parse_args()
+
+    config = yaml.safe_load(args.config.read_text())
+    gpu_mem = gpu_memory_from_name(args.gpu) or float(args.gpu)
+    calibration = calibrate(load_calibration_records(args.projects_dir))
+    spec = model_spec(config.get("base_model", "Qwen/Qwen3-4B-Instruct-2507"))
+
+    for group in ("baseline", "treatment"):
+        cfg = config.get(group, {})
+        train, lora = cfg.get("train", {}), cfg.get("lora", {})
+        plan = plan_batch(
+            spec, gpu_mem,
+            train.get("per_device_train_batch_size", 4) * train.get("gradient_accumulation_steps", 4),
+            train.get("max_seq_length", 2048),
+            lora.get("rank", 16), lora.get("target_modules"),
+            "qlora" in str(cfg.get("model_config", "")).lower(),
+            calibration, train.get("memory_safety", DEFAULT_SAFETY),
+        )
+        print(f"{group}: {json.dumps(asdict(plan))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Pick the Slurm partition where a job is expected to start soonest.
+
+For every candidate partition the chooser asks the scheduler for an
+estimated start time (`sbatch --test-only`) and counts idle/mixed nodes
+(`sinfo`).  Probe results are cached in a small JSON file for a short TTL
+under an exclusive file lock, so concurrent projects reuse one probe
+instead of hammering the controller.  The cache is keyed by the partitions
+and the script's resource request (--time, --gres, --mem, ...): backfill
+start estimates depend heavily on --time, which the runtime model sets
+per project.
+
+Commands go through an injectable `runner`, so tests can point it at fake
+Slurm stubs (or put stub executables on PATH).
+"""
+
+import fcntl
+import json
+import re
+import subprocess
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+
+from ..utils.log import get_logger
+
+LOGGER = get_logger(__name__)
+
+DEFAULT_TTL_SECONDS = 120
+PROBE_TIMEOUT_SECONDS = 20
+
+_START_RE = re.compile(r"to start at (\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})")
+# #SBATCH options that change when the scheduler can start the job
+RESOURCE_OPTIONS = ("--time", "-t", "--gres", "--mem", "--cpus-per-task", "-c",
+                    "--nodes", "-N", "--ntasks", "-n")
+
+Runner = Callable[[list], subprocess.CompletedProcess]
+
+
+def _run(cmd: list) -> subprocess.CompletedProcess:
+    try:
+        return subprocess.run(cmd, capture_output=True, text=True, timeout=PROBE_TIMEOUT_SECONDS)
+    except (OSError, subprocess.TimeoutExpired) as exc:
+        return subprocess.CompletedProcess(cmd, 1, "", str(exc))
+
+
+def estimate_start_seconds(partition: str, script_path: Path, runner: Runner = _run) -> Optional[float]:
+    """Seconds until the scheduler expects the job to start, None if rejected."""
+    result = runner(["sbatch", "--test-only", "-p", partition, str(script_path)])
+    # sbatch prints the estimate on stderr: "sbatch: Job 1 to start at <ts> using ..."
+    m = _START_RE.search((result.stderr or "") + (result.stdout or ""))
+    if result.returncode != 0 or not m:
+        return None
+    start = datetime.fromisoformat(m.group(1))
+    return max((start - datetime.now()).total_seconds(), 0.0)
+
+
+def idle_nodes(partition: str, runner: Runner = _run) -> int:
+    """Nodes in the partition that are idle or only partly allocated."""
+    result = runner(["sinfo", "-h", "-p", partition, "-o", "%t %D"])
+    if result.returncode != 0:
+        return 0
+    total = 0
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[0].rstrip("*~#") in ("idle", "mix") and parts[1].isdigit():
+            total += int(parts[1])
+    return total
+
+
+def resource_request(script_path: Path) -> str:
+    """The script's #SBATCH resource options, normalised, e.g. "--gres=gpu:1 --time=02:00:00"."""
+    options = []
+    for line in script_path.read_text().splitlines():
+        if not line.startswith("#SBATCH"):
+            continue
+        words = line.split()[1:]
+        if not words:
+            continue
+        name, sep, value = words[0].partition("=")
+        if not sep and len(words) > 1:
+            value = words[1]  # "-t 02:00:00" form
+        if name in RESOURCE_OPTIONS and value:
+            options.append(f"{name}={value}")
+    return " ".join(sorted(options))
+
+
+def probe(partitions: list[str], script_path: Path, runner: Runner = _run) -> dict:
+    return {
+        p: {
+            "start_seconds": estimate_start_seconds(p, script_path, runner),
+            "idle_nodes": idle_nodes(p, runner),
+        }
+        for p in partitions
+    }
+
+
+def rank_partitions(probes: dict, partitions: list[str]) -> list[str]:
+    """Order by expected start, then idle capacity, then configured order.
+    Partitions the scheduler rejected go last."""
+    def key(p):
+        info = probes.get(p, {})
+        start = info.get("start_seconds")
+        return (start is None, start or 0.0, -info.get("idle_nodes", 0), partitions.index(p))
+    return sorted(partitions, key=key)
+
+
+def choose_partitions(
+    partitions: list[str],
+    script_path: Path,
+    cache_path: Path,
+    ttl_seconds: float = DEFAULT_TTL_SECONDS,
+    runner: Runner = _run,
+) -> list[str]:
+    """Return the candidate partitions best-first, probing at most once per TTL."""
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    cache_key = f"{','.join(partitions)}|{resource_request(script_path)}"
+    lock_path = cache_path.with_suffix(".lock")
+    with open(lock_path, "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            cache = json.loads(cache_path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            cache = {}
+
+        entry = cache.get(cache_key)
+        if entry and time.time() - entry["probed_at"] < ttl_seconds:
+            probes = entry["probes"]
+        else:
+            probes = probe(partitions, script_path, runner)
+            now = time.time()
+            # one entry per resource request now, so drop the expired ones
+            cache = {k: v for k, v in cache.items() if now - v["probed_at"] < ttl_seconds}
+            cache[cache_key] = {"probed_at": now, "probes": probes}
+            tmp = cache_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(cache, indent=2))
+            tmp.replace(cache_path)
+            LOGGER.info("partition probe: %s", probes)
+
+    ranked = rank_partitions(probes, partitions)
+    LOGGER.info("partition order: %s", ranked)
+    return ranked
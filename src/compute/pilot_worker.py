@@ -0,0 +1,224 @@
+"""Pilot-job worker: a long-lived allocation that pulls RUN work from the queue.
+
+Each pilot runs experiments in-process, so torch/CUDA initialisation, the
+HF model files on the node and the in-memory Mind2Web dataset stay warm
+between projects.  Claims are lease-based (see orchestrator/work_queue.py):
+a background thread renews the lease while an experiment runs, and a pilot
+that dies simply lets its lease expire so another pilot picks the work up.
+When the daemon cancels an item (timeout, stalled heartbeat) the renewer
+sees it and sets the heartbeat's cancelled event, and the experiment stops
+with RunCancelled at its next progress point.  A run that does not stop
+within CANCEL_GRACE_SECONDS is hung, and the pilot process exits so the
+allocation is not held by it.
+
+Usage (inside the pilot sbatch job, or locally for testing):
+    python -m src.compute.pilot_worker --repo-root . [--once]
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+from ..orchestrator.work_queue import CANCELLED, CLAIMED, COMPLETED, FAILED, WorkQueue
+from ..utils.log import get_logger
+from .heartbeat import Heartbeat, RunCancelled, StallWatcher, format_progress, heartbeat_path
+
+LOGGER = get_logger(__name__)
+
+DEFAULT_LEASE_SECONDS = 300
+IDLE_POLL_SECONDS = 15
+CANCEL_GRACE_SECONDS = 120
+PILOT_JOB_NAME = "fars_pilot"
+
+
+def _renew_loop(queue_path: Path, work_id: int, worker_id: str, lease: float,
+                stop: threading.Event, lost: threading.Event,
+                cancel: threading.Event) -> None:
+    queue = WorkQueue(queue_path)  # sqlite connections are per-thread
+    try:
+        while not stop.wait(min(lease / 3, CANCEL_GRACE_SECONDS / 4)):
+            if queue.renew(work_id, worker_id, lease):
+                continue
+            item = queue.get(work_id)
+            if item is not None and item["state"] == CANCELLED:
+                LOGGER.warning("work %d was cancelled, stopping the run", work_id)
+            else:
+                LOGGER.error("lost lease on work %d, stopping the run", work_id)
+            lost.set()
+            cancel.set()
+            break
+    finally:
+        queue.close()
+    if lost.is_set() and not stop.wait(CANCEL_GRACE_SECONDS):
+        LOGGER.error("work %d did not stop %ds after cancellation, exiting the pilot",
+                     work_id, CANCEL_GRACE_SECONDS)
+        os._exit(3)
+
+
+def run_worker(
+    repo_root: Path,
+    worker_id: str = None,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    idle_exit_seconds: float = 1200,
+    deadline_seconds: float = None,
+    once: bool = False,
+    execute: Callable = None,
+) -> int:
+    """Claim and execute work until idle for idle_exit_seconds or past the deadline.
+
+    `execute(project_dir, repo_root, heartbeat=...)` defaults to run_experiment.
+    Returns the number of items processed.
+    """
+    if execute is None:
+        from ..agents.experiment import run_experiment as execute
+
+    db_path = repo_root / "artifacts" / "fars.db"
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    queue = WorkQueue(db_path)
+    started = idle_since = time.monotonic()
+    processed = 0
+
+    LOGGER.info("pilot worker %s started", worker_id)
+    try:
+        while True:
+            if deadline_seconds and time.monotonic() - started > deadline_seconds:
+                LOGGER.info("pilot %s reached its deadline, exiting", worker_id)
+                break
+            item = queue.claim(worker_id, lease_seconds)
+            if item is None:
+                if once or time.monotonic() - idle_since > idle_exit_seconds:
+                    break
+                time.sleep(IDLE_POLL_SECONDS)
+                continue
+
+            project_dir = Path(item["project_dir"])
+            heartbeat = Heartbeat(
+                heartbeat_path(project_dir),
+                project_id=item["project_id"],
+                job_id=os.environ.get("SLURM_JOB_ID"),
+                host=socket.gethostname(),
+                worker_id=worker_id,
+            )
+            stop, lost = threading.Event(), threading.Event()
+            renewer = threading.Thread(
+                target=_renew_loop,
+                args=(db_path, item["work_id"], worker_id, lease_seconds, stop, lost,
+                      heartbeat.cancelled),
+                daemon=True,
+            )
+            renewer.start()
+            heartbeat.beat(phase="starting")
+            state, error = COMPLETED, None
+            try:
+                execute(project_dir, repo_root, heartbeat=heartbeat)
+                heartbeat.beat(phase="done")
+            except RunCancelled:
+                LOGGER.warning("work %d stopped after cancellation", item["work_id"])
+                heartbeat.beat(phase="cancelled")
+                state = CANCELLED
+            except Exception as exc:
+                LOGGER.exception("work %d failed", item["work_id"])
+                heartbeat.beat(phase="failed")
+                state, error = FAILED, f"{type(exc).__name__}: {exc}"
+            finally:
+                stop.set()
+                renewer.join()
+
+            if lost.is_set() or not queue.finish(item["work_id"], worker_id, state, error):
+                LOGGER.warning("work %d no longer held by %s, outcome dropped",
+                               item["work_id"], worker_id)
+            processed += 1
+            idle_since = time.monotonic()
+            if once:
+                break
+    finally:
+        queue.close()
+    LOGGER.info("pilot worker %s exiting after %d items", worker_id, processed)
+    return processed
+
+
+def wait_for_work(
+    queue: WorkQueue,
+    work_id: int,
+    timeout_minutes: float,
+    heartbeat_path: Path = None,
+    stall_minutes: float = None,
+    poll_seconds: float = 30,
+) -> str:
+    """Daemon side: block until the item finishes. Mirrors poll_job's states:
+    COMPLETED, FAILED, CANCELLED, STALLED or TIMEOUT."""
+    deadline = time.monotonic() + timeout_minutes * 60
+    watcher = None
+    while time.monotonic() < deadline:
+        item = queue.get(work_id)
+        if item["state"] in (COMPLETED, FAILED, CANCELLED):
+            if item["error"]:
+                LOGGER.warning("work %d %s: %s", work_id, item["state"], item["error"])
+            return item["state"]
+        if item["state"] == CLAIMED and heartbeat_path is not None and stall_minutes:
+            if watcher is None:
+                watcher = StallWatcher(heartbeat_path, stall_minutes * 60)
+            hb = watcher.observe()
+            if hb is not None:
+                LOGGER.info("work %d progress: %s", work_id, format_progress(hb))
+            elif watcher.is_stalled():
+                LOGGER.error("work %d heartbeat stale for %.0fs, cancelling",
+                             work_id, watcher.stale_for())
+                queue.cancel(work_id)
+                return "STALLED"
+        time.sleep(poll_seconds)
+    queue.cancel(work_id)
+    return "TIMEOUT"
+
+
+def running_pilots() -> int:
+    result = subprocess.run(
+        ["squeue", "--me", "-h", "-n", PILOT_JOB_NAME, "-t", "PENDING,RUNNING", "-o", "%i"],
+        capture_output=True, text=True,
+    )
+    return len([l for l in result.stdout.splitlines() if l.strip()])
+
+
+def ensure_pilots(repo_root: Path, slurm_cfg: dict, pilot_cfg: dict) -> None:
+    """Submit pilot jobs until pilot.workers are pending or running."""
+    from .sbatch_gen import generate_pilot_script
+    from .slurm_runner import submit_job
+
+    missing = pilot_cfg.get("workers", 1) - running_pilots()
+    if missing <= 0:
+        return
+    log_dir = repo_root / "artifacts" / "slurm_logs" / "pilot"
+    script = generate_pilot_script(repo_root, log_dir, slurm_cfg, pilot_cfg)
+    for _ in range(missing):
+        job_id = submit_job(script, PILOT_JOB_NAME, log_dir, slurm_cfg)
+        LOGGER.info("submitted pilot job %d", job_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FARS pilot worker")
+    parser.add_argument("--repo-root", type=Path, default=Path("."))
+    parser.add_argument("--worker-id", default=None)
+    parser.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS)
+    parser.add_argument("--idle-exit-minutes", type=float, default=20)
+    parser.add_argument("--max-hours", type=float, default=None,
+                        help="stop claiming new work after this long (set below the allocation)")
+    parser.add_argument("--once", action="store_true", help="process at most one item")
+    args = parser.parse_args()
+
+    run_worker(
+        args.repo_root.resolve(),
+        worker_id=args.worker_id,
+        lease_seconds=args.lease_seconds,
+        idle_exit_seconds=args.idle_exit_minutes * 60,
+        deadline_seconds=args.max_hours * 3600 if args.max_hours else None,
+        once=args.once,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,8 @@ Usage (invoked by sbatch_gen.py):
     python3 src/compute/run_experiment_standalone.py <project_dir> <repo_root>
 """
 
+import os
+import socket
 import sys
 from pathlib import Path
 
@@ -21,13 +23,28 @@ def main():
     if repo_root_str not in sys.path:
         sys.path.insert(0, repo_root_str)
 
-    from src.agents.experiment import run_experiment
-
     if not project_dir.is_dir():
         print(f"ERROR: project dir not found: {project_dir}")
         sys.exit(2)
 
-    run_experiment(project_dir, repo_root)
+    from src.compute.heartbeat import Heartbeat, heartbeat_path
+
+    heartbeat = Heartbeat(
+        heartbeat_path(project_dir),
+        project_id=project_dir.name,
+        job_id=os.environ.get("SLURM_JOB_ID"),
+        host=socket.gethostname(),
+    )
+    heartbeat.beat(phase="starting")
+
+    from src.agents.experiment import run_experiment
+
+    try:
+        run_experiment(project_dir, repo_root, heartbeat=heartbeat)
+    except BaseException:
+        heartbeat.beat(phase="failed")
+        raise
+    heartbeat.beat(phase="done")
     print(f"Experiment done for {project_dir.name}")
 
 
@@ -0,0 +1,282 @@
+"""History-based wall-time prediction for experiment jobs.
+
+Each RUN writes 02_exp/runtime.json with the job's workload features, the
+time limit it asked for and (once finished) its measured elapsed time from
+sacct.  A small ridge regression per GPU type is fitted on those records and
+used to request a tight per-project --time instead of the global default.
+
+Usage:
+    python -m src.compute.runtime_model report [--projects-dir projects]
+"""
+
+import argparse
+import json
+import subprocess
+from pathlib import Path
+from typing import Optional
+
+import yaml
+
+from ..utils.log import get_logger
+from ..utils.time import utc_now
+
+LOGGER = get_logger(__name__)
+
+RUNTIME_FILE = "runtime.json"
+MIN_RECORDS = 3
+RIDGE = 1e-3
+FEATURES = ("train_mtok", "train_ksteps", "eval_k")
+DEFAULT_MARGIN = 0.3
+MIN_LIMIT_SECONDS = 30 * 60
+MAX_LIMIT_SECONDS = 24 * 3600
+
+
+def parse_slurm_time(value: str) -> int:
+    """'D-HH:MM:SS', 'HH:MM:SS' or 'MM:SS' -> seconds."""
+    days = 0
+    if "-" in value:
+        d, value = value.split("-", 1)
+        days = int(d)
+    parts = [int(p) for p in value.split(":")]
+    while len(parts) < 3:
+        parts.insert(0, 0)
+    h, m, s = parts
+    return days * 86400 + h * 3600 + m * 60 + s
+
+
+def format_slurm_time(seconds: float) -> str:
+    seconds = int(seconds)
+    h, rem = divmod(seconds, 3600)
+    m, s = divmod(rem, 60)
+    return f"{h:02d}:{m:02d}:{s:02d}"
+
+
+def job_features(config: dict, n_seeds: Optional[int] = None) -> dict:
+    """Workload features of one experiment job from its 01_plan/config.yaml.
+
+    The job runs up to max_seeds pairs (see agents/experiment.py).  A limit
+    is predicted for that worst case; a finished job is fitted on the
+    n_seeds pairs it actually ran (seeds_run).
+    """
+    if n_seeds is None:
+        seeds = config.get("seeds", [42, 123])
+        n_seeds = max(config.get("sequential", {}).get("max_seeds", len(seeds)), len(seeds))
+    feats = {k: 0.0 for k in FEATURES}
+    for group in ("baseline", "treatment"):
+        cfg = config.get(group, {})
+        train = cfg.get("train", {})
+        data = cfg.get("data", {})
+        samples = data.get("max_train_samples", 2000)
+        epochs = train.get("num_train_epochs", 3)
+        batch = train.get("per_device_train_batch_size", 4) * train.get("gradient_accumulation_steps", 4)
+        feats["train_mtok"] += n_seeds * samples * epochs * train.get("max_seq_length", 2048) / 1e6
+        feats["train_ksteps"] += n_seeds * samples * epochs / max(batch, 1) / 1000
+        feats["eval_k"] += n_seeds * data.get("max_eval_samples", 500) / 1000
+    return {k: round(v, 4) for k, v in feats.items()}
+
+
+def _solve(a: list[list[float]], b: list[float]) -> list[float]:
+    """Gaussian elimination with partial pivoting."""
+    n = len(b)
+    m = [row[:] + [b[i]] for i, row in enumerate(a)]
+    for col in range(n):
+        piv = max(range(col, n), key=lambda r: abs(m[r][col]))
+        m[col], m[piv] = m[piv], m[col]
+        if abs(m[col][col]) < 1e-12:
+            continue
+        for r in range(n):
+            if r != col:
+                f = m[r][col] / m[col][col]
+                m[r] = [x - f * y for x, y in zip(m[r], m[col])]
+    return [m[i][n] / m[i][i] if abs(m[i][i]) > 1e-12 else 0.0 for i in range(n)]
+
+
+def fit(records: list[dict]) -> Optional[list[float]]:
+    """Ridge least squares: elapsed ~ b0 + sum(b_i * feature_i). The
+    intercept is not penalised."""
+    if len(records) < MIN_RECORDS:
+        return None
+    xs = [[1.0] + [r["features"].get(k, 0.0) for k in FEATURES] for r in records]
+    ys = [float(r["elapsed_seconds"]) for r in records]
+    dim = len(xs[0])
+    xtx = [[sum(x[i] * x[j] for x in xs) + (RIDGE if i == j and i > 0 else 0.0)
+            for j in range(dim)] for i in range(dim)]
+    xty = [sum(x[i] * y for x, y in zip(xs, ys)) for i in range(dim)]
+    return _solve(xtx, xty)
+
+
+def predict_seconds(coef: list[float], features: dict) -> float:
+    x = [1.0] + [features.get(k, 0.0) for k in FEATURES]
+    return max(sum(c * v for c, v in zip(coef, x)), 0.0)
+
+
+def seeds_run(project_dir: Path) -> Optional[int]:
+    """Seed pairs a finished job ran, from its last sequential look."""
+    try:
+        looks = json.loads((project_dir / "02_exp" / "sequential.json").read_text())["looks"]
+        return int(looks[-1]["seeds_run"])
+    except (OSError, ValueError, KeyError, IndexError, TypeError):
+        return None
+
+
+def load_history(projects_dir: Path) -> list[dict]:
+    """Finished, uncensored runtime records (TIMEOUT jobs only give a lower bound).
+
+    Features are those of the seeds the job ran, not of the max_seeds
+    worst case it was submitted with, so early-stopped jobs fit correctly.
+    """
+    records = []
+    for path in sorted(projects_dir.glob(f"*/02_exp/{RUNTIME_FILE}")):
+        try:
+            rec = json.loads(path.read_text())
+        except (json.JSONDecodeError, OSError):
+            continue
+        if rec.get("elapsed_seconds") and rec.get("state") == "COMPLETED":
+            project_dir = path.parents[1]
+            rec["project_id"] = project_dir.name
+            n_run = seeds_run(project_dir)
+            if n_run is not None:
+                try:
+                    config = yaml.safe_load((project_dir / "01_plan" / "config.yaml").read_text())
+                except (OSError, yaml.YAMLError):
+                    config = None
+                if isinstance(config, dict):
+                    rec["features"] = job_features(config, n_run)
+                    rec["seeds_run"] = n_run
+            records.append(rec)
+    return records
+
+
+def _model_for(history: list[dict], gres: str):
+    """Prefer a fit on the same GPU type; fall back to all history."""
+    same = [r for r in history if r.get("gres") == gres]
+    for pool in (same, history):
+        coef = fit(pool)
+        if coef is not None:
+            return coef, pool
+    return None, []
+
+
+def _margin(coef: list[float], pool: list[dict], base_margin: float) -> float:
+    """Configured margin, widened to cover the 90th percentile under-prediction."""
+    ratios = sorted(
+        r["elapsed_seconds"] / p
+        for r in pool
+        if (p := predict_seconds(coef, r["features"])) > 0
+    )
+    if not ratios:
+        return base_margin
+    p90 = ratios[min(int(0.9 * len(ratios)), len(ratios) - 1)]
+    return max(base_margin, p90 - 1.0)
+
+
+def predict_time_limit(project_dir: Path, slurm_cfg: dict, scale: float = 1.0) -> dict:
+    """Return {"time", "predicted_seconds", "features", ...} for this project.
+
+    Without enough history the configured slurm time is used. `scale` is the
+    per-project multiplier raised after a TIMEOUT.
+    """
+    config = yaml.safe_load((project_dir / "01_plan" / "config.yaml").read_text())
+    features = job_features(config)
+    gres = slurm_cfg.get("gres", "gpu:1")
+    default_seconds = parse_slurm_time(slurm_cfg.get("time", "06:00:00"))
+    rt_cfg = slurm_cfg.get("runtime_model", {})
+
+    result = {"features": features, "gres": gres, "predicted_seconds": None, "n_history": 0}
+    coef, pool = (None, [])
+    if rt_cfg.get("enabled", True):
+        coef, pool = _model_for(load_history(project_dir.parent), gres)
+
+    if coef is None:
+        limit = default_seconds * scale
+    else:
+        predicted = predict_seconds(coef, features)
+        margin = _margin(coef, pool, rt_cfg.get("margin", DEFAULT_MARGIN))
+        limit = predicted * (1 + margin) * scale
+        result.update({"predicted_seconds": round(predicted), "margin": round(margin, 3),
+                       "n_history": len(pool)})
+
+    limit = min(max(limit, rt_cfg.get("min_seconds", MIN_LIMIT_SECONDS)),
+                rt_cfg.get("max_seconds", MAX_LIMIT_SECONDS))
+    result["time"] = format_slurm_time(limit)
+    result["scale"] = scale
+    return result
+
+
+def sacct_elapsed(job_id: int) -> Optional[int]:
+    """Measured wall time of a finished job, from sacct ElapsedRaw."""
+    try:
+        result = subprocess.run(
+            ["sacct", "-j", str(job_id), "-X", "-n", "-P", "--format=ElapsedRaw"],
+            capture_output=True, text=True, timeout=30,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    for line in result.stdout.splitlines():
+        if line.strip().isdigit():
+            return int(line.strip())
+    return None
+
+
+def write_runtime_record(project_dir: Path, job_id: int, prediction: dict) -> None:
+    record = {**prediction, "job_id": job_id, "submitted_at": utc_now()}
+    (project_dir / "02_exp" / RUNTIME_FILE).write_text(json.dumps(record, indent=2))
+
+
+def finish_runtime_record(project_dir: Path, job_state: str) -> Optional[dict]:
+    """Fill in the final state and measured elapsed time after the job ends."""
+    path = project_dir / "02_exp" / RUNTIME_FILE
+    if not path.exists():
+        return None
+    record = json.loads(path.read_text())
+    record["state"] = job_state
+    record["elapsed_seconds"] = sacct_elapsed(record["job_id"])
+    record["finished_at"] = utc_now()
+    path.write_text(json.dumps(record, indent=2))
+    if record["elapsed_seconds"] and record.get("predicted_seconds"):
+        LOGGER.info("job %d elapsed %ds (predicted %ds, limit %s)", record["job_id"],
+                    record["elapsed_seconds"], record["predicted_seconds"], record["time"])
+    return record
+
+
+def report(projects_dir: Path) -> str:
+    """Predicted-at-submission vs actual wall time, plus a leave-one-out check."""
+    history = load_history(projects_dir)
+    lines = [f"{'project':<40} {'gres':<20} {'predicted':>10} {'loo':>10} {'actual':>10} {'limit':>10}"]
+    abs_err, loo_err = [], []
+    for rec in history:
+        others = [r for r in history if r is not rec]
+        coef, _ = _model_for(others, rec.get("gres"))
+        loo = predict_seconds(coef, rec["features"]) if coef else None
+        pred = rec.get("predicted_seconds")
+        actual = rec["elapsed_seconds"]
+        if pred:
+            abs_err.append(abs(pred - actual) / actual)
+        if loo:
+            loo_err.append(abs(loo - actual) / actual)
+        lines.append(
+            f"{rec['project_id']:<40} {rec.get('gres', '?'):<20} "
+            f"{format_slurm_time(pred) if pred else '-':>10} "
+            f"{format_slurm_time(loo) if loo else '-':>10} "
+            f"{format_slurm_time(actual):>10} {rec.get('time', '-'):>10}"
+        )
+    lines.append("")
+    lines.append(f"records: {len(history)}")
+    if abs_err:
+        lines.append(f"submission-time MAPE: {100 * sum(abs_err) / len(abs_err):.1f}%")
+    if loo_err:
+        lines.append(f"leave-one-out MAPE:   {100 * sum(loo_err) / len(loo_err):.1f}%")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Experiment runtime model")
+    parser.add_argument("command", choices=["report"])
+    parser.add_argument("--projects-dir", type=Path, default=Path("projects"))
+    args = parser.parse_args()
+    if args.command == "report":
+        print(report(args.projects_dir))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,8 @@
 
 from pathlib import Path
 
+from .runtime_model import parse_slurm_time
+
 
 SBATCH_TEMPLATE = """#!/bin/bash
 #SBATCH -J {job_name}
@@ -20,19 +22,39 @@ cd $FARS_ROOT
 python3 src/compute/run_experiment_standalone.py {project_dir} {repo_root}
 """
 
+PILOT_TEMPLATE = """#!/bin/bash
+#SBATCH -J {job_name}
+#SBATCH -p {partition}
+#SBATCH --gres={gres}
+#SBATCH --time={time}
+#SBATCH --mem={mem}
+#SBATCH --cpus-per-task={cpus_per_task}
+#SBATCH -o {log_dir}/%j.out
+#SBATCH -e {log_dir}/%j.err
+
+source /home/sw2572/Keys/env.sh
+source $FARS_VENV/bin/activate
+cd $FARS_ROOT
+
+python3 -m src.compute.pilot_worker --repo-root {repo_root} \\
+    --lease-seconds {lease_seconds} --idle-exit-minutes {idle_exit_minutes} --max-hours {max_hours}
+"""
+
 
 def generate_sbatch_script(
     project_dir: Path,
     repo_root: Path,
     log_dir: Path,
     slurm_cfg: dict = None,
+    time_limit: str = None,
 ) -> Path:
+    """Write 02_exp/run.sbatch; time_limit overrides the configured --time."""
     cfg = slurm_cfg or {}
     content = SBATCH_TEMPLATE.format(
         job_name="fars_" + project_dir.name,
         partition=cfg.get("partition", "gpu"),
         gres=cfg.get("gres", "gpu:rtx_5000_ada:4"),
-        time=cfg.get("time", "02:00:00"),
+        time=time_limit or cfg.get("time", "02:00:00"),
         mem=cfg.get("mem", "120G"),
         cpus_per_task=cfg.get("cpus_per_task", "16"),
         log_dir=str(log_dir),
@@ -45,3 +67,37 @@ def generate_sbatch_script(
     script_path.write_text(content)
     script_path.chmod(0o755)
     return script_path
+
+
+def generate_pilot_script(
+    repo_root: Path,
+    log_dir: Path,
+    slurm_cfg: dict = None,
+    pilot_cfg: dict = None,
+) -> Path:
+    """Write artifacts/pilot.sbatch for a long-lived pilot worker allocation."""
+    cfg = slurm_cfg or {}
+    pcfg = pilot_cfg or {}
+    time_limit = pcfg.get("time", "24:00:00")
+    hours = parse_slurm_time(time_limit) / 3600
+    log_dir.mkdir(parents=True, exist_ok=True)
+    content = PILOT_TEMPLATE.format(
+        job_name="fars_pilot",
+        partition=pcfg.get("partition", cfg.get("partition", "gpu")),
+        gres=cfg.get("gres", "gpu:rtx_5000_ada:4"),
+        time=time_limit,
+        mem=cfg.get("mem", "120G"),
+        cpus_per_task=cfg.get("cpus_per_task", "16"),
+        log_dir=str(log_dir),
+        repo_root=str(repo_root),
+        lease_seconds=pcfg.get("lease_seconds", 300),
+        idle_exit_minutes=pcfg.get("idle_exit_minutes", 20),
+        # stop claiming new work with enough allocation left to finish one
+        max_hours=round(max(hours - pcfg.get("reserve_hours", 6), 1), 2),
+    )
+
+    script_path = repo_root / "artifacts" / "pilot.sbatch"
+    script_path.parent.mkdir(parents=True, exist_ok=True)
+    script_path.write_text(content)
+    script_path.chmod(0o755)
+    return script_path
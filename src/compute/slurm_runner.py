@@ -5,6 +5,8 @@ import time
 from pathlib import Path
 
 from ..utils.log import get_logger
+from .heartbeat import StallWatcher, format_progress
+from .partition_chooser import DEFAULT_TTL_SECONDS, choose_partitions
 
 LOGGER = get_logger(__name__)
 
@@ -28,26 +30,38 @@ def submit_job(
     log_dir: Path,
     slurm_cfg: dict = None,
 ) -> int:
-    """Submit sbatch script. Falls back to alternative partitions on failure."""
+    """Submit sbatch script. Falls back to alternative partitions on failure.
+
+    With partition_selection: auto, all candidate partitions are probed and
+    tried in order of expected start time instead of configured order.
+    """
     cfg = {**DEFAULT_SLURM, **(slurm_cfg or {})}
     log_dir.mkdir(parents=True, exist_ok=True)
 
-    cmd = ["sbatch", "--parsable", str(script_path)]
-    LOGGER.info("submitting: %s", " ".join(cmd))
-    result = subprocess.run(cmd, capture_output=True, text=True)
-
-    if result.returncode != 0:
-        err = result.stderr.strip()
-        LOGGER.warning("sbatch failed: %s", err)
-
-        fallbacks = cfg.get("fallback_partitions", [])
-        for fb_partition in fallbacks:
-            LOGGER.info("retrying with partition override: %s", fb_partition)
-            retry_cmd = ["sbatch", "--parsable", "-p", fb_partition, str(script_path)]
-            result = subprocess.run(retry_cmd, capture_output=True, text=True)
-            if result.returncode == 0:
-                break
-            LOGGER.warning("fallback %s failed: %s", fb_partition, result.stderr.strip())
+    if cfg.get("partition_selection") == "auto":
+        candidates = [cfg["partition"]] + [
+            p for p in cfg.get("fallback_partitions", []) if p != cfg["partition"]
+        ]
+        # log_dir is slurm_logs/<project>; the probe cache is shared by all projects
+        ordered = choose_partitions(
+            candidates, script_path, log_dir.parent / "partition_probe.json",
+            ttl_seconds=cfg.get("partition_probe_ttl_seconds", DEFAULT_TTL_SECONDS),
+        )
+        attempts = [["sbatch", "--parsable", "-p", p, str(script_path)] for p in ordered]
+    else:
+        attempts = [["sbatch", "--parsable", str(script_path)]] + [
+            ["sbatch", "--parsable", "-p", p, str(script_path)]
+            for p in cfg.get("fallback_partitions", [])
+        ]
+
+    for i, cmd in enumerate(attempts):
+        LOGGER.info("submitting: %s", " ".join(cmd))
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode == 0:
+            break
+        LOGGER.warning("sbatch failed: %s", result.stderr.strip())
+        if i + 1 < len(attempts):
+            LOGGER.info("retrying with partition override: %s", attempts[i + 1][3])
 
     if result.returncode != 0:
         raise RuntimeError("sbatch failed on all partitions: " + result.stderr.strip())
@@ -57,9 +71,19 @@ def submit_job(
     return job_id
 
 
-def poll_job(job_id: int, timeout_minutes: int = 180) -> str:
+def poll_job(
+    job_id: int,
+    timeout_minutes: int = 180,
+    heartbeat_path: Path = None,
+    stall_minutes: float = None,
+    poll_interval: float = POLL_INTERVAL_INITIAL,
+    max_poll_interval: float = POLL_INTERVAL_MAX,
+) -> str:
+    """Poll until the job ends. With a heartbeat path, a RUNNING job whose
+    heartbeat has not changed for stall_minutes is cancelled as STALLED."""
     deadline = time.monotonic() + timeout_minutes * 60
-    interval = POLL_INTERVAL_INITIAL
+    interval = poll_interval
+    watcher = None
 
     while time.monotonic() < deadline:
         state = _get_job_state(job_id)
@@ -74,12 +98,24 @@ def poll_job(job_id: int, timeout_minutes: int = 180) -> str:
             LOGGER.warning("job %d ended with state: %s", job_id, state)
             return state
         if state in ("COMPLETING",):
-            time.sleep(5)
+            time.sleep(min(5, interval))
             continue
 
+        if state == "RUNNING" and heartbeat_path is not None and stall_minutes:
+            if watcher is None:
+                watcher = StallWatcher(heartbeat_path, stall_minutes * 60)
+            hb = watcher.observe()
+            if hb is not None:
+                LOGGER.info("job %d progress: %s", job_id, format_progress(hb))
+            elif watcher.is_stalled():
+                LOGGER.error("job %d heartbeat stale for %.0fs (limit %.0f min), cancelling",
+                             job_id, watcher.stale_for(), stall_minutes)
+                subprocess.run(["scancel", str(job_id)], capture_output=True)
+                return "STALLED"
+
         LOGGER.info("job %d state=%s, waiting %ds...", job_id, state or "UNKNOWN", int(interval))
         time.sleep(interval)
-        interval = min(interval * POLL_BACKOFF, POLL_INTERVAL_MAX)
+        interval = min(interval * POLL_BACKOFF, max_poll_interval)
 
     LOGGER.error("job %d timed out after %d minutes", job_id, timeout_minutes)
     subprocess.run(["scancel", str(job_id)], capture_output=True)
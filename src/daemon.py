@@ -79,6 +79,9 @@ def run_once(repo_root: Path) -> str:
                 break
     finally:
         storage.unlock(pid)
+    LOGGER.info("project %s LLM usage: %d tokens (%s)", pid, storage.tokens_used(pid),
+                ", ".join(f"{r['stage']}={r['total_tokens']}"
+                          for r in storage.llm_usage(by=("stage",), project_id=pid)))
     storage.close()
 
     _record_to_knowledge(repo_root, pdir, pid, state)
@@ -89,6 +92,7 @@ def run_once(repo_root: Path) -> str:
 def _record_to_knowledge(repo_root: Path, pdir: Path, pid: str, state: str) -> None:
     """Record experiment outcome into the knowledge graph for history tracking."""
     try:
+        from .knowledge import history_digest
         from .knowledge.kg_store import KnowledgeGraph
         from .knowledge.schemas import ExperimentRecord
         from .utils.time import utc_now
@@ -109,8 +113,10 @@ def _record_to_knowledge(repo_root: Path, pdir: Path, pid: str, state: str) -> N
         pattern_id = idea.get("pattern_id")
 
         actions = idea.get("actions", [])
-        if not actions and "method" in idea:
-            method = idea["method"]
+        # choices keyed by dimension: actions drops empty ones, so positions shift
+        method = {k: v for k, v in idea.get("method", {}).items()
+                  if k != "key_innovation" and isinstance(v, str) and v.strip()}
+        if not actions and method:
             actions = [
                 method.get("training_strategy", ""),
                 method.get("data_processing", ""),
@@ -146,6 +152,7 @@ def _record_to_knowledge(repo_root: Path, pdir: Path, pid: str, state: str) -> N
             project_id=pid,
             pattern_id=pattern_id,
             actions=actions,
+            method=method,
             hypothesis=hypothesis,
             outcome=outcome,
             eval_loss=primary_value,
@@ -153,8 +160,12 @@ def _record_to_knowledge(repo_root: Path, pdir: Path, pid: str, state: str) -> N
         )
 
         kg = KnowledgeGraph(kg_path)
-        kg.record_experiment(record)
-        kg.close()
+        try:
+            replaced = kg.record_experiment(record)
+            history_digest.record(kg, record.model_dump(), history_digest.digest_config(repo_root),
+                                  replaced=replaced)
+        finally:
+            kg.close()
         LOGGER.info("recorded experiment history for %s: %s", pid, outcome)
     except Exception as exc:
         LOGGER.warning("failed to record experiment history: %s", exc)
@@ -189,6 +200,12 @@ def run_daemon(repo_root: Path, max_projects: int = 0) -> None:
                 log_stats(repo_root)
             except Exception:
                 pass
+            from .llm.router import router_stats
+            from .llm.structured import repair_stats
+            for profile, stats in router_stats().items():
+                LOGGER.info("LLM profile %s: %s", profile, stats)
+            for prompt_type, stats in repair_stats().items():
+                LOGGER.info("LLM JSON %s: %s", prompt_type, stats)
         except Exception:
             LOGGER.exception("cycle %d crashed, will retry after interval", count)
 
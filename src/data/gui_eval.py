@@ -137,6 +137,7 @@ def run_model_evaluation(
     eval_examples: list[dict],
     max_new_tokens: int = 256,
     batch_size: int = 1,
+    on_progress=None,
 ) -> dict:
     """Run model inference on eval examples and compute metrics.
 
@@ -145,6 +146,7 @@ def run_model_evaluation(
         tokenizer: HuggingFace tokenizer
         eval_examples: list of {input, output, meta} dicts
         max_new_tokens: max tokens to generate
+        on_progress: optional callable(done, total), invoked every 10 examples
 
     Returns:
         dict with all metrics
@@ -186,6 +188,8 @@ def run_model_evaluation(
 
         if (i + 1) % 50 == 0:
             LOGGER.info("evaluated %d / %d", i + 1, len(eval_examples))
+        if on_progress is not None and (i + 1) % 10 == 0:
+            on_progress(i + 1, len(eval_examples))
 
     metrics = evaluate_predictions(predictions, gold_labels)
     LOGGER.info(
@@ -11,6 +11,9 @@ LOGGER = get_logger(__name__)
 
 DATASET_NAME = "osunlp/Mind2Web"
 
+# Raw dataset kept per process so long-lived pilot workers load it once.
+_RAW_DATASETS: dict = {}
+
 # ---------------------------------------------------------------------------
 # Prompt templates for different prompt_design modes
 # ---------------------------------------------------------------------------
@@ -127,6 +130,9 @@ def _extract_element_candidates(html: str, max_candidates: int = 50) -> str:
     return "\n".join(f"[{i}] {c}" for i, c in enumerate(candidates))
 
 
+DATA_PROCESSING_MODES = ("html_full", "html_simplified", "element_candidates", "accessibility_tree")
+
+
 def process_page_state(html: str, mode: str = "html_simplified") -> str:
     """Process raw HTML into model-ready page state representation."""
     if mode == "html_full":
@@ -161,7 +167,10 @@ def load_mind2web(
     LOGGER.info("loading Mind2Web dataset (train=%d, eval=%d)...",
                 max_train_samples, max_eval_samples)
 
-    ds = load_dataset(DATASET_NAME, "default", cache_dir=cache_dir, trust_remote_code=True)
+    ds = _RAW_DATASETS.get(cache_dir)
+    if ds is None:
+        ds = load_dataset(DATASET_NAME, "default", cache_dir=cache_dir, trust_remote_code=True)
+        _RAW_DATASETS[cache_dir] = ds
 
     template = PROMPT_TEMPLATES.get(prompt_design, PROMPT_TEMPLATES["standard"])
 
@@ -274,6 +283,18 @@ def _extract_element_description(action: dict) -> str:
 # Data augmentation
 # ---------------------------------------------------------------------------
 
+AUGMENTATION_STRATEGIES = (
+    "none", "task_rephrasing", "negative_sampling", "element_masking", "trajectory_augmentation",
+)
+
+# the taskspace dimensions this module dispatches on, and their implemented values
+IMPLEMENTED_DIMENSIONS = {
+    "prompt_design": tuple(PROMPT_TEMPLATES),
+    "data_processing": DATA_PROCESSING_MODES,
+    "augmentation": AUGMENTATION_STRATEGIES,
+}
+
+
 def augment_data(examples: list, strategy: str = "none") -> list:
     """Apply data augmentation to training examples."""
     if strategy == "none":
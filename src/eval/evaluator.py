@@ -121,6 +121,35 @@ def run_evaluation(project_dir):
     lines.append(f"- Treatment: mean={tr_s['mean']:.4f}, std={tr_s['std']:.4f}")
     lines.append(f"- Difference: {d:+.4f} ({'improvement' if imp else 'negative result'})")
 
+    aborted = [m for m in all_m if m.get("status") == "ABORTED"]
+    if aborted:
+        lines.extend(["", "## Early-Stopped Runs"])
+        lines.append(
+            f"{len(aborted)} run(s) were stopped early and excluded from the means above:"
+        )
+        for m in aborted:
+            lines.append(
+                f"- {m.get('run_id')} ({m.get('group')}, seed={m.get('seed')}): "
+                f"{m.get('abort_reason', 'no reason recorded')}"
+            )
+
+    seq_path = project_dir / "02_exp" / "sequential.json"
+    if seq_path.exists():
+        seq = json.loads(seq_path.read_text())
+        final = seq["looks"][-1] if seq.get("looks") else {}
+        lines.extend(["", "## Sequential Testing"])
+        lines.append(
+            f"- Seeds run: {final.get('seeds_run', 'N/A')} "
+            f"(min={seq.get('min_seeds')}, max={seq.get('max_seeds')})"
+        )
+        if "reason" in final:
+            lines.append(f"- Verdict: {final.get('verdict', 'N/A')} ({final['reason']})")
+        else:
+            lines.append(
+                f"- Verdict: {final.get('verdict', 'N/A')} "
+                f"(CI on difference: [{final.get('ci_low')}, {final.get('ci_high')}])"
+            )
+
     lines.extend(["", "## Interpretation"])
     if imp:
         lines.append(f"The treatment shows a positive effect ({d:+.4f}) on {primary_name}.")
@@ -17,4 +17,5 @@ class RunMetrics(BaseModel):
     secondary_metrics: dict = {}
     seed: int = 0
     config_hash: str = ""
-    status: str = "SUCCESS"
+    status: str = "SUCCESS"  # "SUCCESS", "FAIL", or "ABORTED" (early-stopped)
+    abort_reason: Optional[str] = None
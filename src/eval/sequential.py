@@ -0,0 +1,132 @@
+"""Sequential testing used to decide whether more seeds are worth running.
+
+After each baseline/treatment pair the experiment driver asks for a verdict on
+the primary metric.  A Welch confidence interval on the mean difference is
+compared against zero (and against an optional equivalence margin); the
+per-look significance level is Bonferroni-corrected for the maximum number of
+looks so that stopping early does not inflate the false-positive rate.
+"""
+
+import math
+import statistics
+from statistics import NormalDist
+
+WIN = "win"
+LOSS = "loss"
+EQUIVALENT = "equivalent"
+AMBIGUOUS = "ambiguous"
+
+
+EXACT_MAX_DF = 200  # above this the Cornish-Fisher expansion is accurate
+
+
+def _t_cdf_int(t: float, df: int) -> float:
+    """Student-t CDF for integer df (closed-form series in theta = atan(t/sqrt(df)))."""
+    theta = math.atan(t / math.sqrt(df))
+    c2 = math.cos(theta) ** 2
+    if df % 2:
+        term, total = 1.0, 1.0 if df > 1 else 0.0
+        for k in range(1, (df - 1) // 2):
+            term *= c2 * (2 * k) / (2 * k + 1)
+            total += term
+        a = 2 / math.pi * (theta + math.sin(theta) * math.cos(theta) * total)
+    else:
+        term, total = 1.0, 1.0
+        for k in range(1, df // 2):
+            term *= c2 * (2 * k - 1) / (2 * k)
+            total += term
+        a = math.sin(theta) * total
+    return 0.5 + a / 2  # a = P(|T| < t), signed with t
+
+
+def _t_quantile(p: float, df: float) -> float:
+    """Student-t quantile (p > 0.5), never narrower than the exact one.
+
+    Uses scipy when installed.  Otherwise the exact CDF at floor(df) is
+    inverted by bisection; the quantile falls as df grows, so rounding a
+    fractional Welch df down can only widen the interval.  Above
+    EXACT_MAX_DF the Cornish-Fisher expansion around the normal is used.
+    """
+    if df <= 0 or math.isinf(df):
+        return NormalDist().inv_cdf(p)
+    try:
+        from scipy.stats import t as student_t
+        return float(student_t.ppf(p, df))
+    except ImportError:
+        pass
+    if df <= EXACT_MAX_DF:
+        nu = max(1, int(df))
+        lo, hi = 0.0, 1.0
+        while _t_cdf_int(hi, nu) < p:
+            hi *= 2
+        for _ in range(100):
+            mid = (lo + hi) / 2
+            if _t_cdf_int(mid, nu) < p:
+                lo = mid
+            else:
+                hi = mid
+        return hi
+    z = NormalDist().inv_cdf(p)
+    z3, z5, z7 = z ** 3, z ** 5, z ** 7
+    return (
+        z
+        + (z3 + z) / (4 * df)
+        + (5 * z5 + 16 * z3 + 3 * z) / (96 * df ** 2)
+        + (3 * z7 + 19 * z5 + 17 * z3 - 15 * z) / (384 * df ** 3)
+    )
+
+
+def sequential_verdict(
+    baseline: list[float],
+    treatment: list[float],
+    higher_is_better: bool = True,
+    alpha: float = 0.05,
+    max_looks: int = 1,
+    min_effect: float = 0.0,
+) -> dict:
+    """Return a verdict dict for the current baseline/treatment samples.
+
+    verdict is one of:
+        win        -- treatment is better than baseline at the corrected level
+        loss       -- treatment is worse than baseline
+        equivalent -- CI lies entirely within +/- min_effect
+        ambiguous  -- not enough evidence yet, more seeds would help
+    """
+    n_b, n_t = len(baseline), len(treatment)
+    result = {
+        "verdict": AMBIGUOUS,
+        "diff": 0.0,
+        "ci_low": None,
+        "ci_high": None,
+        "n_baseline": n_b,
+        "n_treatment": n_t,
+    }
+    if n_b < 2 or n_t < 2:
+        return result
+
+    mean_b, mean_t = statistics.mean(baseline), statistics.mean(treatment)
+    var_b, var_t = statistics.variance(baseline), statistics.variance(treatment)
+    diff = mean_t - mean_b
+    if not higher_is_better:
+        diff = -diff
+
+    se = math.sqrt(var_b / n_b + var_t / n_t)
+    if se == 0:
+        half_width = 0.0
+    else:
+        num = (var_b / n_b + var_t / n_t) ** 2
+        den = (var_b / n_b) ** 2 / (n_b - 1) + (var_t / n_t) ** 2 / (n_t - 1)
+        df = num / den if den > 0 else float("inf")
+        per_look_alpha = alpha / max(max_looks, 1)
+        half_width = _t_quantile(1 - per_look_alpha / 2, df) * se
+
+    low, high = diff - half_width, diff + half_width
+    result.update({"diff": round(diff, 6), "ci_low": round(low, 6), "ci_high": round(high, 6)})
+
+    if low > 0:
+        result["verdict"] = WIN
+    elif high < 0:
+        result["verdict"] = LOSS
+    elif min_effect > 0 and low > -min_effect and high < min_effect:
+        result["verdict"] = EQUIVALENT
+    return result
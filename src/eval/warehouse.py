@@ -0,0 +1,352 @@
+"""Cross-project results warehouse (artifacts/results.db).
+
+One row per run, written at ANALYZE time: group, seed, status, config
+hashes and the config dimensions flattened into columns, with every metric
+in a narrow run_metrics table.  A run re-executed after a retry replaces
+its row (metrics_sha tells which metrics.json the row was read from).  Grouped aggregates are answered by SQLite
+without touching the project tree.
+
+Usage:
+    python -m src.eval.warehouse agg step_success_rate --by prompt_design
+    python -m src.eval.warehouse agg action_f1 --by data_processing --by group_name \\
+        --where group_name=treatment
+    python -m src.eval.warehouse backfill --projects-dir projects
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import re
+import sqlite3
+import time
+from pathlib import Path
+from typing import Optional
+
+import yaml
+
+from ..utils.log import get_logger
+from ..utils.time import utc_now
+
+LOGGER = get_logger(__name__)
+
+DEFAULT_DB = Path("artifacts") / "results.db"
+
+_DDL = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_pk INTEGER PRIMARY KEY AUTOINCREMENT,
+    project_id TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    group_name TEXT,
+    seed INTEGER,
+    status TEXT,
+    config_hash TEXT,       -- hash of the raw group config (metrics.json)
+    canonical_hash TEXT,    -- resolved-config hash (knowledge/config_index.py)
+    reused_from TEXT,
+    base_model TEXT,
+    training_strategy TEXT,
+    data_processing TEXT,
+    prompt_design TEXT,
+    model_config TEXT,
+    augmentation TEXT,
+    learning_rate REAL,
+    num_train_epochs REAL,
+    warmup_ratio REAL,
+    max_seq_length INTEGER,
+    effective_batch INTEGER,
+    lora_rank INTEGER,
+    lora_alpha REAL,
+    max_train_samples INTEGER,
+    primary_metric TEXT,
+    primary_value REAL,
+    config_json TEXT,
+    metrics_sha TEXT,       -- sha1 of the metrics.json the row was read from
+    ingested_at TEXT NOT NULL,
+    UNIQUE(project_id, run_id)
+);
+
+CREATE TABLE IF NOT EXISTS run_metrics (
+    name TEXT NOT NULL,
+    run_pk INTEGER NOT NULL,
+    value REAL,
+    PRIMARY KEY (name, run_pk)
+) WITHOUT ROWID;
+"""
+
+# flattened column -> (section, key, default) in a group config
+DIMENSIONS = {
+    "training_strategy": (None, "training_strategy", None),
+    "data_processing": (None, "data_processing", "html_simplified"),
+    "prompt_design": (None, "prompt_design", "standard"),
+    "model_config": (None, "model_config", "lora_r16"),
+    "augmentation": (None, "augmentation", "none"),
+    "learning_rate": ("train", "learning_rate", 2e-5),
+    "num_train_epochs": ("train", "num_train_epochs", 3),
+    "warmup_ratio": ("train", "warmup_ratio", 0.1),
+    "max_seq_length": ("train", "max_seq_length", 2048),
+    "lora_rank": ("lora", "rank", 16),
+    "lora_alpha": ("lora", "alpha", 32),
+    "max_train_samples": ("data", "max_train_samples", 2000),
+}
+COLUMNS = (
+    "project_id", "run_id", "group_name", "seed", "status", "config_hash", "canonical_hash",
+    "reused_from", "base_model", *DIMENSIONS, "effective_batch", "primary_metric",
+    "primary_value",
+)
+_CONFIG_PATH = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$")
+
+
+def _flatten(cfg: dict) -> dict:
+    row = {}
+    for column, (section, key, default) in DIMENSIONS.items():
+        block = cfg.get(section, {}) if section else cfg
+        row[column] = (block or {}).get(key, default)
+    train = cfg.get("train", {}) or {}
+    row["effective_batch"] = (train.get("per_device_train_batch_size", 4)
+                              * train.get("gradient_accumulation_steps", 4))
+    return row
+
+
+class ResultsWarehouse:
+    def __init__(self, db_path: Path):
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(db_path), timeout=10)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_DDL)
+        have = {r["name"] for r in self._conn.execute("PRAGMA table_info(runs)")}
+        if "metrics_sha" not in have:
+            self._conn.execute("ALTER TABLE runs ADD COLUMN metrics_sha TEXT")
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def ingest_project(self, project_dir: Path, project_id: str = None) -> int:
+        """Add the project's runs; a run whose metrics.json changed since it was
+        ingested (re-executed) replaces its row.  Returns the number of rows written."""
+        from ..knowledge.config_index import DEFAULT_BASE_MODEL, config_hash
+
+        runs_dir = project_dir / "02_exp" / "runs"
+        if not runs_dir.exists():
+            return 0
+        project_id = project_id or project_dir.name
+        config_path = project_dir / "01_plan" / "config.yaml"
+        plan = yaml.safe_load(config_path.read_text()) if config_path.exists() else {}
+        base_model = plan.get("base_model", DEFAULT_BASE_MODEL)
+
+        added = 0
+        for rd in sorted(runs_dir.iterdir()):
+            mf = rd / "metrics.json"
+            if not mf.exists():
+                continue
+            text = mf.read_text()
+            try:
+                m = json.loads(text)
+            except json.JSONDecodeError:
+                LOGGER.warning("skipping unreadable %s", mf)
+                continue
+            sha = hashlib.sha1(text.encode()).hexdigest()
+            group = m.get("group", "unknown")
+            cfg = m.get("config") or plan.get(group, {}) or {}
+            primary = m.get("primary_metric", {}) or {}
+            row = {
+                "project_id": project_id,
+                "run_id": m.get("run_id", rd.name),
+                "group_name": group,
+                "seed": m.get("seed"),
+                "status": m.get("status", "SUCCESS"),
+                "config_hash": m.get("config_hash"),
+                "canonical_hash": config_hash(cfg, base_model),
+                "reused_from": m.get("reused_from"),
+                "base_model": base_model,
+                **_flatten(cfg),
+                "primary_metric": primary.get("name"),
+                "primary_value": primary.get("value"),
+            }
+            old = self._conn.execute(
+                "SELECT run_pk, metrics_sha FROM runs WHERE project_id = ? AND run_id = ?",
+                (project_id, row["run_id"]),
+            ).fetchone()
+            if old is not None and old["metrics_sha"] == sha:
+                continue
+            values = (*(row[c] for c in COLUMNS), json.dumps(cfg, sort_keys=True), sha, utc_now())
+            if old is None:
+                cur = self._conn.execute(
+                    f"INSERT INTO runs ({', '.join(COLUMNS)}, config_json, metrics_sha, "
+                    f"ingested_at) VALUES ({', '.join('?' * (len(COLUMNS) + 3))})",
+                    values,
+                )
+                run_pk = cur.lastrowid
+            else:
+                run_pk = old["run_pk"]
+                self._conn.execute(
+                    f"UPDATE runs SET {', '.join(f'{c} = ?' for c in COLUMNS)}, config_json = ?, "
+                    f"metrics_sha = ?, ingested_at = ? WHERE run_pk = ?",
+                    (*values, run_pk),
+                )
+                self._conn.execute("DELETE FROM run_metrics WHERE run_pk = ?", (run_pk,))
+            metrics = dict(m.get("secondary_metrics", {}) or {})
+            if primary.get("name") is not None:
+                metrics.setdefault(primary["name"], primary.get("value"))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO run_metrics (name, run_pk, value) VALUES (?, ?, ?)",
+                [(name, run_pk, value) for name, value in metrics.items()
+                 if isinstance(value, (int, float)) and not isinstance(value, bool)],
+            )
+            added += 1
+        self._conn.commit()
+        if added:
+            LOGGER.info("warehouse: wrote %d runs from %s", added, project_id)
+        return added
+
+    def aggregate(
+        self,
+        metric: str,
+        by: list[str],
+        where: Optional[dict] = None,
+        status: str = "SUCCESS",
+        include_reused: bool = False,
+    ) -> list[dict]:
+        """mean/std/min/max/n of a metric grouped by columns or dotted config
+        paths (e.g. "lora.dropout", read from the stored config JSON)."""
+        exprs = [self._dimension_sql(d) for d in by]
+        conds, params = ["m.name = ?"], [metric]
+        if status:
+            conds.append("r.status = ?")
+            params.append(status)
+        if not include_reused:
+            conds.append("r.reused_from IS NULL")
+        for key, value in (where or {}).items():
+            conds.append(f"{self._dimension_sql(key)} = ?")
+            params.append(value)
+        select = ", ".join(f"{e} AS d{i}" for i, e in enumerate(exprs))
+        group_by = ", ".join(f"d{i}" for i in range(len(exprs)))
+        sql = (
+            f"SELECT {select + ', ' if select else ''}COUNT(*) AS n, AVG(m.value) AS mean, "
+            "AVG(m.value * m.value) AS mean_sq, MIN(m.value) AS min, MAX(m.value) AS max "
+            "FROM run_metrics m JOIN runs r ON r.run_pk = m.run_pk "
+            f"WHERE {' AND '.join(conds)}"
+            + (f" GROUP BY {group_by} ORDER BY mean DESC" if group_by else "")
+        )
+        results = []
+        for row in self._conn.execute(sql, params).fetchall():
+            n, mean = row["n"], row["mean"]
+            if not n:
+                continue
+            var = max(row["mean_sq"] - mean * mean, 0.0) * n / (n - 1) if n > 1 else 0.0
+            out = {d: row[f"d{i}"] for i, d in enumerate(by)}
+            out.update(n=n, mean=mean, std=math.sqrt(var), min=row["min"], max=row["max"])
+            results.append(out)
+        return results
+
+    def project_effects(self, metric: str) -> list[dict]:
+        """Per project (oldest first): treatment config and the baseline and
+        treatment means of a metric over successful, non-reused runs."""
+        rows = self._conn.execute(
+            "SELECT r.project_id, r.group_name, AVG(m.value) AS mean, COUNT(*) AS n, "
+            "MAX(r.config_json) AS config_json, MAX(r.run_pk) AS last_pk "
+            "FROM run_metrics m JOIN runs r ON r.run_pk = m.run_pk "
+            "WHERE m.name = ? AND r.status = 'SUCCESS' AND r.reused_from IS NULL "
+            "GROUP BY r.project_id, r.group_name",
+            (metric,),
+        ).fetchall()
+        projects = {}
+        for row in rows:
+            p = projects.setdefault(row["project_id"], {"project_id": row["project_id"]})
+            p[row["group_name"]] = {"mean": row["mean"], "n": row["n"]}
+            if row["group_name"] == "treatment":
+                p["config"] = json.loads(row["config_json"])
+            p["last_pk"] = max(p.get("last_pk", 0), row["last_pk"])
+        effects = [p for p in projects.values() if "baseline" in p and "treatment" in p]
+        return sorted(effects, key=lambda p: p.pop("last_pk"))
+
+    @staticmethod
+    def _dimension_sql(name: str) -> str:
+        if name in COLUMNS:
+            return f"r.{name}"
+        if not _CONFIG_PATH.match(name):
+            raise ValueError(f"invalid dimension: {name!r}")
+        return f"json_extract(r.config_json, '$.{name}')"
+
+    def metric_names(self) -> list[str]:
+        rows = self._conn.execute("SELECT DISTINCT name FROM run_metrics ORDER BY name")
+        return [r[0] for r in rows.fetchall()]
+
+    def count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+
+def ingest(repo_root: Path, project_dir: Path, project_id: str = None) -> int:
+    """ANALYZE-time hook: add a project's runs to the repo's warehouse."""
+    wh = ResultsWarehouse(repo_root / DEFAULT_DB)
+    try:
+        return wh.ingest_project(project_dir, project_id)
+    finally:
+        wh.close()
+
+
+def _format_table(rows: list[dict]) -> str:
+    if not rows:
+        return "(no matching runs)"
+    headers = list(rows[0])
+    cells = [[f"{v:.4f}" if isinstance(v, float) else str(v) for v in r.values()] for r in rows]
+    widths = [max(len(h), *(len(c[i]) for c in cells)) for i, h in enumerate(headers)]
+    lines = ["  ".join(h.ljust(w) for h, w in zip(headers, widths))]
+    lines.append("  ".join("-" * w for w in widths))
+    lines.extend("  ".join(c.ljust(w) for c, w in zip(cell, widths)) for cell in cells)
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FARS results warehouse")
+    parser.add_argument("--db", type=Path, default=DEFAULT_DB)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    agg = sub.add_parser("agg", help="grouped aggregate of one metric")
+    agg.add_argument("metric")
+    agg.add_argument("--by", action="append", default=[],
+                     help="column or dotted config path; repeatable")
+    agg.add_argument("--where", action="append", default=[], metavar="KEY=VALUE")
+    agg.add_argument("--status", default="SUCCESS", help="'' for all statuses")
+    agg.add_argument("--include-reused", action="store_true",
+                     help="also count runs linked from earlier projects")
+
+    backfill = sub.add_parser("backfill", help="ingest every project under a directory")
+    backfill.add_argument("--projects-dir", type=Path, default=Path("projects"))
+
+    sub.add_parser("info", help="row count, dimensions and metric names")
+    args = parser.parse_args()
+
+    wh = ResultsWarehouse(args.db)
+    try:
+        if args.cmd == "agg":
+            where = {}
+            for item in args.where:
+                key, _, value = item.partition("=")
+                where[key] = value
+            start = time.perf_counter()
+            rows = wh.aggregate(args.metric, args.by, where, args.status or None,
+                                args.include_reused)
+            elapsed = (time.perf_counter() - start) * 1000
+            print(_format_table(rows))
+            print(f"\n{len(rows)} groups in {elapsed:.1f} ms")
+        elif args.cmd == "backfill":
+            total = 0
+            for pdir in sorted(args.projects_dir.iterdir()):
+                if not (pdir / "02_exp" / "runs").is_dir():
+                    continue
+                meta_path = pdir / "meta.json"
+                pid = json.loads(meta_path.read_text()).get("project_id") \
+                    if meta_path.exists() else None
+                total += wh.ingest_project(pdir, pid)
+            print(f"wrote {total} runs ({wh.count()} total)")
+        else:
+            print(f"runs: {wh.count()}")
+            print(f"dimensions: {', '.join(COLUMNS)} (or any dotted config path)")
+            print(f"metrics: {', '.join(wh.metric_names())}")
+    finally:
+        wh.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,9 @@ from src.knowledge.method_extractor import extract_all as extract_method_units
 from src.knowledge.kg_store import KnowledgeGraph
 from src.knowledge.pattern_miner import mine_all_patterns
 from src.knowledge.pattern_ranker import rank_patterns
+from src.llm.rate_limit import set_priority
+from src.llm.usage import llm_context
+from src.orchestrator.storage import Storage
 from src.utils.log import get_logger
 
 LOGGER = get_logger("build_kb")
@@ -49,17 +52,22 @@ def step_extract_text(repo_root: Path, cfg: dict, papers: list[dict]) -> dict:
     return texts
 
 
-def step_extract_methods(cfg: dict, papers: list[dict], texts: dict, kg: KnowledgeGraph) -> int:
+def step_extract_methods(repo_root: Path, cfg: dict, papers: list[dict], texts: dict,
+                         kg: KnowledgeGraph) -> int:
     LOGGER.info("=== Step 3: Extract method units ===")
     ext_cfg = cfg.get("extraction", {})
     max_units = ext_cfg.get("max_units_per_paper", 10)
     categories = ext_cfg.get("categories")
+    pool_dir = repo_root / cfg.get("paper_pool_dir", "paper_pool")
 
     units = extract_method_units(
         papers=papers,
         texts=texts,
         max_units_per_paper=max_units,
         categories=categories,
+        concurrency=ext_cfg.get("concurrency", 8),
+        checkpoint=pool_dir / ext_cfg.get("checkpoint", "extraction_checkpoint.jsonl"),
+        max_text_chars=ext_cfg.get("max_text_chars", 12000),
     )
 
     count = kg.add_method_units(units)
@@ -102,6 +110,8 @@ def main():
 
     if not any([args.collect, args.extract, args.mine, args.all]):
         args.all = True
+    # extraction yields to the daemons' pipeline calls under the shared limiter
+    set_priority("background")
 
     repo_root = Path(__file__).resolve().parents[2]
     cfg = load_config(repo_root)
@@ -125,7 +135,13 @@ def main():
             LOGGER.error("no papers to extract from, run --collect first")
         else:
             texts = step_extract_text(repo_root, cfg, papers)
-            step_extract_methods(cfg, papers, texts, kg)
+            # extraction calls go to the same ledger as the daemons' (prompt_profile.py)
+            storage = Storage(repo_root / "artifacts" / "fars.db")
+            try:
+                with llm_context(storage, "kb_build", "extract_methods"):
+                    step_extract_methods(repo_root, cfg, papers, texts, kg)
+            finally:
+                storage.close()
 
     if args.mine or args.all:
         step_mine_patterns(cfg, kg)
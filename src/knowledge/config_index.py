@@ -0,0 +1,171 @@
+"""Index of resolved experiment configs, used to detect duplicate plans.
+
+Ideation often phrases the same treatment differently.  What actually runs
+is decided by a handful of fields in 01_plan/config.yaml, so a group config
+is resolved against the defaults experiment.py applies, reduced to the
+fields that change the computation, and hashed.  Labels the pipeline does
+not execute (training_strategy, the model_config name except for its QLoRA
+flag), monitoring knobs (logging_steps, divergence) and the per-device batch
+split chosen by auto_batch are dropped.
+
+Projects are registered in the KG's config_index table once RUN passes
+gate B; PLAN looks the new plan up before any GPU time is spent.
+"""
+
+import hashlib
+import json
+import shutil
+from pathlib import Path
+from typing import Optional
+
+import yaml
+
+from ..utils.log import get_logger
+from ..utils.time import utc_now
+
+LOGGER = get_logger(__name__)
+
+DEFAULT_TARGET_MODULES = ["q_proj", "v_proj", "k_proj", "o_proj"]
+DEFAULT_BASE_MODEL = "Qwen/Qwen3-4B-Instruct-2507"
+
+
+def open_kg(repo_root: Path):
+    from .kg_store import KnowledgeGraph
+
+    kc_path = repo_root / "config" / "knowledge.yaml"
+    kc = yaml.safe_load(kc_path.read_text()).get("knowledge", {}) if kc_path.exists() else {}
+    return KnowledgeGraph(repo_root / kc.get("kg_db_path", "artifacts/knowledge.db"))
+
+
+def _num(value):
+    """2e-5 and 0.00002, or 3 and 3.0, hash the same."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return value
+    if float(value).is_integer():
+        return int(value)
+    return float(f"{value:.10g}")
+
+
+def canonicalize(cfg: dict, base_model: str = DEFAULT_BASE_MODEL) -> dict:
+    """Resolve a group config to the fields that determine what is run."""
+    cfg = cfg or {}
+    train = cfg.get("train", {}) or {}
+    lora = cfg.get("lora", {}) or {}
+    data = cfg.get("data", {}) or {}
+    max_steps = train.get("max_steps", -1)
+    return {
+        "base_model": base_model,
+        "data_processing": cfg.get("data_processing", "html_simplified"),
+        "prompt_design": cfg.get("prompt_design", "standard"),
+        "augmentation": cfg.get("augmentation", "none"),
+        "quantized_4bit": "qlora" in str(cfg.get("model_config", "lora_r16")).lower(),
+        "lora": {
+            "rank": _num(lora.get("rank", 16)),
+            "alpha": _num(lora.get("alpha", 32)),
+            "dropout": _num(lora.get("dropout", 0.05)),
+            "target_modules": sorted(lora.get("target_modules", DEFAULT_TARGET_MODULES)),
+        },
+        "train": {
+            "learning_rate": _num(train.get("learning_rate", 2e-5)),
+            # max_steps > 0 overrides the epoch count in the trainer
+            "num_train_epochs": None if max_steps and max_steps > 0
+            else _num(train.get("num_train_epochs", 3)),
+            "max_steps": _num(max_steps) if max_steps and max_steps > 0 else None,
+            "warmup_ratio": _num(train.get("warmup_ratio", 0.1)),
+            "max_seq_length": _num(train.get("max_seq_length", 2048)),
+            "max_grad_norm": _num(train.get("max_grad_norm", 1.0)),
+            "effective_batch": _num(train.get("per_device_train_batch_size", 4)
+                                    * train.get("gradient_accumulation_steps", 4)),
+        },
+        "data": {
+            "max_train_samples": _num(data.get("max_train_samples", 2000)),
+            "max_eval_samples": _num(data.get("max_eval_samples", 500)),
+        },
+    }
+
+
+def config_hash(cfg: dict, base_model: str = DEFAULT_BASE_MODEL) -> str:
+    canonical = json.dumps(canonicalize(cfg, base_model), sort_keys=True)
+    return "sha256:" + hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+def plan_hashes(project_dir: Path) -> tuple[str, str, dict]:
+    """(treatment_hash, baseline_hash, canonical treatment) for a planned project."""
+    config = yaml.safe_load((project_dir / "01_plan" / "config.yaml").read_text())
+    base_model = config.get("base_model", DEFAULT_BASE_MODEL)
+    treatment = config.get("treatment", {})
+    return (
+        config_hash(treatment, base_model),
+        config_hash(config.get("baseline", {}), base_model),
+        canonicalize(treatment, base_model),
+    )
+
+
+def _successful_runs(project_dir: Path) -> list[Path]:
+    runs_dir = project_dir / "02_exp" / "runs"
+    if not runs_dir.exists():
+        return []
+    runs = []
+    for rd in sorted(runs_dir.iterdir()):
+        mf = rd / "metrics.json"
+        if not mf.exists():
+            continue
+        try:
+            if json.loads(mf.read_text()).get("status") == "SUCCESS":
+                runs.append(rd)
+        except json.JSONDecodeError:
+            continue
+    return runs
+
+
+def register_project(kg, project_dir: Path, project_id: str) -> None:
+    """Index a project whose runs passed gate B. Reused projects are not
+    indexed, so lookups always point at the run that produced the results."""
+    runs = _successful_runs(project_dir)
+    if not runs:
+        return
+    if any("reused_from" in json.loads((rd / "metrics.json").read_text()) for rd in runs):
+        return
+    treatment_hash, baseline_hash, canonical = plan_hashes(project_dir)
+    kg.register_config(treatment_hash, baseline_hash, project_id, str(project_dir),
+                       canonical, len(runs), utc_now())
+    LOGGER.info("indexed %s treatment %s (%d runs)", project_id, treatment_hash, len(runs))
+
+
+def find_duplicate(kg, project_dir: Path, project_id: str) -> Optional[dict]:
+    """Most recent indexed project with the same treatment whose runs still exist.
+
+    The returned row has `same_baseline` set when the baseline matches too,
+    i.e. the past results can stand in for this project's whole RUN stage.
+    """
+    treatment_hash, baseline_hash, _ = plan_hashes(project_dir)
+    matches = [
+        row for row in kg.find_configs(treatment_hash)
+        if row["project_id"] != project_id and _successful_runs(Path(row["project_dir"]))
+    ]
+    if not matches:
+        return None
+    matches.sort(key=lambda row: row["baseline_hash"] != baseline_hash)
+    match = matches[0]
+    match["same_baseline"] = match["baseline_hash"] == baseline_hash
+    return match
+
+
+def link_results(source_dir: Path, project_dir: Path, source_id: str) -> int:
+    """Copy the source project's successful run metrics into this project,
+    tagging each with reused_from. Returns the number of runs linked."""
+    runs_dir = project_dir / "02_exp" / "runs"
+    runs_dir.mkdir(parents=True, exist_ok=True)
+    count = 0
+    for rd in _successful_runs(source_dir):
+        metrics = json.loads((rd / "metrics.json").read_text())
+        metrics["reused_from"] = f"{source_id}/{rd.name}"
+        dest = runs_dir / rd.name
+        dest.mkdir(exist_ok=True)
+        (dest / "metrics.json").write_text(json.dumps(metrics, indent=2))
+        count += 1
+    seq_path = source_dir / "02_exp" / "sequential.json"
+    if seq_path.exists():
+        shutil.copy2(seq_path, project_dir / "02_exp" / "sequential.json")
+    return count
+
@@ -0,0 +1,222 @@
+"""Bounded digest of past experiments for the ideation prompt.
+
+get_history_summary() renders every experiment, so the prompt grows with
+daemon uptime.  The digest is updated once per recorded experiment and kept
+in the KG (history_digest table):
+    - outcome counts overall and per method dimension value (at most
+      MAX_VALUES per dimension, the rarest folded into "(other)");
+    - the top_n best and worst results on the primary metric;
+    - the recent_n latest experiments.
+Its rendering is cut to max_tokens, so ideation reads a fixed-size string
+instead of re-rendering the whole history.
+
+    python -m src.knowledge.history_digest rebuild|show
+"""
+
+import argparse
+from pathlib import Path
+
+import yaml
+
+from ..llm.rate_limit import estimate_tokens
+from ..utils.log import get_logger
+from ..utils.time import utc_now
+
+LOGGER = get_logger(__name__)
+
+# method dimensions tracked; experiment_history.method maps them to choices
+# (older rows only have actions, these choices in this order)
+DIMENSIONS = ("training_strategy", "data_processing", "prompt_design")
+OUTCOMES = ("success", "negative", "failed")
+MAX_VALUES = 12    # tracked per dimension
+SHOWN_VALUES = 6   # rendered per dimension, most-run first
+OTHER = "(other)"
+DEFAULTS = {"max_tokens": 800, "top_n": 5, "recent_n": 5}
+
+
+def digest_config(repo_root: Path) -> dict:
+    kc_path = repo_root / "config" / "knowledge.yaml"
+    kc = yaml.safe_load(kc_path.read_text()).get("knowledge", {}) if kc_path.exists() else {}
+    ts_path = repo_root / "config" / "taskspace.yaml"
+    ts = yaml.safe_load(ts_path.read_text()).get("taskspace", {}) if ts_path.exists() else {}
+    cfg = {**DEFAULTS, **kc.get("history_digest", {})}
+    cfg["higher_is_better"] = ts.get("higher_is_better", True)
+    cfg["metric"] = ts.get("primary_metric", "primary metric")
+    return cfg
+
+
+def empty_state() -> dict:
+    return {"n": 0, "outcomes": dict.fromkeys(OUTCOMES, 0),
+            "dimensions": {d: {} for d in DIMENSIONS}, "best": [], "worst": [], "recent": []}
+
+
+def _entry(record: dict) -> dict:
+    return {
+        "project_id": record["project_id"],
+        "actions": record.get("actions", []),
+        "hypothesis": (record.get("hypothesis") or "")[:120],
+        "outcome": record.get("outcome") or "failed",
+        "value": record.get("eval_loss"),
+    }
+
+
+def method_choices(row: dict) -> dict:
+    """Dimension -> choice of a history row.  Rows from before the method
+    column are read positionally only when no choice was dropped from actions."""
+    if row.get("method"):
+        return dict(row["method"])
+    actions = row.get("actions", [])
+    return dict(zip(DIMENSIONS, actions)) if len(actions) == len(DIMENSIONS) else {}
+
+
+def _fold_rare(values: dict) -> None:
+    """Keep MAX_VALUES buckets: merge the least-run value into OTHER."""
+    while len(values) > MAX_VALUES:
+        rare = min((v for v in values if v != OTHER), key=lambda v: values[v]["n"])
+        other = values.setdefault(OTHER, {"n": 0, "outcomes": dict.fromkeys(OUTCOMES, 0),
+                                          "sum": 0.0, "valued": 0, "best": None})
+        stats = values.pop(rare)
+        other["n"] += stats["n"]
+        other["sum"] += stats["sum"]
+        other["valued"] += stats["valued"]
+        for o in OUTCOMES:
+            other["outcomes"][o] += stats["outcomes"][o]
+        if stats["best"] is not None and (other["best"] is None or stats["best"] > other["best"]):
+            other["best"] = stats["best"]
+
+
+def update(state: dict, record: dict, cfg: dict) -> dict:
+    """Fold one experiment_history row into the digest state (in place)."""
+    entry = _entry(record)
+    sign = 1 if cfg["higher_is_better"] else -1
+    outcome = entry["outcome"] if entry["outcome"] in OUTCOMES else "failed"
+    value = entry["value"]
+
+    state["n"] += 1
+    state["outcomes"][outcome] += 1
+    choices = method_choices(record)
+    for dim in DIMENSIONS:
+        if dim not in choices:
+            continue
+        choice = choices[dim]
+        values = state["dimensions"][dim]
+        key = str(choice).strip().lower() or "(none)"
+        stats = values.setdefault(key, {"n": 0, "outcomes": dict.fromkeys(OUTCOMES, 0),
+                                        "sum": 0.0, "valued": 0, "best": None})
+        stats["n"] += 1
+        stats["outcomes"][outcome] += 1
+        if value is not None:
+            stats["sum"] += value
+            stats["valued"] += 1
+            # "best" is stored sign-adjusted so max() is always better
+            if stats["best"] is None or sign * value > stats["best"]:
+                stats["best"] = sign * value
+        _fold_rare(values)
+
+    if value is not None:
+        state["best"] = sorted(state["best"] + [entry], key=lambda e: -sign * e["value"])
+        state["best"] = state["best"][:cfg["top_n"]]
+        state["worst"] = sorted(state["worst"] + [entry], key=lambda e: sign * e["value"])
+        state["worst"] = state["worst"][:cfg["top_n"]]
+    state["recent"] = (state["recent"] + [entry])[-cfg["recent_n"]:]
+    return state
+
+
+def _fmt_entry(e: dict) -> str:
+    value = f"{e['value']:.4f}" if e["value"] is not None else "no result"
+    return f"- [{', '.join(e['actions'])}] -> {e['outcome']} ({value}): {e['hypothesis']}"
+
+
+def render(state: dict, cfg: dict) -> str:
+    """Sections in priority order; lines past max_tokens are dropped."""
+    if not state["n"]:
+        return "(no past experiments)"
+    sign = 1 if cfg["higher_is_better"] else -1
+    o = state["outcomes"]
+    sections = [[f"{state['n']} past experiments: {o['success']} success, "
+                 f"{o['negative']} negative, {o['failed']} failed "
+                 f"({cfg['metric']}, {'higher' if sign > 0 else 'lower'} is better)."]]
+    for dim in DIMENSIONS:
+        values = state["dimensions"][dim]
+        if not values:
+            continue
+        lines = [f"By {dim}:"]
+        for key, s in sorted(values.items(), key=lambda kv: -kv[1]["n"])[:SHOWN_VALUES]:
+            line = (f"- {key}: {s['n']} runs ({s['outcomes']['success']} success, "
+                    f"{s['outcomes']['negative']} negative, {s['outcomes']['failed']} failed)")
+            if s["valued"]:
+                line += f", mean {s['sum'] / s['valued']:.4f}, best {sign * s['best']:.4f}"
+            lines.append(line)
+        sections.append(lines)
+    for title, key in (("Best results:", "best"), ("Worst results:", "worst"),
+                       ("Most recent:", "recent")):
+        if state[key]:
+            sections.append([title] + [_fmt_entry(e) for e in state[key]])
+
+    out, used = [], 0
+    for lines in sections:
+        block = []
+        for line in lines:
+            cost = estimate_tokens(line)
+            if used + cost > cfg["max_tokens"]:
+                break
+            block.append(line)
+            used += cost
+        if len(block) > 1 or len(lines) == 1:
+            out.extend(block)  # never a heading without rows
+        if len(block) < len(lines):
+            break
+    return "\n".join(out)
+
+
+def rebuild(kg, cfg: dict) -> dict:
+    """Digest from the full experiment_history (first use or a re-recorded project)."""
+    state = empty_state()
+    for row in kg.get_experiment_rows():
+        update(state, row, cfg)
+    kg.save_history_digest(state, render(state, cfg), utc_now())
+    return state
+
+
+def record(kg, row: dict, cfg: dict, replaced: bool = False) -> None:
+    """Fold a just-recorded experiment in; a replaced row forces a rebuild."""
+    current = kg.get_history_digest()
+    if current is None or replaced:
+        rebuild(kg, cfg)
+        return
+    state = update(current["state"], row, cfg)
+    kg.save_history_digest(state, render(state, cfg), utc_now())
+
+
+def read(kg, cfg: dict) -> str:
+    """The stored rendering; built once from the history if there is none yet."""
+    current = kg.get_history_digest()
+    if current is None:
+        if not kg.count_experiments():
+            return "(no past experiments)"
+        state = rebuild(kg, cfg)
+        return render(state, cfg)
+    return current["rendered"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Experiment history digest")
+    parser.add_argument("command", choices=["rebuild", "show"])
+    args = parser.parse_args()
+    from .config_index import open_kg
+
+    repo_root = Path(__file__).resolve().parents[2]
+    cfg = digest_config(repo_root)
+    kg = open_kg(repo_root)
+    try:
+        if args.command == "rebuild":
+            rebuild(kg, cfg)
+        text = read(kg, cfg)
+    finally:
+        kg.close()
+    print(text)
+    print(f"\n(~{estimate_tokens(text)} tokens, budget {cfg['max_tokens']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -49,6 +49,7 @@ CREATE TABLE IF NOT EXISTS experiment_history (
     project_id TEXT NOT NULL,
     pattern_id TEXT,
     actions TEXT,            -- JSON array
+    method TEXT,             -- JSON object, method dimension -> choice
     hypothesis TEXT,
     outcome TEXT,
     eval_loss REAL,
@@ -56,10 +57,39 @@ CREATE TABLE IF NOT EXISTS experiment_history (
     UNIQUE(project_id)
 );
 
+CREATE TABLE IF NOT EXISTS config_index (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    treatment_hash TEXT NOT NULL,
+    baseline_hash TEXT NOT NULL,
+    project_id TEXT NOT NULL,
+    project_dir TEXT NOT NULL,
+    canonical TEXT,          -- JSON of the canonical treatment config
+    n_runs INTEGER DEFAULT 0,
+    timestamp TEXT,
+    UNIQUE(project_id)
+);
+
+CREATE TABLE IF NOT EXISTS idea_queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idea TEXT NOT NULL,      -- JSON idea as written to 00_idea/idea.json
+    novelty REAL,
+    source_project TEXT,
+    created_at TEXT,
+    taken_by TEXT            -- project that consumed it, NULL while queued
+);
+
+CREATE TABLE IF NOT EXISTS history_digest (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    state TEXT NOT NULL,     -- JSON, see history_digest.py
+    rendered TEXT NOT NULL,  -- prompt text within the token budget
+    updated_at TEXT
+);
+
 CREATE INDEX IF NOT EXISTS idx_mu_category ON method_units(category);
 CREATE INDEX IF NOT EXISTS idx_mr_from ON method_relations(from_id);
 CREATE INDEX IF NOT EXISTS idx_mr_to ON method_relations(to_id);
 CREATE INDEX IF NOT EXISTS idx_eh_actions ON experiment_history(actions);
+CREATE INDEX IF NOT EXISTS idx_ci_treatment ON config_index(treatment_hash);
 """
 
 
@@ -69,6 +99,9 @@ class KnowledgeGraph:
         self._conn = sqlite3.connect(str(db_path))
         self._conn.row_factory = sqlite3.Row
         self._conn.executescript(_SCHEMA_SQL)
+        have = {r["name"] for r in self._conn.execute("PRAGMA table_info(experiment_history)")}
+        if "method" not in have:
+            self._conn.execute("ALTER TABLE experiment_history ADD COLUMN method TEXT")
         self._conn.commit()
 
     def close(self):
@@ -188,21 +221,37 @@ class KnowledgeGraph:
 
     # -- Experiment History --
 
-    def record_experiment(self, record: ExperimentRecord) -> None:
+    def record_experiment(self, record: ExperimentRecord) -> bool:
+        """Insert or replace a project's outcome; True if it replaced an earlier one."""
+        replaced = self._conn.execute(
+            "SELECT 1 FROM experiment_history WHERE project_id = ?", (record.project_id,)
+        ).fetchone() is not None
         self._conn.execute(
             """INSERT OR REPLACE INTO experiment_history
-               (project_id, pattern_id, actions, hypothesis, outcome, eval_loss, timestamp)
-               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+               (project_id, pattern_id, actions, method, hypothesis, outcome, eval_loss,
+                timestamp)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
             (record.project_id, record.pattern_id,
-             json.dumps(record.actions), record.hypothesis,
+             json.dumps(record.actions), json.dumps(record.method), record.hypothesis,
              record.outcome, record.eval_loss, record.timestamp),
         )
         self._conn.commit()
+        return replaced
+
+    def get_experiment_rows(self) -> list[dict]:
+        rows = self._conn.execute(
+            "SELECT project_id, actions, method, hypothesis, outcome, eval_loss "
+            "FROM experiment_history ORDER BY id"
+        ).fetchall()
+        return [{**dict(r), "actions": json.loads(r["actions"]) if r["actions"] else [],
+                 "method": json.loads(r["method"]) if r["method"] else {}}
+                for r in rows]
 
     def get_tried_combinations(self) -> list[dict]:
-        """Return list of {actions, hypothesis, outcome} for all past experiments."""
+        """Return list of {actions, method, hypothesis, outcome} for all past experiments."""
         rows = self._conn.execute(
-            "SELECT actions, hypothesis, outcome, eval_loss FROM experiment_history ORDER BY id"
+            "SELECT actions, hypothesis, outcome, eval_loss, method "
+            "FROM experiment_history ORDER BY id"
         ).fetchall()
         results = []
         for r in rows:
@@ -211,6 +260,7 @@ class KnowledgeGraph:
                 "hypothesis": r[1] or "",
                 "outcome": r[2] or "",
                 "eval_loss": r[3],
+                "method": json.loads(r[4]) if r[4] else {},
             })
         return results
 
@@ -230,6 +280,85 @@ class KnowledgeGraph:
     def count_experiments(self) -> int:
         return self._conn.execute("SELECT COUNT(*) FROM experiment_history").fetchone()[0]
 
+    def get_history_digest(self) -> Optional[dict]:
+        row = self._conn.execute(
+            "SELECT state, rendered, updated_at FROM history_digest WHERE id = 1"
+        ).fetchone()
+        if row is None:
+            return None
+        return {"state": json.loads(row["state"]), "rendered": row["rendered"],
+                "updated_at": row["updated_at"]}
+
+    def save_history_digest(self, state: dict, rendered: str, updated_at: str) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO history_digest (id, state, rendered, updated_at) "
+            "VALUES (1, ?, ?, ?)",
+            (json.dumps(state), rendered, updated_at),
+        )
+        self._conn.commit()
+
+    # -- Config Index --
+
+    def register_config(self, treatment_hash: str, baseline_hash: str, project_id: str,
+                        project_dir: str, canonical: dict, n_runs: int, timestamp: str) -> None:
+        self._conn.execute(
+            """INSERT OR REPLACE INTO config_index
+               (treatment_hash, baseline_hash, project_id, project_dir, canonical, n_runs, timestamp)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (treatment_hash, baseline_hash, project_id, project_dir,
+             json.dumps(canonical, sort_keys=True), n_runs, timestamp),
+        )
+        self._conn.commit()
+
+    def find_configs(self, treatment_hash: str) -> list[dict]:
+        """Past projects that ran this treatment, newest first."""
+        rows = self._conn.execute(
+            "SELECT * FROM config_index WHERE treatment_hash = ? ORDER BY id DESC",
+            (treatment_hash,),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def count_configs(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM config_index").fetchone()[0]
+
+    # -- Idea Queue --
+
+    def enqueue_ideas(self, ideas: list[tuple[dict, float]], source_project: str,
+                      created_at: str) -> None:
+        self._conn.executemany(
+            "INSERT INTO idea_queue (idea, novelty, source_project, created_at) "
+            "VALUES (?, ?, ?, ?)",
+            [(json.dumps(idea), novelty, source_project, created_at) for idea, novelty in ideas],
+        )
+        self._conn.commit()
+
+    def take_queued_ideas(self, project_id: str, since: str = None) -> list[dict]:
+        """Claim every queued idea (created after `since`), most novel first.
+        Claimed ideas are not handed out again."""
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            rows = self._conn.execute(
+                "SELECT id, idea, novelty FROM idea_queue WHERE taken_by IS NULL "
+                "AND created_at >= ? ORDER BY novelty DESC, id",
+                (since or "",),
+            ).fetchall()
+            self._conn.execute(
+                "UPDATE idea_queue SET taken_by = ? WHERE taken_by IS NULL", (project_id,)
+            )
+        return [{"id": r["id"], "idea": json.loads(r["idea"]), "novelty": r["novelty"]}
+                for r in rows]
+
+    def return_queued_ideas(self, ids: list[int]) -> None:
+        self._conn.executemany(
+            "UPDATE idea_queue SET taken_by = NULL WHERE id = ?", [(i,) for i in ids]
+        )
+        self._conn.commit()
+
+    def count_queued_ideas(self) -> int:
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM idea_queue WHERE taken_by IS NULL"
+        ).fetchone()[0]
+
     # -- Stats --
 
     def get_stats(self) -> dict:
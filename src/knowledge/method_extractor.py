@@ -1,7 +1,19 @@
-"""Extract method units from paper text using GPT-4o."""
+"""Extract method units from paper text using GPT-4o.
 
+extract_all runs papers concurrently on a thread pool; the shared router
+applies the profile's RPM/TPM limits and retries 429s and transient errors.
+With a checkpoint path every finished paper is appended to a JSONL file, and
+papers already in it are skipped, so a crashed build resumes where it
+stopped.  Delete the checkpoint to re-extract after changing the prompt or
+extraction settings.
+"""
+
+import contextvars
 import hashlib
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
 from typing import Optional
 
 from ..llm.router import get_router
@@ -23,10 +35,11 @@ def extract_method_units(
     text: str,
     max_units: int = 10,
     categories: Optional[list[str]] = None,
+    max_text_chars: int = 12000,
 ) -> list[MethodUnit]:
-    """Use GPT-4o to extract method units from a paper's text."""
-    if len(text) > 12000:
-        text = text[:12000]
+    """Use GPT-4o to extract method units from a paper's text (cut to max_text_chars)."""
+    if len(text) > max_text_chars:
+        text = text[:max_text_chars]
 
     cat_hint = ""
     if categories:
@@ -40,13 +53,16 @@ def extract_method_units(
     )
 
     router = get_router("azure_gpt4o")
-    raw = router.generate(METHOD_EXTRACTION_SYSTEM, user_prompt, json_mode=True)
+    raw = router.generate(METHOD_EXTRACTION_SYSTEM, user_prompt, json_mode=True,
+                          prompt_type="method_extraction")
 
     try:
         data = json.loads(raw)
-    except json.JSONDecodeError:
-        LOGGER.error("method extraction returned non-JSON for %s", paper_id)
-        return []
+    except json.JSONDecodeError as exc:
+        # raise rather than return [], so extract_all does not checkpoint the
+        # paper as done; the cached reply is dropped so the retry is a new call
+        router.invalidate(METHOD_EXTRACTION_SYSTEM, user_prompt, json_mode=True)
+        raise ValueError(f"method extraction returned non-JSON for {paper_id}") from exc
 
     units_data = data.get("method_units", data.get("methods", []))
     if isinstance(units_data, dict):
@@ -74,28 +90,75 @@ def extract_method_units(
     return units
 
 
+def _load_checkpoint(path: Path) -> dict[str, list[MethodUnit]]:
+    done = {}
+    if not path.exists():
+        return done
+    for line in path.read_text().splitlines():
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError:
+            continue  # torn final line from a crash
+        done[entry["paper_id"]] = [MethodUnit(**u) for u in entry["units"]]
+    return done
+
+
 def extract_all(
     papers: list[dict],
     texts: dict[str, str],
     max_units_per_paper: int = 10,
     categories: Optional[list[str]] = None,
+    concurrency: int = 1,
+    checkpoint: Optional[Path] = None,
+    max_text_chars: int = 12000,
 ) -> list[MethodUnit]:
-    """Extract method units from all papers."""
-    all_units = []
-    for paper in papers:
+    """Extract method units from all papers, `concurrency` at a time."""
+    done = _load_checkpoint(checkpoint) if checkpoint else {}
+    todo = [
+        p for p in papers
+        if p.get("paper_id", "") not in done and len(texts.get(p.get("paper_id", ""), "")) >= 100
+    ]
+    if done:
+        LOGGER.info("resuming extraction: %d papers checkpointed, %d to go", len(done), len(todo))
+
+    lock = threading.Lock()
+    if checkpoint:
+        checkpoint.parent.mkdir(parents=True, exist_ok=True)
+
+    def run(paper: dict) -> list[MethodUnit]:
         pid = paper.get("paper_id", "")
-        text = texts.get(pid, "")
-        if not text or len(text) < 100:
-            continue
-
         units = extract_method_units(
             paper_id=pid,
             paper_title=paper.get("title", ""),
-            text=text,
+            text=texts[pid],
             max_units=max_units_per_paper,
             categories=categories,
+            max_text_chars=max_text_chars,
         )
-        all_units.extend(units)
+        if checkpoint:
+            line = json.dumps({"paper_id": pid, "units": [u.model_dump() for u in units]})
+            with lock, checkpoint.open("a") as f:
+                f.write(line + "\n")
+        return units
+
+    results = dict(done)
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        # each worker gets a copy of the caller's context for token accounting
+        futures = {pool.submit(contextvars.copy_context().run, run, p): p.get("paper_id", "")
+                   for p in todo}
+        for future in as_completed(futures):
+            pid = futures[future]
+            try:
+                results[pid] = future.result()
+            except Exception as exc:
+                # not checkpointed, so the next run retries it
+                failed += 1
+                LOGGER.error("method extraction failed for %s: %s", pid, exc)
 
-    LOGGER.info("total method units extracted: %d from %d papers", len(all_units), len(papers))
+    all_units = []
+    for paper in papers:
+        all_units.extend(results.get(paper.get("paper_id", ""), []))
+    LOGGER.info("total method units extracted: %d from %d papers (%d failed)",
+                len(all_units), len(papers), failed)
     return all_units
@@ -39,6 +39,7 @@ class ExperimentRecord(BaseModel):
     project_id: str
     pattern_id: Optional[str] = None
     actions: list[str] = Field(default_factory=list)
+    method: dict[str, str] = Field(default_factory=dict)  # dimension -> choice
     hypothesis: str = ""
     outcome: str = ""  # "success", "negative", "failed"
     eval_loss: Optional[float] = None
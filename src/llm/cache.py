@@ -0,0 +1,202 @@
+"""Content-addressed LLM response cache (artifacts/llm_cache.db).
+
+Keyed by sha256 over (provider, model, temperature, json_mode, system,
+user).  Modes:
+    off           -- no caching
+    deterministic -- readwrite, but only for calls whose answer should not
+                     vary: temperature 0 or one of `prompt_types` (default
+                     method_extraction).  Sampled generations (ideation,
+                     planning, writing) always reach the model, so two
+                     identical prompts do not get the same stored sample.
+    readwrite     -- serve hits, store misses, for every call
+    replay        -- serve hits, a miss raises CacheMissError (offline,
+                     deterministic re-runs of a recorded pipeline)
+
+Least-recently-used entries are evicted once the stored responses exceed
+max_mb.  Selected by llm.cache in config/system.yaml; FARS_LLM_CACHE
+overrides the mode (e.g. FARS_LLM_CACHE=replay for benchmarks).
+
+    python -m src.llm.cache stats|clear [--db artifacts/llm_cache.db]
+"""
+
+import argparse
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from ..utils.log import get_logger
+
+LOGGER = get_logger(__name__)
+
+MODES = ("off", "deterministic", "readwrite", "replay")
+WRITE_MODES = ("deterministic", "readwrite")
+DETERMINISTIC_PROMPT_TYPES = ("method_extraction",)
+DEFAULT_MAX_MB = 512
+
+_DDL = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    provider TEXT,
+    model TEXT,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_llm_cache_lru ON llm_cache(last_used);
+"""
+
+
+class CacheMissError(LookupError):
+    """Replay mode found no recorded response for a request."""
+
+
+def cache_key(provider: str, model: str, temperature: float, json_mode: bool,
+              system: str, user: str) -> str:
+    payload = json.dumps([provider, model, temperature, bool(json_mode), system, user])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResponseCache:
+    """Thread-safe; one instance is shared by every router in the process."""
+
+    def __init__(self, db_path: Path, mode: str = "deterministic",
+                 max_mb: float = DEFAULT_MAX_MB,
+                 prompt_types: tuple = DETERMINISTIC_PROMPT_TYPES):
+        if mode not in MODES:
+            raise ValueError(f"unknown LLM cache mode: {mode} (expected one of {MODES})")
+        self.mode = mode
+        self.prompt_types = tuple(prompt_types)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(db_path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_DDL)
+        self._total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM llm_cache"
+        ).fetchone()[0]
+
+    def applies(self, prompt_type: Optional[str], temperature: float) -> bool:
+        """Whether a call is served from / stored in the cache in this mode."""
+        if self.mode != "deterministic":
+            return True
+        return temperature == 0 or prompt_type in self.prompt_types
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._conn.execute(
+                    "UPDATE llm_cache SET last_used = ?, hits = hits + 1 WHERE key = ?",
+                    (time.time(), key),
+                )
+                self._conn.commit()
+        if row is None and self.mode == "replay":
+            raise CacheMissError(f"no recorded LLM response for key {key[:16]}")
+        return row[0] if row else None
+
+    def put(self, key: str, provider: str, model: str, response: str) -> None:
+        if self.mode not in WRITE_MODES:
+            return
+        size = len(response.encode())
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT size FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache "
+                "(key, provider, model, response, size, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, provider, model, response, size, now, now),
+            )
+            self._total += size - (old[0] if old else 0)
+            if self._total > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Drop least-recently-used entries down to 90% of max_bytes."""
+        target = int(self.max_bytes * 0.9)
+        # other processes share the file, so re-count before deleting
+        self._total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM llm_cache"
+        ).fetchone()[0]
+        removed = 0
+        rows = self._conn.execute(
+            "SELECT key, size FROM llm_cache ORDER BY last_used"
+        ).fetchall()
+        for key, size in rows:
+            if self._total <= target:
+                break
+            self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._total -= size
+            removed += 1
+        LOGGER.info("LLM cache evicted %d entries (%.1f MB kept)", removed, self._total / 2**20)
+
+    def invalidate(self, key: str) -> None:
+        """Forget a response the caller rejected, so a retry asks again."""
+        if self.mode not in WRITE_MODES:
+            return
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self._total -= row[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+            self._total = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "entries": entries,
+            "size_mb": round(self._total / 2**20, 2),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM response cache")
+    parser.add_argument("command", choices=["stats", "clear"])
+    parser.add_argument("--db", type=Path, default=Path("artifacts") / "llm_cache.db")
+    args = parser.parse_args()
+    cache = ResponseCache(args.db)
+    try:
+        if args.command == "clear":
+            cache.clear()
+        stats = cache.stats()
+        print(json.dumps({k: stats[k] for k in ("entries", "size_mb")}))
+    finally:
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
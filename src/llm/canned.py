@@ -0,0 +1,203 @@
+"""Schema-valid canned responses per prompt type, for offline runs.
+
+Used by the mock provider and by the local stub server (stub_server.py), so
+the pipeline's parsers, structured.generate_json and the gates accept what
+they get.  The prompt type is the router's prompt_type (sent to the stub as
+an X-Prompt-Type header) or is recognised from the system prompt.  Method
+choices are drawn from the taskspace's exploration_dimensions, so successive
+ideas differ the way real ones do, restricted like the ideation prompt's
+(preflight.dimension_values) so canned plans pass preflight.
+"""
+
+import copy
+import json
+import random
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+import yaml
+
+from .prompts import (
+    IDEATION_ENHANCED_SYSTEM,
+    JSON_FIX_SYSTEM,
+    METHOD_EXTRACTION_SYSTEM,
+    PLANNING_SYSTEM,
+    REVISE_SYSTEM,
+    WRITING_SYSTEM,
+)
+from .structured import _balanced_object
+from .tool_schemas import EXPERIMENT_PLAN_SCHEMA, RESEARCH_IDEA_SCHEMA
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+SYSTEM_PROMPTS = {
+    METHOD_EXTRACTION_SYSTEM: "method_extraction",
+    IDEATION_ENHANCED_SYSTEM: "ideation",
+    PLANNING_SYSTEM: "planning",
+    REVISE_SYSTEM: "revise",
+    WRITING_SYSTEM: "writing",
+    JSON_FIX_SYSTEM: "json_fix",
+}
+
+UNIT_CATEGORIES = ["grounding", "action_prediction", "training_strategy", "prompt_design",
+                   "data_augmentation", "evaluation", "architecture"]
+
+# plausible values for numeric fields, by property name
+_NUMBERS = {
+    "learning_rate": 2e-4, "num_train_epochs": 1, "lora_rank": 16, "rank": 16, "alpha": 32,
+    "dropout": 0.05, "max_seq_length": 2048, "batch_size": 4,
+    "per_device_train_batch_size": 4, "gradient_accumulation_steps": 4,
+    "warmup_ratio": 0.03, "max_steps": 200, "max_train_samples": 2000,
+    "max_eval_samples": 200, "budget_estimate_minutes": 30, "confidence": 0.8,
+}
+
+
+@lru_cache(maxsize=1)
+def _taskspace() -> dict:
+    path = REPO_ROOT / "config" / "taskspace.yaml"
+    return yaml.safe_load(path.read_text()).get("taskspace", {}) if path.exists() else {}
+
+
+@lru_cache(maxsize=1)
+def _dimensions() -> dict:
+    from ..agents.preflight import dimension_values
+
+    return {name: values or ["default"] for name, values in dimension_values(_taskspace()).items()}
+
+
+def prompt_type_of(system: str) -> str:
+    return SYSTEM_PROMPTS.get(system, "other")
+
+
+def sample(schema: dict, rng: random.Random, name: str = "") -> object:
+    """A value valid under schema (the structured.py subset)."""
+    if "default" in schema:
+        return copy.deepcopy(schema["default"])
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    kind = schema.get("type", "object")
+    if isinstance(kind, list):
+        kind = next((k for k in kind if k != "null"), "null")
+    if kind == "object":
+        return {key: sample(sub, rng, key) for key, sub in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [sample(schema.get("items", {"type": "string"}), rng, name)
+                for _ in range(max(schema.get("minItems", 0), 1))]
+    if kind in ("integer", "number"):
+        value = _NUMBERS.get(name, 1)
+        return int(value) if kind == "integer" else value
+    if kind == "boolean":
+        return True
+    if kind == "null":
+        return None
+    if name in _dimensions():
+        return rng.choice(_dimensions()[name])
+    return f"stub {name or 'text'}"
+
+
+def _method(rng: random.Random) -> dict:
+    method = {dim: rng.choice(values) for dim, values in _dimensions().items()}
+    method["key_innovation"] = "Combines " + " with ".join(
+        str(v) for v in list(method.values())[:2]) + "."
+    return method
+
+
+def _idea(rng: random.Random) -> dict:
+    idea = sample(RESEARCH_IDEA_SCHEMA, rng)
+    method = _method(rng)
+    idea.update({
+        "title": f"{method.get('training_strategy', 'sft')} with "
+                 f"{method.get('prompt_design', 'standard')} prompting "
+                 f"(stub {rng.randrange(10**6)})",
+        "hypothesis": f"{method.get('training_strategy', 'sft')} on "
+                      f"{method.get('data_processing', 'html')} inputs improves step success.",
+        "method": {**idea["method"], **method},
+        "config_hints": {k: _NUMBERS[k] for k in
+                         ("learning_rate", "num_train_epochs", "lora_rank",
+                          "max_seq_length", "batch_size")},
+        "rationale": "Canned response from the LLM stub.",
+    })
+    return idea
+
+
+def _plan(user: str, rng: random.Random) -> dict:
+    plan = sample(EXPERIMENT_PLAN_SCHEMA, rng)
+    method = None
+    match = re.search(r"^Method: (\{.*)", user, re.MULTILINE | re.DOTALL)
+    if match:
+        try:
+            method = json.loads(_balanced_object(match.group(1)) or "")
+        except json.JSONDecodeError:
+            method = None
+    ts_baseline = _taskspace().get("baseline", {})
+    baseline = {dim: ts_baseline.get(dim, values[0]) for dim, values in _dimensions().items()}
+    plan["baseline"].update(baseline)
+    plan["treatment"].update(method if isinstance(method, dict) else _method(rng))
+    plan["treatment"].pop("key_innovation", None)
+    plan["plan_summary"] = "Compare the baseline configuration against the proposed method."
+    plan["variables"] = [k for k in baseline if plan["treatment"].get(k) != baseline[k]]
+    if not plan["variables"]:
+        # a treatment identical to the baseline fails preflight
+        others = {d: [v for v in values if v != baseline[d]]
+                  for d, values in _dimensions().items()}
+        dim = rng.choice([d for d, values in others.items() if values])
+        plan["treatment"][dim] = rng.choice(others[dim])
+        plan["variables"] = [dim]
+    return plan
+
+
+def _units(user: str, rng: random.Random) -> dict:
+    match = re.search(r"Extract up to (\d+) method units", user)
+    n = min(int(match.group(1)) if match else 3, 3)
+    return {"method_units": [{
+        "name": f"stub method {rng.randrange(10**6)}",
+        "category": rng.choice(UNIT_CATEGORIES),
+        "description": "Canned method unit from the LLM stub.",
+        "inputs": ["prompt_template"],
+        "outputs": ["higher element accuracy"],
+        "confidence": _NUMBERS["confidence"],
+    } for _ in range(n)]}
+
+
+def _json_fix(user: str, rng: random.Random) -> dict:
+    match = re.search(r"matching this schema:\s*(\{.*)", user, re.DOTALL)
+    try:
+        schemas = json.loads(_balanced_object(match.group(1)) or "") if match else {}
+    except json.JSONDecodeError:
+        schemas = {}
+    return {key: sample(sub, rng, key) for key, sub in schemas.items()}
+
+
+def _section(name: str) -> str:
+    return (f"## {name}\n\nCanned {name.lower()} text from the LLM stub. "
+            f"See fig1.png for the comparison.")
+
+
+def _paper(user: str) -> str:
+    one = re.search(r'Write ONLY the "## (.+?)" section', user)
+    if one:
+        return _section(one.group(1))
+    listed = re.search(r"sections: (.+)", user)
+    names = ([s.strip().lstrip("#").strip() for s in listed.group(1).split(",")]
+             if listed else ["Introduction", "Method", "Results", "Limitations", "Conclusion"])
+    return "\n\n".join(_section(n) for n in names)
+
+
+def respond(system: str, user: str, prompt_type: Optional[str] = None,
+            rng: Optional[random.Random] = None) -> str:
+    """Response text for one call: JSON for the JSON prompts, markdown for writing."""
+    rng = rng or random.Random()
+    kind = prompt_type or prompt_type_of(system)
+    if kind.endswith("_fix") or system == JSON_FIX_SYSTEM:
+        return json.dumps(_json_fix(user, rng))
+    if kind == "method_extraction":
+        return json.dumps(_units(user, rng))
+    if kind in ("ideation", "revise"):
+        return json.dumps(_idea(rng))
+    if kind == "planning":
+        return json.dumps(_plan(user, rng))
+    if kind in ("writing", "writing_section"):
+        return _paper(user)
+    return json.dumps({})
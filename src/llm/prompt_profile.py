@@ -0,0 +1,149 @@
+"""How large each prompt template gets, and how good the token estimate is.
+
+The router records every billed call's prompt size in llm_calls: the
+characters sent, the offline estimate (rate_limit.estimate_tokens) and
+the prompt/completion tokens Azure reports.  `report` gives p50/p95 per
+prompt type and stage, sorted by token share, with the median
+estimate/actual ratio; `templates` shows each template's fixed part
+(everything but the filled-in fields), so the variable part of a prompt
+is the reported size minus that.  JSON follow-ups are recorded as
+"<prompt type>_fix" (structured.py) and all use the json_fix template;
+report rows grouped by prompt type name their template and its fixed size.
+
+    python -m src.llm.prompt_profile report [--db artifacts/fars.db] [--by prompt_type --by stage]
+    python -m src.llm.prompt_profile templates
+"""
+
+import argparse
+import string
+from pathlib import Path
+
+from . import prompts
+from .rate_limit import estimate_tokens
+from .usage import print_table
+
+# prompt type (router prompt_type) -> (system prompt, user template)
+TEMPLATES = {
+    "method_extraction": ("METHOD_EXTRACTION_SYSTEM", "METHOD_EXTRACTION_USER"),
+    "ideation": ("IDEATION_ENHANCED_SYSTEM", "IDEATION_ENHANCED_USER"),
+    "planning": ("PLANNING_SYSTEM", "PLANNING_USER"),
+    "revise": ("REVISE_SYSTEM", "REVISE_USER"),
+    "writing": ("WRITING_SYSTEM", "WRITING_USER"),
+    "writing_section": ("WRITING_SYSTEM", "WRITING_SECTION_USER"),
+    "json_fix": ("JSON_FIX_SYSTEM", "JSON_FIX_USER"),
+}
+
+GROUPS = ("project_id", "stage", "prompt_type", "model")
+
+
+def template_for(prompt_type: str):
+    """TEMPLATES key a recorded prompt type was built from, or None."""
+    if prompt_type in TEMPLATES:
+        return prompt_type
+    if prompt_type and prompt_type.endswith("_fix"):
+        return "json_fix"
+    return None
+
+
+def percentile(values: list, q: float):
+    """Nearest-rank percentile (q in 0..1); None for no values."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(q * len(values)) - 1))]
+
+
+def _ratio(rows: list[dict], est: str, actual: str):
+    ratios = [r[est] / r[actual] for r in rows if r[est] is not None and r[actual]]
+    return round(percentile(ratios, 0.5), 2) if ratios else None
+
+
+def profile(rows: list[dict], by: tuple = ("prompt_type", "stage")) -> list[dict]:
+    """One row per group: p50/p95 sizes, estimate accuracy and token share."""
+    for col in by:
+        if col not in GROUPS:
+            raise ValueError(f"cannot group prompt sizes by {col!r}")
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(row[c] for c in by), []).append(row)
+    total = sum(r["prompt_tokens"] + r["completion_tokens"] for r in rows) or 1
+    fixed = {t["prompt_type"]: t["fixed_tokens_est"] for t in template_overhead()}
+
+    out = []
+    for key, members in groups.items():
+        col = {name: [r[name] for r in members]
+               for name in ("prompt_chars", "prompt_tokens", "completion_tokens", "latency_s")}
+        tokens = sum(col["prompt_tokens"]) + sum(col["completion_tokens"])
+        latency = percentile(col["latency_s"], 0.5)
+        row = dict(zip(by, key))
+        if "prompt_type" in row:
+            row["template"] = template_for(row["prompt_type"])
+            row["fixed_tokens_est"] = fixed.get(row["template"])
+        out.append({
+            **row,
+            "calls": len(members),
+            "chars_p50": percentile(col["prompt_chars"], 0.5),
+            "chars_p95": percentile(col["prompt_chars"], 0.95),
+            "prompt_p50": percentile(col["prompt_tokens"], 0.5),
+            "prompt_p95": percentile(col["prompt_tokens"], 0.95),
+            "completion_p50": percentile(col["completion_tokens"], 0.5),
+            "completion_p95": percentile(col["completion_tokens"], 0.95),
+            "est/actual_prompt": _ratio(members, "est_prompt_tokens", "prompt_tokens"),
+            "est/actual_completion": _ratio(members, "est_completion_tokens",
+                                            "completion_tokens"),
+            "latency_p50_s": round(latency, 2) if latency is not None else None,
+            "token_share": round(tokens / total, 3),
+        })
+    return sorted(out, key=lambda r: -r["token_share"])
+
+
+def template_overhead() -> list[dict]:
+    """Estimated tokens of each template with its fields left empty."""
+    out = []
+    for prompt_type, (system_name, user_name) in TEMPLATES.items():
+        system, user = getattr(prompts, system_name), getattr(prompts, user_name)
+        parsed = list(string.Formatter().parse(user))
+        # literal text keeps "{{" / "}}" as single braces, as after format()
+        fixed = "".join(literal for literal, _, _, _ in parsed)
+        fields = [name for _, name, _, _ in parsed if name]
+        out.append({
+            "prompt_type": prompt_type,
+            "template": user_name,
+            "fixed_chars": len(system) + len(fixed),
+            "fixed_tokens_est": estimate_tokens(system) + estimate_tokens(fixed),
+            "fields": ", ".join(dict.fromkeys(fields)),
+        })
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt size profile per template")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    rep = sub.add_parser("report", help="p50/p95 prompt sizes from the call ledger")
+    rep.add_argument("--db", type=Path, default=Path("artifacts") / "fars.db")
+    rep.add_argument("--project", help="only this project")
+    rep.add_argument("--by", action="append", default=[],
+                     help="project_id, stage, prompt_type or model; repeatable")
+    sub.add_parser("templates", help="fixed size of each prompt template")
+    args = parser.parse_args()
+
+    if args.cmd == "templates":
+        print_table(template_overhead())
+        return
+
+    from ..orchestrator.storage import Storage
+
+    storage = Storage(args.db)
+    try:
+        rows = storage.llm_call_sizes(args.project)
+    finally:
+        storage.close()
+    if not rows:
+        print("(no profiled LLM calls recorded)")
+        return
+    print_table(profile(rows, tuple(args.by or ["prompt_type", "stage"])))
+    print(f"\n{len(rows)} billed calls")
+
+
+if __name__ == "__main__":
+    main()
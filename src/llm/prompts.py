@@ -136,10 +136,14 @@ Config hints: {config_hints_json}
 - Max train samples: {max_train_samples}
 - Max eval samples: {max_eval_samples}
 
+## Allowed values (anything else fails validation):
+{allowed_values}
+
 ## Your task:
 Create a complete experiment config with baseline and treatment groups.
 The treatment should implement the research idea's method.
 Ensure all values are concrete (no placeholders).
+Use only the allowed values and keys listed above.
 
 Output JSON:
 {{
@@ -171,14 +175,14 @@ Output JSON:
     }}
   }},
   "treatment": {{
-    "training_strategy": "...",
-    "data_processing": "...",
-    "prompt_design": "...",
-    "model_config": "...",
-    "augmentation": "...",
-    "train": {{ ... }},
-    "lora": {{ ... }},
-    "data": {{ ... }}
+    "training_strategy": "<string>",
+    "data_processing": "<an allowed data_processing value>",
+    "prompt_design": "<an allowed prompt_design value>",
+    "model_config": "<string>",
+    "augmentation": "<an allowed augmentation value>",
+    "train": {{ <allowed train keys> }},
+    "lora": {{ <allowed lora keys> }},
+    "data": {{ <allowed data keys> }}
   }},
   "metric": "{primary_metric}",
   "budget_estimate_minutes": <int>
@@ -266,3 +270,42 @@ Write a short paper with sections: ## Introduction, ## Method, ## Results, ## Li
 Include references to fig1.png where appropriate.
 Focus on what was tested, what was found, and what it means for GUI agent research.
 """
+
+# writing.mode = "sections": one call per section, run concurrently
+WRITING_SECTION_USER = """\
+Project: {project_id}
+Title: {title}
+Hypothesis: {hypothesis}
+Method: {method_description}
+
+Analysis:
+{analysis}
+
+Summary CSV:
+{summary_csv}
+
+The paper has the sections {sections}. Write ONLY the "## {section}" section,
+starting with that heading line. Do not write any other section.
+Include references to fig1.png where appropriate.
+"""
+
+# ---------------------------------------------------------------------------
+# JSON field follow-up (structured.py: re-ask only what failed validation)
+# ---------------------------------------------------------------------------
+
+JSON_FIX_SYSTEM = (
+    "You complete a partially valid JSON response. "
+    "Reply ONLY with a JSON object containing exactly the requested keys."
+)
+
+JSON_FIX_USER = """\
+Your previous response was:
+{response_json}
+
+These fields are missing or invalid:
+{problems}
+
+Return a JSON object with only the keys {keys}, consistent with the rest of
+the response and matching this schema:
+{schema_json}
+"""
@@ -0,0 +1,62 @@
+"""LLM provider registry.
+
+A provider builds the chat client an LLMRouter sends its requests through.
+The client must expose the part of the OpenAI SDK the router uses,
+client.chat.completions.create(model=, messages=, ..., stream=), returning
+OpenAI-shaped responses and stream chunks.  Caching, rate limiting, retry
+backoff, the token budget and accounting stay in the router and apply to
+every provider.  A new provider is registered with
+
+    @register_provider("my_provider")
+    def _my_client(options: dict, http_client):
+        return MyClient(..., http_client=http_client)
+
+and selected with `provider: my_provider` in config/llm_profiles.yaml; the
+profile's remaining keys are passed as options.  "mock" is not a provider:
+it answers in-process from canned.py without any client.
+"""
+
+import os
+from typing import Callable
+
+PROVIDERS: dict[str, Callable] = {}
+
+
+def register_provider(name: str) -> Callable:
+    def decorator(factory: Callable) -> Callable:
+        PROVIDERS[name] = factory
+        return factory
+    return decorator
+
+
+def get_provider(name: str) -> Callable:
+    if name not in PROVIDERS:
+        raise NotImplementedError(f"Provider {name} not implemented")
+    return PROVIDERS[name]
+
+
+@register_provider("azure_openai")
+def _azure_openai(options: dict, http_client):
+    from openai import AzureOpenAI
+
+    return AzureOpenAI(
+        azure_endpoint=os.environ["AZURE_ENDPOINT"],
+        api_key=os.environ["AZURE_API_KEY"],
+        api_version=os.environ.get("AZURE_API_VERSION", "2024-12-01-preview"),
+        http_client=http_client,
+        # 429s and transient errors are retried by call_with_backoff
+        max_retries=0,
+    )
+
+
+@register_provider("openai_compatible")
+def _openai_compatible(options: dict, http_client):
+    """Any server speaking the OpenAI chat API (vLLM, the local stub, ...)."""
+    from openai import OpenAI
+
+    return OpenAI(
+        base_url=os.environ.get("OPENAI_BASE_URL") or options["base_url"],
+        api_key=os.environ.get(options.get("api_key_env", "OPENAI_API_KEY"), "none"),
+        http_client=http_client,
+        max_retries=0,
+    )
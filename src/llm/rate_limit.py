@@ -0,0 +1,175 @@
+"""Request/token rate limiting and retry backoff for LLM calls.
+
+A RateLimiter holds two token buckets sized to the deployment's quota,
+requests per minute and tokens per minute.  acquire() blocks until both
+have room for one request and its estimated tokens; settle() corrects the
+token bucket once the real usage is known.  Configured per profile in
+config/llm_profiles.yaml (rate_limit: {rpm, tpm}).  call_with_backoff
+retries 429s and the transient failures the SDK would otherwise have
+retried itself (timeouts, dropped connections, 408/409/5xx), since the
+providers build their clients with max_retries=0.
+"""
+
+import os
+import random
+import re
+import threading
+import time
+from typing import Callable, Optional
+
+from ..utils.log import get_logger
+
+LOGGER = get_logger(__name__)
+
+# Priority class of this process's LLM calls, used by the cross-process
+# limiter (shared_limit.py): pipeline calls go before background work.
+PRIORITIES = {"pipeline": 0, "background": 1}
+_PRIORITY = os.environ.get("FARS_LLM_PRIORITY", "pipeline")
+
+
+def set_priority(name: str) -> None:
+    global _PRIORITY
+    if name not in PRIORITIES:
+        raise ValueError(f"unknown LLM priority {name!r} (expected one of {list(PRIORITIES)})")
+    _PRIORITY = name
+
+
+def current_priority() -> str:
+    return _PRIORITY
+
+
+# Pieces roughly as GPT-4o's tokenizer splits text before BPE: a newline run,
+# a word with its leading space, up to three digits, a punctuation run, one
+# non-ASCII character (other scripts are about a token each), other spaces.
+_PIECES = re.compile(
+    r"\s*\n\s*| ?[A-Za-z]+| ?\d{1,3}| ?[^\sA-Za-z\d\x80-\U0010ffff]+|[^\x00-\x7f]|\s+"
+)
+WORD_CHARS_PER_TOKEN = 10     # longer words split into several tokens
+PUNCT_CHARS_PER_TOKEN = 2
+
+
+def estimate_tokens(text: str) -> int:
+    """Offline GPT-4o token estimate (no tokenizer download, ~1.5 ms per 10k chars).
+
+    prompt_profile.py reports its error against the usage Azure returns.
+    """
+    n = 0
+    for piece in _PIECES.findall(text):
+        head = piece[-1]
+        if head.isascii() and head.isalpha():
+            n += 1 + (len(piece.lstrip()) - 1) // WORD_CHARS_PER_TOKEN
+        elif head.isascii() and not head.isspace() and not head.isdigit():
+            n += 1 + (len(piece.lstrip()) - 1) // PUNCT_CHARS_PER_TOKEN
+        else:
+            n += 1
+    return max(n, 1)
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` units per second, at most `capacity` banked."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._level = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Take `amount` now (the level may go negative) and return how long
+        the caller must wait before using it."""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            self._level -= amount
+            return max(0.0, -self._level / self.rate)
+
+    def adjust(self, delta: float) -> None:
+        """Give back (delta > 0) or charge extra (delta < 0) units."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._level = min(self.capacity, self._level + delta)
+
+
+class RateLimiter:
+    def __init__(self, rpm: float = None, tpm: float = None):
+        self.requests = TokenBucket(rpm / 60.0, max(rpm / 60.0, 1.0)) if rpm else None
+        # bank at most ~10s of tokens so a burst cannot overshoot the minute quota
+        self.tokens = TokenBucket(tpm / 60.0, max(tpm / 6.0, 1.0)) if tpm else None
+        self.waited_seconds = 0.0
+
+    def acquire(self, tokens: int) -> None:
+        wait = 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.reserve(tokens))
+        if wait > 0:
+            self.waited_seconds += wait
+            time.sleep(wait)
+
+    def settle(self, estimated: int, actual: Optional[int]) -> None:
+        if self.tokens is not None and actual is not None:
+            self.tokens.adjust(estimated - actual)
+
+
+def is_rate_limit_error(exc: Exception) -> bool:
+    return (getattr(exc, "status_code", None) == 429
+            or type(exc).__name__ == "RateLimitError")
+
+
+# openai / httpx exceptions for requests that never got a response
+_TRANSIENT_ERRORS = {"APIConnectionError", "APITimeoutError", "ConnectError",
+                     "ConnectTimeout", "ReadTimeout", "ReadError", "RemoteProtocolError"}
+
+
+def is_retryable_error(exc: Exception) -> bool:
+    """Rate limits and transient server/network failures, as the OpenAI SDK retries."""
+    if is_rate_limit_error(exc):
+        return True
+    status = getattr(exc, "status_code", None)
+    if isinstance(status, int):
+        return status in (408, 409) or status >= 500
+    return (type(exc).__name__ in _TRANSIENT_ERRORS
+            or isinstance(exc, (ConnectionError, TimeoutError)))
+
+
+def retry_after_seconds(exc: Exception) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for name in ("retry-after-ms", "retry-after"):
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            seconds = float(value)
+        except ValueError:
+            continue
+        return seconds / 1000 if name.endswith("-ms") else seconds
+    return None
+
+
+def call_with_backoff(fn: Callable, max_retries: int = 6, base_delay: float = 2.0,
+                      max_delay: float = 60.0, on_retry: Callable = None):
+    """Call fn(), retrying retryable errors (is_retryable_error) with jittered
+    exponential backoff, or the server's Retry-After when given.  Other errors
+    propagate.  on_retry(exc) is called before each retry."""
+    for attempt in range(max_retries + 1):
+        try:
+            return fn()
+        except Exception as exc:
+            if not is_retryable_error(exc) or attempt == max_retries:
+                raise
+            delay = retry_after_seconds(exc)
+            if delay is None:
+                delay = min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+            LOGGER.warning("%s (attempt %d/%d), retrying in %.1fs",
+                           "rate limited" if is_rate_limit_error(exc) else type(exc).__name__,
+                           attempt + 1, max_retries, delay)
+            if on_retry is not None:
+                on_retry(exc)
+            time.sleep(delay)
@@ -1,30 +1,175 @@
-"""Unified LLM interface: mock provider + Azure OpenAI GPT-4o."""
+"""Unified LLM interface: in-process mock + registered chat providers.
+
+get_router(profile) returns one shared LLMRouter per profile in
+config/llm_profiles.yaml (FARS_LLM_PROFILE overrides the profile for every
+caller, e.g. "stub" to run against stub_server.py).  Providers
+(azure_openai, openai_compatible, ...) are registered in providers.py.
+Each router owns a single thread-safe client whose HTTP connection pool is
+kept alive across calls, and counts calls, latency and new vs reused
+connections (router_stats()).  A profile's
+rate_limit section caps requests and tokens per minute for every caller in
+the process, or across processes with rate_limit.shared (shared_limit.py);
+429 responses are retried with backoff (retry section).
+Token use is attributed to the current project/stage (see usage.py).
+"""
 
 import json
 import os
-from typing import Optional
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Iterator, Optional
+
+import yaml
 
 from ..utils.log import get_logger
+from .cache import DETERMINISTIC_PROMPT_TYPES, ResponseCache, cache_key
+from . import canned, usage
+from .providers import get_provider
+from .rate_limit import RateLimiter, call_with_backoff, estimate_tokens, is_rate_limit_error
 
 LOGGER = get_logger(__name__)
 
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_cache() -> Optional[ResponseCache]:
+    """Process-wide response cache from llm.cache in system.yaml, or None when off."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            sys_path = REPO_ROOT / "config" / "system.yaml"
+            cfg = {}
+            if sys_path.exists():
+                cfg = yaml.safe_load(sys_path.read_text()) or {}
+            cache_cfg = cfg.get("llm", {}).get("cache", {})
+            mode = os.environ.get("FARS_LLM_CACHE", cache_cfg.get("mode", "deterministic"))
+            if mode == "off":
+                _CACHE = False
+            else:
+                _CACHE = ResponseCache(
+                    REPO_ROOT / cache_cfg.get("path", "artifacts/llm_cache.db"),
+                    mode=mode,
+                    max_mb=cache_cfg.get("max_mb", 512),
+                    prompt_types=cache_cfg.get("prompt_types", DETERMINISTIC_PROMPT_TYPES),
+                )
+                LOGGER.info("LLM response cache: mode=%s", mode)
+    return _CACHE or None
+
+
+class RouterStats:
+    """Per-profile call counters; latencies keep the most recent calls."""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.rate_limited = 0
+        self.retried = 0
+        self.requests = 0
+        self.connections = 0
+        self._latencies = deque(maxlen=window)
+        self._ttfts = deque(maxlen=window)
+
+    def record_call(self, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self.calls += 1
+            self.errors += 0 if ok else 1
+            self._latencies.append(seconds)
+
+    def record_ttft(self, seconds: float) -> None:
+        """Time to the first streamed chunk (generate_stream only)."""
+        with self._lock:
+            self._ttfts.append(seconds)
+
+    def record_cache_hit(self) -> None:
+        with self._lock:
+            self.cache_hits += 1
+
+    def record_retry(self, exc: Exception) -> None:
+        """A retried request: a 429, or a transient server/network error."""
+        with self._lock:
+            if is_rate_limit_error(exc):
+                self.rate_limited += 1
+            else:
+                self.retried += 1
+
+    def on_trace(self, event: str, info: dict) -> None:
+        """httpcore trace hook: a connect_tcp event means a new connection."""
+        if event == "connection.connect_tcp.started":
+            with self._lock:
+                self.connections += 1
+
+    def on_request(self, request) -> None:
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = self.on_trace
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lat = sorted(self._latencies)
+            ttft = sorted(self._ttfts)
+            requests, connections = self.requests, self.connections
+            out = {"calls": self.calls, "errors": self.errors, "cache_hits": self.cache_hits,
+                   "rate_limited": self.rate_limited, "retried": self.retried,
+                   "http_requests": requests,
+                   "new_connections": connections}
+        if requests:
+            out["connection_reuse"] = round(1 - min(connections, requests) / requests, 3)
+        if lat:
+            out["latency_p50_s"] = round(lat[len(lat) // 2], 3)
+            out["latency_p95_s"] = round(lat[min(int(len(lat) * 0.95), len(lat) - 1)], 3)
+            out["latency_mean_s"] = round(sum(lat) / len(lat), 3)
+        if ttft:
+            out["ttft_p50_s"] = round(ttft[len(ttft) // 2], 3)
+        return out
+
 
 class LLMRouter:
     def __init__(self, provider: str = "mock", model: str = "gpt-4o", **kwargs):
         self.provider = provider
         self.model = model
-        self.temperature = kwargs.get("temperature", 0.7)
-        self.max_tokens = kwargs.get("max_tokens", 4096)
+        self.temperature = kwargs.pop("temperature", 0.7)
+        self.max_tokens = kwargs.pop("max_tokens", 4096)
+        self.retry = kwargs.pop("retry", {}) or {}
+        self.pool = kwargs.pop("pool", {}) or {}
+        limits = kwargs.pop("rate_limit", {}) or {}
+        if limits.get("shared"):
+            from .shared_limit import SharedRateLimiter
+
+            self.limiter = SharedRateLimiter(
+                REPO_ROOT / limits.get("db_path", "artifacts/llm_limits.db"),
+                limits.get("key", model), limits.get("rpm"), limits.get("tpm"))
+        elif limits:
+            self.limiter = RateLimiter(limits.get("rpm"), limits.get("tpm"))
+        else:
+            self.limiter = None
+        # what is left of the profile goes to the provider (base_url, ...)
+        self.options = kwargs
+        self.stats = RouterStats()
         self._client = None
+        self._client_lock = threading.Lock()
+
+    def _get_client(self):
+        with self._client_lock:
+            if self._client is None:
+                import httpx
 
-    def _get_azure_client(self):
-        if self._client is None:
-            from openai import AzureOpenAI
-            self._client = AzureOpenAI(
-                azure_endpoint=os.environ["AZURE_ENDPOINT"],
-                api_key=os.environ["AZURE_API_KEY"],
-                api_version=os.environ.get("AZURE_API_VERSION", "2024-12-01-preview"),
-            )
+                http_client = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=self.pool.get("max_connections", 16),
+                        max_keepalive_connections=self.pool.get("max_keepalive", 8),
+                        keepalive_expiry=self.pool.get("keepalive_seconds", 120),
+                    ),
+                    timeout=self.pool.get("timeout_seconds", 600),
+                    event_hooks={"request": [self.stats.on_request]},
+                )
+                self._client = get_provider(self.provider)(self.options, http_client)
         return self._client
 
     def generate(
@@ -33,21 +178,119 @@ class LLMRouter:
         user: str,
         json_mode: bool = False,
         mock_response: Optional[dict] = None,
+        prompt_type: Optional[str] = None,
     ) -> str:
+        """prompt_type labels the call in the token accounting (ideation, planning, ...)."""
         if self.provider == "mock":
-            return self._mock_generate(system, user, mock_response)
-        if self.provider == "azure_openai":
-            return self._azure_generate(system, user, json_mode)
-        raise NotImplementedError(f"Provider {self.provider} not implemented")
+            return self._mock_generate(system, user, mock_response, prompt_type)
+        get_provider(self.provider)
+
+        cache = self._cache_for(prompt_type)
+        if cache is not None:
+            key = self._cache_key(system, user, json_mode)
+            cached = cache.get(key)
+            if cached is not None:
+                LOGGER.info("LLM cache hit: model=%s (%d chars)", self.model, len(cached))
+                self.stats.record_cache_hit()
+                usage.record(prompt_type, self.model, 0, 0, 0.0, cached=True)
+                return cached
+
+        est_prompt = estimate_tokens(system) + estimate_tokens(user)
+        usage.check_budget(prompt_type, est_prompt)
+        start = time.monotonic()
+        try:
+            text, tokens = self._chat_generate(system, user, json_mode, prompt_type, est_prompt)
+        except Exception:
+            elapsed = time.monotonic() - start
+            self.stats.record_call(elapsed, ok=False)
+            usage.record(prompt_type, self.model, 0, 0, elapsed, ok=False)
+            raise
+        elapsed = time.monotonic() - start
+        self.stats.record_call(elapsed, ok=True)
+        usage.record(prompt_type, self.model, tokens[0], tokens[1], elapsed,
+                     sizes=(len(system) + len(user), est_prompt, estimate_tokens(text or "")))
+
+        if cache is not None and _cacheable(text, json_mode):
+            cache.put(key, self.provider, self.model, text)
+        return text
+
+    def generate_stream(self, system: str, user: str,
+                        prompt_type: Optional[str] = None) -> Iterator[str]:
+        """Plain-text generate() that yields the response as it arrives.
 
-    def _mock_generate(self, system, user, mock_response):
+        Caching, rate limiting, the token budget and accounting work as in
+        generate(); a cached response is yielded as a single chunk.
+        """
+        if self.provider == "mock":
+            yield self._mock_generate(system, user, None, prompt_type)
+            return
+        get_provider(self.provider)
+
+        cache = self._cache_for(prompt_type)
+        if cache is not None:
+            key = self._cache_key(system, user, False)
+            cached = cache.get(key)
+            if cached is not None:
+                self.stats.record_cache_hit()
+                usage.record(prompt_type, self.model, 0, 0, 0.0, cached=True)
+                yield cached
+                return
+
+        est_prompt = estimate_tokens(system) + estimate_tokens(user)
+        usage.check_budget(prompt_type, est_prompt)
+        start = time.monotonic()
+        parts, tokens, ok = [], None, False
+        try:
+            for kind, value in self._chat_stream(system, user, prompt_type, est_prompt):
+                if kind == "usage":
+                    tokens = value
+                    continue
+                if not parts:
+                    self.stats.record_ttft(time.monotonic() - start)
+                parts.append(value)
+                yield value
+            ok = True
+        finally:
+            # also runs when the consumer stops early (recorded as not ok)
+            elapsed = time.monotonic() - start
+            self.stats.record_call(elapsed, ok=ok)
+            text = "".join(parts)
+            est_completion = estimate_tokens(text)
+            if tokens is None:
+                tokens = (est_prompt, est_completion)
+            usage.record(prompt_type, self.model, tokens[0], tokens[1], elapsed, ok=ok,
+                         sizes=(len(system) + len(user), est_prompt, est_completion))
+        if cache is not None and _cacheable(text, False):
+            cache.put(key, self.provider, self.model, text)
+
+    def _cache_for(self, prompt_type: Optional[str]) -> Optional[ResponseCache]:
+        cache = get_cache()
+        if cache is None or not cache.applies(prompt_type, self.temperature):
+            return None
+        return cache
+
+    def _cache_key(self, system: str, user: str, json_mode: bool) -> str:
+        return cache_key(self.provider, self.model, self.temperature, json_mode, system, user)
+
+    def invalidate(self, system: str, user: str, json_mode: bool = False) -> None:
+        """Drop a cached response the caller rejected, so a retry reaches the model."""
+        cache = get_cache()
+        if cache is not None:
+            cache.invalidate(self._cache_key(system, user, json_mode))
+
+    def _mock_generate(self, system, user, mock_response, prompt_type=None):
         LOGGER.info("LLM mock generate (%d+%d chars)", len(system), len(user))
         if mock_response is not None:
             return json.dumps(mock_response)
-        return json.dumps({"mock": True})
+        return canned.respond(system, user, prompt_type)
+
+    def _chat_create(self, system: str, user: str, json_mode: bool,
+                     prompt_type: Optional[str] = None, est_prompt: Optional[int] = None,
+                     **extra):
+        """chat.completions.create behind the rate limiter and retry backoff.
 
-    def _azure_generate(self, system: str, user: str, json_mode: bool) -> str:
-        client = self._get_azure_client()
+        Returns (response or stream, estimated tokens reserved)."""
+        client = self._get_client()
         kwargs = {
             "model": self.model,
             "messages": [
@@ -56,20 +299,121 @@ class LLMRouter:
             ],
             "temperature": self.temperature,
             "max_tokens": self.max_tokens,
+            **extra,
         }
         if json_mode:
             kwargs["response_format"] = {"type": "json_object"}
+        if prompt_type:
+            # ignored by real endpoints; the stub answers by prompt type
+            kwargs["extra_headers"] = {"X-Prompt-Type": prompt_type}
+
+        # Azure charges max_tokens against the TPM quota when a request is admitted
+        if est_prompt is None:
+            est_prompt = estimate_tokens(system) + estimate_tokens(user)
+        estimated = est_prompt + self.max_tokens
+
+        def call():
+            if self.limiter is not None:
+                self.limiter.acquire(estimated)
+            return client.chat.completions.create(**kwargs)
+
+        LOGGER.info("LLM call: provider=%s model=%s json_mode=%s stream=%s",
+                    self.provider, self.model, json_mode, bool(extra.get("stream")))
+        resp = call_with_backoff(
+            call,
+            max_retries=self.retry.get("max_retries", 6),
+            base_delay=self.retry.get("base_delay_seconds", 2.0),
+            max_delay=self.retry.get("max_delay_seconds", 60.0),
+            on_retry=self.stats.record_retry,
+        )
+        return resp, estimated
 
-        LOGGER.info("Azure OpenAI call: model=%s json_mode=%s", self.model, json_mode)
-        resp = client.chat.completions.create(**kwargs)
+    def _chat_generate(self, system: str, user: str, json_mode: bool,
+                       prompt_type: Optional[str] = None,
+                       est_prompt: Optional[int] = None) -> tuple[str, tuple]:
+        """Returns (text, (prompt_tokens, completion_tokens))."""
+        resp, estimated = self._chat_create(system, user, json_mode, prompt_type, est_prompt)
+        if self.limiter is not None:
+            self.limiter.settle(estimated, getattr(resp.usage, "total_tokens", None))
         text = resp.choices[0].message.content
-        LOGGER.info("Azure OpenAI response: %d chars, usage=%s", len(text), resp.usage)
-        return text
+        LOGGER.info("LLM response: %d chars, usage=%s", len(text), resp.usage)
+        if resp.usage is None:
+            tokens = (estimated - self.max_tokens, estimate_tokens(text or ""))
+        else:
+            tokens = (resp.usage.prompt_tokens, resp.usage.completion_tokens)
+        return text, tokens
+
+    def _chat_stream(self, system: str, user: str, prompt_type: Optional[str] = None,
+                     est_prompt: Optional[int] = None) -> Iterator[tuple[str, object]]:
+        """Yields ("text", delta) pieces, then ("usage", (prompt, completion)) if sent."""
+        stream, estimated = self._chat_create(
+            system, user, False, prompt_type, est_prompt,
+            stream=True, stream_options={"include_usage": True},
+        )
+        total = None
+        for chunk in stream:
+            if chunk.usage is not None:
+                total = chunk.usage.total_tokens
+                yield "usage", (chunk.usage.prompt_tokens, chunk.usage.completion_tokens)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield "text", chunk.choices[0].delta.content
+        if self.limiter is not None:
+            self.limiter.settle(estimated, total)
+
+
+def _cacheable(text: str, json_mode: bool) -> bool:
+    """Never store a JSON-mode response that does not parse."""
+    if not text:
+        return False
+    if not json_mode:
+        return True
+    try:
+        json.loads(text)
+    except json.JSONDecodeError:
+        return False
+    return True
+
+
+_ROUTERS = {}
+_ROUTERS_LOCK = threading.Lock()
+
+
+def load_profiles() -> dict:
+    path = REPO_ROOT / "config" / "llm_profiles.yaml"
+    if not path.exists():
+        return {}
+    return (yaml.safe_load(path.read_text()) or {}).get("profiles", {})
 
 
 def get_router(profile: str = "azure_gpt4o") -> LLMRouter:
-    if profile == "mock":
-        return LLMRouter(provider="mock")
-    if profile in ("azure_gpt4o", "azure_openai"):
-        return LLMRouter(provider="azure_openai", model="gpt-4o")
-    return LLMRouter(provider="mock")
+    """Shared router for a profile in llm_profiles.yaml (built on first use).
+
+    "azure_openai" is accepted as an alias of azure_gpt4o; unknown profiles
+    fall back to the mock provider.  FARS_LLM_PROFILE, when set, replaces
+    the requested profile.
+    """
+    profile = os.environ.get("FARS_LLM_PROFILE") or profile
+    if profile == "azure_openai":
+        profile = "azure_gpt4o"
+    with _ROUTERS_LOCK:
+        router = _ROUTERS.get(profile)
+        if router is None:
+            cfg = load_profiles().get(profile)
+            if cfg is None:
+                if profile == "azure_gpt4o":
+                    cfg = {"provider": "azure_openai", "model": "gpt-4o"}
+                else:
+                    LOGGER.warning("unknown LLM profile %r, using mock", profile)
+                    cfg = {"provider": "mock"}
+            cfg = dict(cfg)
+            router = LLMRouter(provider=cfg.pop("provider", "mock"),
+                               model=cfg.pop("model", "gpt-4o"), **cfg)
+            _ROUTERS[profile] = router
+    return router
+
+
+def router_stats() -> dict:
+    """Counters of every router created in this process, by profile."""
+    with _ROUTERS_LOCK:
+        routers = dict(_ROUTERS)
+    return {name: r.stats.snapshot() for name, r in routers.items()}
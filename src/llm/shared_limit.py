@@ -0,0 +1,284 @@
+"""Cross-process LLM rate limiter backed by a SQLite file.
+
+Every process using a deployment (daemons, build_kb) takes request and
+token leases from the same buckets in artifacts/llm_limits.db, so their
+combined traffic stays inside the Azure RPM/TPM quota instead of each one
+assuming it has the whole quota.  Buckets refill continuously; a take is
+one BEGIN IMMEDIATE transaction, so it is atomic across processes.
+
+Priority classes (rate_limit.PRIORITIES): a process waiting at a higher
+priority registers in the waiters table, and lower-priority processes do
+not take from the buckets while it waits, so the daemon's pipeline calls
+go ahead of background extraction.  Waiters that stop heart-beating
+(crashed processes) expire after WAITER_TTL seconds.
+
+Enabled per profile with rate_limit.shared in llm_profiles.yaml.
+
+    python -m src.llm.shared_limit bench [--procs 4] [--requests 40] [--rpm 600]
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from ..utils.log import get_logger
+from .rate_limit import PRIORITIES, RateLimiter, call_with_backoff, current_priority
+
+LOGGER = get_logger(__name__)
+
+WAITER_TTL = 10.0
+MAX_POLL = 0.25
+
+_DDL = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    rate REAL NOT NULL,       -- units per second
+    capacity REAL NOT NULL,
+    level REAL NOT NULL,
+    updated REAL NOT NULL     -- wall-clock seconds
+);
+CREATE TABLE IF NOT EXISTS waiters (
+    id TEXT PRIMARY KEY,
+    priority INTEGER NOT NULL,
+    heartbeat REAL NOT NULL
+);
+"""
+
+_IDS = itertools.count()
+
+
+class SharedRateLimiter:
+    """Same interface as rate_limit.RateLimiter (acquire / settle)."""
+
+    def __init__(self, db_path: Path, key: str, rpm: float = None, tpm: float = None):
+        self.db_path = db_path
+        self.buckets = []
+        if rpm:
+            self.buckets.append((f"{key}:requests", rpm / 60.0, max(rpm / 60.0, 1.0)))
+        if tpm:
+            self.buckets.append((f"{key}:tokens", tpm / 60.0, max(tpm / 6.0, 1.0)))
+        self.waited_seconds = 0.0
+        self._local = threading.local()
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_DDL)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def _levels(self, conn, now: float) -> dict:
+        """Refilled level of each bucket, creating rows on first use."""
+        levels = {}
+        for name, rate, capacity in self.buckets:
+            conn.execute(
+                "INSERT OR IGNORE INTO buckets (name, rate, capacity, level, updated) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (name, rate, capacity, capacity, now),
+            )
+            level, updated = conn.execute(
+                "SELECT level, updated FROM buckets WHERE name = ?", (name,)
+            ).fetchone()
+            levels[name] = min(capacity, level + max(0.0, now - updated) * rate)
+        return levels
+
+    def _try_take(self, amounts: dict, waiter_id: str, priority: int) -> float:
+        """Take every amount or none; returns 0 on success, else seconds to wait."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            conn.execute("DELETE FROM waiters WHERE heartbeat < ?", (now - WAITER_TTL,))
+            ahead = conn.execute(
+                "SELECT COUNT(*) FROM waiters WHERE priority < ? AND id != ?",
+                (priority, waiter_id),
+            ).fetchone()[0]
+            levels = self._levels(conn, now)
+            wait = MAX_POLL if ahead else 0.0
+            for name, rate, _ in self.buckets:
+                if levels[name] < amounts[name]:
+                    wait = max(wait, (amounts[name] - levels[name]) / rate)
+            if wait == 0.0:
+                for name in levels:
+                    levels[name] -= amounts[name]
+                conn.execute("DELETE FROM waiters WHERE id = ?", (waiter_id,))
+            else:
+                conn.execute(
+                    "INSERT OR REPLACE INTO waiters (id, priority, heartbeat) VALUES (?, ?, ?)",
+                    (waiter_id, priority, now),
+                )
+            for name, level in levels.items():
+                conn.execute("UPDATE buckets SET level = ?, updated = ? WHERE name = ?",
+                             (level, now, name))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def acquire(self, tokens: int, priority: Optional[str] = None) -> None:
+        if not self.buckets:
+            return
+        amounts = {}
+        for name, _, capacity in self.buckets:
+            amounts[name] = min(1 if name.endswith(":requests") else tokens, capacity)
+        rank = PRIORITIES[priority or current_priority()]
+        waiter_id = f"{os.getpid()}:{threading.get_ident()}:{next(_IDS)}"
+        start = time.monotonic()
+        try:
+            while True:
+                wait = self._try_take(amounts, waiter_id, rank)
+                if wait == 0.0:
+                    break
+                time.sleep(min(wait, MAX_POLL))
+        except BaseException:
+            conn = self._conn()
+            conn.execute("DELETE FROM waiters WHERE id = ?", (waiter_id,))
+            raise
+        self.waited_seconds += time.monotonic() - start
+
+    def settle(self, estimated: int, actual: Optional[int]) -> None:
+        """Return (or charge) the difference between reserved and used tokens."""
+        token_buckets = [b for b in self.buckets if b[0].endswith(":tokens")]
+        if actual is None or not token_buckets:
+            return
+        name, _, capacity = token_buckets[0]
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            level = self._levels(conn, now)[name]
+            conn.execute("UPDATE buckets SET level = ?, updated = ? WHERE name = ?",
+                         (min(capacity, level + estimated - actual), now, name))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+
+# ---------------------------------------------------------------------------
+# Contention benchmark: N processes against a stub server with an RPM quota
+# ---------------------------------------------------------------------------
+
+class _HTTPStatusError(Exception):
+    def __init__(self, err):
+        super().__init__(str(err))
+        self.status_code = err.code
+        self.response = err
+
+
+def _bench_worker(args: dict) -> dict:
+    import logging
+    import urllib.error
+    import urllib.request
+
+    # 429s are counted in the result instead of logged per retry
+    logging.getLogger(f"{__package__}.rate_limit").setLevel(logging.ERROR)
+
+    if args["mode"] == "shared":
+        limiter = SharedRateLimiter(Path(args["db"]), "bench", args["rpm"], args["tpm"])
+    else:
+        # what every process does without coordination: assume the whole quota
+        limiter = RateLimiter(args["rpm"], args["tpm"])
+    body = json.dumps({"messages": [{"role": "user", "content": "x" * args["prompt_chars"]}]})
+    throttled = [0]
+    waits, latencies = [], []
+
+    def call():
+        t0 = time.monotonic()
+        if isinstance(limiter, SharedRateLimiter):
+            limiter.acquire(args["tokens"], args["priority"])
+        else:
+            limiter.acquire(args["tokens"])
+        waits.append(time.monotonic() - t0)
+        req = urllib.request.Request(args["url"] + "/openai/deployments/bench/chat/completions",
+                                     data=body.encode(), method="POST")
+        try:
+            return json.loads(urllib.request.urlopen(req, timeout=60).read())
+        except urllib.error.HTTPError as err:
+            raise _HTTPStatusError(err)
+
+    def on_retry(exc):
+        throttled[0] += 1
+
+    start = time.monotonic()
+    for _ in range(args["requests"]):
+        t0 = time.monotonic()
+        call_with_backoff(call, max_retries=20, base_delay=0.5, max_delay=5.0,
+                          on_retry=on_retry)
+        latencies.append(time.monotonic() - t0)
+    return {"priority": args["priority"], "throttled": throttled[0], "waits": waits,
+            "latencies": latencies, "elapsed": time.monotonic() - start}
+
+
+def _pct(values: list, q: float) -> float:
+    values = sorted(values)
+    return round(values[min(int(len(values) * q), len(values) - 1)], 3) if values else 0.0
+
+
+def run_bench(procs: int, requests: int, rpm: float, latency_ms: float,
+              background: int, db: Path) -> list[dict]:
+    """One row per mode: local (uncoordinated) limiters vs the shared limiter."""
+    import multiprocessing
+
+    from .stub_server import StubServer
+
+    rows = []
+    for mode in ("local", "shared"):
+        server = StubServer(latency_ms=latency_ms, retry_after=1, rpm=rpm).start()
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{db}{suffix}").unlink(missing_ok=True)
+        jobs = [{
+            "mode": mode, "url": server.url, "db": str(db), "rpm": rpm, "tpm": None,
+            "tokens": 500, "prompt_chars": 2000, "requests": requests,
+            "priority": "background" if i < background else "pipeline",
+        } for i in range(procs)]
+        start = time.monotonic()
+        with multiprocessing.get_context("spawn").Pool(procs) as pool:
+            results = pool.map(_bench_worker, jobs)
+        elapsed = time.monotonic() - start
+        server.shutdown()
+        row = {"mode": mode, "procs": procs, "requests": procs * requests,
+               "throttled_429": sum(r["throttled"] for r in results),
+               "elapsed_s": round(elapsed, 2),
+               "req_per_s": round(procs * requests / elapsed, 2)}
+        for prio in PRIORITIES:
+            lat = [x for r in results if r["priority"] == prio for x in r["latencies"]]
+            if lat:
+                row[f"{prio}_p50_s"] = _pct(lat, 0.5)
+                row[f"{prio}_p95_s"] = _pct(lat, 0.95)
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cross-process LLM rate limiter")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    bench = sub.add_parser("bench", help="multi-process contention benchmark on a stub server")
+    bench.add_argument("--procs", type=int, default=4)
+    bench.add_argument("--requests", type=int, default=40, help="per process")
+    bench.add_argument("--rpm", type=float, default=600, help="stub quota and limiter setting")
+    bench.add_argument("--latency-ms", type=float, default=50)
+    bench.add_argument("--background", type=int, default=2,
+                       help="how many of the processes run at background priority")
+    bench.add_argument("--db", type=Path, default=Path("artifacts") / "llm_limits_bench.db")
+    args = parser.parse_args()
+
+    rows = run_bench(args.procs, args.requests, args.rpm, args.latency_ms,
+                     args.background, args.db)
+    for row in rows:
+        print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()
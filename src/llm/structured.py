@@ -0,0 +1,262 @@
+"""Parse, repair and validate JSON responses against llm/tool_schemas.py.
+
+generate_json() turns one LLM response into a schema-valid dict, spending
+as little as possible on a bad one:
+    1. local repair -- strip code fences and text around the object, drop
+       trailing commas, coerce numeric strings, wrap a bare string where a
+       list is expected, fill optional keys that carry a schema default,
+       and replace (by the default) or drop optional keys that stay invalid;
+    2. follow-up -- fields that are still missing or invalid are re-asked
+       with a small prompt that carries only the previous response and
+       the failing fields' schema (not the original context);
+    3. otherwise ValueError, and the stage fails as before.
+Outcomes are counted per prompt type (repair_stats()).
+
+Supports the JSON Schema subset the schemas use: type, properties,
+required, items, enum, minItems, minLength, minProperties, default.
+"""
+
+import copy
+import json
+import re
+import threading
+from typing import Optional
+
+from ..utils.log import get_logger
+from .prompts import JSON_FIX_SYSTEM, JSON_FIX_USER
+
+LOGGER = get_logger(__name__)
+
+OUTCOMES = ("clean", "repaired", "reasked", "failed")
+
+_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "boolean": bool,
+    "null": type(None),
+}
+
+_FENCE = re.compile(r"```(?:json|JSON)?\s*(.*?)```", re.DOTALL)
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+
+
+def _balanced_object(text: str) -> Optional[str]:
+    """The first {...} in text, matched with string literals respected."""
+    start = text.find("{")
+    if start < 0:
+        return None
+    depth, in_str, escape = 0, False, False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_str:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_str = False
+        elif ch == '"':
+            in_str = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
+
+
+def extract_json(raw: str) -> tuple[Optional[dict], list[str]]:
+    """(object, fixes applied); object is None when nothing parses."""
+    try:
+        obj = json.loads(raw)
+        return (obj, []) if isinstance(obj, dict) else (None, [])
+    except (json.JSONDecodeError, TypeError):
+        pass
+    fixes = []
+    text = raw or ""
+    fence = _FENCE.search(text)
+    if fence:
+        text = fence.group(1)
+        fixes.append("code_fence")
+    body = _balanced_object(text)
+    if body is None:
+        return None, fixes
+    if body != text.strip():
+        fixes.append("surrounding_text")
+    for candidate, fix in ((body, None), (_TRAILING_COMMA.sub(r"\1", body), "trailing_comma")):
+        try:
+            obj = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        if fix:
+            fixes.append(fix)
+        return obj, fixes
+    return None, fixes
+
+
+def _type_ok(value, expected) -> bool:
+    types = expected if isinstance(expected, list) else [expected]
+    for t in types:
+        if t == "integer" and isinstance(value, int) and not isinstance(value, bool):
+            return True
+        if t == "number" and isinstance(value, (int, float)) and not isinstance(value, bool):
+            return True
+        if t in _TYPES and isinstance(value, _TYPES[t]):
+            return True
+    return False
+
+
+def _coerce(value, expected):
+    """Best-effort local fix of a wrongly typed scalar; returns value unchanged if none."""
+    types = expected if isinstance(expected, list) else [expected]
+    if isinstance(value, str):
+        try:
+            num = float(value.strip())
+        except ValueError:
+            num = None
+        if num is not None:
+            if "integer" in types and num.is_integer():
+                return int(num)
+            if "number" in types:
+                return num
+        if "array" in types and value.strip():
+            return [value]
+    if isinstance(value, float) and "integer" in types and value.is_integer():
+        return int(value)
+    return value
+
+
+def repair(obj, schema: dict, path: str = "") -> tuple[object, list[str], list[str]]:
+    """Apply local fixes in place where possible; returns (obj, fixes, errors).
+
+    errors are dotted paths with a reason, for what could not be fixed."""
+    fixes, errors = [], []
+    expected = schema.get("type")
+    if expected and not _type_ok(obj, expected):
+        coerced = _coerce(obj, expected)
+        if coerced is not obj and _type_ok(coerced, expected):
+            fixes.append(f"coerce:{path or '.'}")
+            obj = coerced
+        else:
+            return obj, fixes, [f"{path or '.'}: expected {expected}"]
+
+    if "enum" in schema and obj not in schema["enum"]:
+        errors.append(f"{path}: must be one of {schema['enum']}")
+    if isinstance(obj, str) and len(obj.strip()) < schema.get("minLength", 0):
+        errors.append(f"{path}: empty")
+    if isinstance(obj, list):
+        if len(obj) < schema.get("minItems", 0):
+            errors.append(f"{path}: needs at least {schema['minItems']} items")
+        items = schema.get("items")
+        if items:
+            for i, item in enumerate(obj):
+                obj[i], f, e = repair(item, items, f"{path}[{i}]")
+                fixes += f
+                errors += e
+    if isinstance(obj, dict):
+        if len(obj) < schema.get("minProperties", 0):
+            errors.append(f"{path}: must not be empty")
+        props = schema.get("properties", {})
+        required = schema.get("required", [])
+        for key, sub in props.items():
+            sub_path = f"{path}.{key}" if path else key
+            if key not in obj:
+                if key in required:
+                    errors.append(f"{sub_path}: missing")
+                elif "default" in sub:
+                    obj[key] = copy.deepcopy(sub["default"])
+                    fixes.append(f"default:{sub_path}")
+                continue
+            obj[key], f, e = repair(obj[key], sub, sub_path)
+            fixes += f
+            if e and key not in required:
+                # an unusable optional value is not worth a follow-up call
+                if "default" in sub:
+                    obj[key] = copy.deepcopy(sub["default"])
+                    fixes.append(f"default:{sub_path}")
+                else:
+                    del obj[key]
+                    fixes.append(f"drop:{sub_path}")
+                continue
+            errors += e
+    return obj, fixes, errors
+
+
+def _top_keys(errors: list[str]) -> list[str]:
+    keys = []
+    for err in errors:
+        key = re.split(r"[.\[:]", err, maxsplit=1)[0]
+        if key and key not in keys:
+            keys.append(key)
+    return keys
+
+
+_STATS = {}
+_STATS_LOCK = threading.Lock()
+
+
+def _count(prompt_type: str, outcome: str) -> None:
+    with _STATS_LOCK:
+        counts = _STATS.setdefault(prompt_type or "other", dict.fromkeys(OUTCOMES, 0))
+        counts[outcome] += 1
+
+
+def repair_stats() -> dict:
+    """Outcome counts per prompt type; repair_rate is the share of responses
+    that needed any fix, local or follow-up."""
+    with _STATS_LOCK:
+        out = {k: dict(v) for k, v in _STATS.items()}
+    for counts in out.values():
+        total = sum(counts[o] for o in OUTCOMES)
+        counts["repair_rate"] = round((counts["repaired"] + counts["reasked"]) / total, 3)
+    return out
+
+
+def generate_json(router, system: str, user: str, schema: dict,
+                  prompt_type: Optional[str] = None, max_followups: int = 1) -> dict:
+    """One schema-valid dict from the LLM, or ValueError."""
+    raw = router.generate(system, user, json_mode=True, prompt_type=prompt_type)
+    obj, fixes = extract_json(raw)
+    if obj is None:
+        _count(prompt_type, "failed")
+        router.invalidate(system, user, json_mode=True)
+        raise ValueError(f"LLM output is not JSON: {raw[:200]!r}")
+    obj, more, errors = repair(obj, schema)
+    fixes += more
+
+    followups = 0
+    while errors and followups < max_followups:
+        followups += 1
+        keys = [k for k in _top_keys(errors) if k in schema.get("properties", {})]
+        if not keys:
+            break
+        LOGGER.info("%s response invalid (%s), re-asking for %s",
+                    prompt_type or "LLM", "; ".join(errors), keys)
+        fix_prompt = JSON_FIX_USER.format(
+            response_json=json.dumps(obj, indent=2),
+            problems="\n".join(f"- {e}" for e in errors),
+            keys=", ".join(keys),
+            schema_json=json.dumps({k: schema["properties"][k] for k in keys}, indent=2),
+        )
+        patch, _ = extract_json(router.generate(JSON_FIX_SYSTEM, fix_prompt, json_mode=True,
+                                                prompt_type=f"{prompt_type or 'other'}_fix"))
+        if patch is None:
+            continue
+        for key in keys:
+            if key in patch:
+                obj[key] = patch[key]
+        obj, more, errors = repair(obj, schema)
+        fixes += more
+
+    if errors:
+        _count(prompt_type, "failed")
+        router.invalidate(system, user, json_mode=True)
+        raise ValueError(f"LLM output fails schema: {'; '.join(errors)}")
+    outcome = "reasked" if followups else "repaired" if fixes else "clean"
+    _count(prompt_type, outcome)
+    if fixes:
+        LOGGER.info("%s response repaired locally: %s", prompt_type or "LLM",
+                    ", ".join(dict.fromkeys(fixes)))
+    return obj
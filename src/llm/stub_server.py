@@ -0,0 +1,203 @@
+"""Local OpenAI-compatible stub for exercising the LLM path without Azure.
+
+Answers POST .../chat/completions in the OpenAI response shape (with a
+usage block, or as an SSE stream when asked) with a schema-valid canned
+response for the prompt type (canned.py), after a latency of latency_ms
+plus up to jitter_ms.  It returns 429 with Retry-After for a configurable
+fraction of requests or once an RPM quota is exceeded (Azure enforces it
+over short windows; here a bucket of rpm/60 requests that refills at
+rpm/60 per second), and 500 for another fraction.  GET /stats returns the
+counters.  Run the pipeline against it with the "stub" profile:
+
+    python -m src.llm.stub_server --port 8099 --latency-ms 300 --error-rate-429 0.1 --rpm 600
+    FARS_LLM_PROFILE=stub python -m src --once
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ..utils.log import get_logger
+from . import canned
+
+LOGGER = get_logger(__name__)
+
+STREAM_CHUNK_CHARS = 64
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "fars-llm-stub"
+
+    def log_message(self, fmt, *args):
+        LOGGER.debug(fmt, *args)
+
+    def _send(self, status: int, body: dict, headers: dict = None) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/stats":
+            self._send(404, {"error": {"message": f"no route {self.path}"}})
+            return
+        self._send(200, self.server.snapshot())
+
+    def do_POST(self):
+        stub = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        messages = body.get("messages", [])
+        system = next((m.get("content") or "" for m in messages if m.get("role") == "system"), "")
+        user = next((m.get("content") or "" for m in messages if m.get("role") == "user"), "")
+        prompt_type = self.headers.get("X-Prompt-Type") or canned.prompt_type_of(system)
+        with stub.lock:
+            stub.requests += 1
+            stub.by_type[prompt_type] += 1
+        if not self.path.split("?")[0].endswith("/chat/completions"):
+            self._send(404, {"error": {"message": f"no route {self.path}"}})
+            return
+        if random.random() < stub.error_rate_429 or not stub.admit():
+            with stub.lock:
+                stub.throttled += 1
+            self._send(429, {"error": {"code": "429", "message": "Rate limit is exceeded."}},
+                       {"Retry-After": str(stub.retry_after)})
+            return
+        if random.random() < stub.error_rate_500:
+            with stub.lock:
+                stub.errors += 1
+            self._send(500, {"error": {"code": "500", "message": "Stub server error."}})
+            return
+        time.sleep(stub.latency + random.random() * stub.jitter)
+        if stub.content is not None:
+            content = json.dumps(stub.content)
+        else:
+            content = canned.respond(system, user, prompt_type)
+        prompt_tokens = len(system + user) // 4 + 1
+        completion_tokens = len(content) // 4 + 1
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        head = {"id": f"chatcmpl-stub-{stub.requests}", "created": int(time.time()),
+                "model": body.get("model", "stub")}
+        if body.get("stream"):
+            self._stream(head, content, usage,
+                         (body.get("stream_options") or {}).get("include_usage"))
+            return
+        self._send(200, {
+            **head,
+            "object": "chat.completion",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        })
+
+    def _stream(self, head: dict, content: str, usage: dict, include_usage: bool) -> None:
+        """Server-sent chat.completion.chunk events; the connection close ends the body."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        def event(choices, **extra):
+            chunk = {**head, "object": "chat.completion.chunk", "choices": choices, **extra}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+
+        for i in range(0, len(content), STREAM_CHUNK_CHARS):
+            event([{"index": 0, "delta": {"content": content[i:i + STREAM_CHUNK_CHARS]},
+                    "finish_reason": None}])
+        event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if include_usage:
+            event([], usage=usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency_ms: float = 0, error_rate_429: float = 0.0,
+                 retry_after: float = 1, content: dict = None, rpm: float = None,
+                 error_rate_500: float = 0.0, jitter_ms: float = 0):
+        """content, when given, is returned for every prompt instead of canned.py's."""
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate_429 = error_rate_429
+        self.error_rate_500 = error_rate_500
+        self.retry_after = retry_after
+        self.content = content
+        self.per_second = rpm / 60 if rpm else None
+        self._quota = self.per_second
+        self._quota_at = time.monotonic()
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.by_type = Counter()
+
+    def admit(self) -> bool:
+        """Quota check: False when the request bucket is empty."""
+        if self.per_second is None:
+            return True
+        now = time.monotonic()
+        with self.lock:
+            self._quota = min(max(self.per_second, 1.0),
+                              self._quota + (now - self._quota_at) * self.per_second)
+            self._quota_at = now
+            if self._quota < 1:
+                return False
+            self._quota -= 1
+            return True
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {"requests": self.requests, "throttled": self.throttled,
+                    "errors": self.errors, "by_prompt_type": dict(self.by_type)}
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> "StubServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible LLM stub server")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--jitter-ms", type=float, default=0,
+                        help="extra uniform random latency per request")
+    parser.add_argument("--error-rate-429", type=float, default=0.0)
+    parser.add_argument("--error-rate-500", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1)
+    parser.add_argument("--rpm", type=float, help="requests-per-minute quota (429 beyond it)")
+    args = parser.parse_args()
+    server = StubServer(args.port, args.latency_ms, args.error_rate_429, args.retry_after,
+                        rpm=args.rpm, error_rate_500=args.error_rate_500,
+                        jitter_ms=args.jitter_ms)
+    LOGGER.info("LLM stub listening on %s", server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    LOGGER.info("LLM stub stats: %s", server.snapshot())
+
+
+if __name__ == "__main__":
+    main()
@@ -17,7 +17,7 @@ PLAN_SCHEMA = {
         "control": {"type": "string"},
         "treatment": {"type": "string"},
         "metric": {"type": "string"},
-        "budget_estimate_minutes": {"type": "integer"},
+        "budget_estimate_minutes": {"type": "number"},
     },
     "required": ["plan_summary", "variables", "control", "treatment", "metric"],
 }
@@ -38,7 +38,100 @@ METRICS_SCHEMA = {
         "secondary_metrics": {"type": "object"},
         "seed": {"type": "integer"},
         "config_hash": {"type": "string"},
-        "status": {"type": "string", "enum": ["SUCCESS", "FAIL"]},
+        "status": {"type": "string", "enum": ["SUCCESS", "FAIL", "ABORTED"]},
+        "abort_reason": {"type": "string"},
     },
     "required": ["run_id", "primary_metric", "status"],
 }
+
+# Free-form ideation / REVISE output.  "default" marks optional keys that are
+# filled locally when missing; required keys are re-asked (llm/structured.py).
+_METHOD_CHOICE = {"type": "string", "minLength": 1}
+
+RESEARCH_IDEA_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string", "minLength": 1},
+        "hypothesis": {"type": "string", "minLength": 1},
+        "method": {
+            "type": "object",
+            "properties": {
+                "training_strategy": _METHOD_CHOICE,
+                "data_processing": _METHOD_CHOICE,
+                "prompt_design": _METHOD_CHOICE,
+                "model_config": _METHOD_CHOICE,
+                "augmentation": _METHOD_CHOICE,
+                "key_innovation": {"type": "string", "default": ""},
+            },
+            "required": ["training_strategy", "data_processing", "prompt_design",
+                         "model_config", "augmentation"],
+        },
+        "config_hints": {
+            "type": "object",
+            "properties": {
+                "learning_rate": {"type": "number"},
+                "num_train_epochs": {"type": "integer"},
+                "lora_rank": {"type": "integer"},
+                "max_seq_length": {"type": "integer"},
+                "batch_size": {"type": "integer"},
+            },
+            "default": {},
+        },
+        "pattern_id": {"type": ["string", "null"], "default": None},
+        "rationale": {"type": "string", "default": ""},
+        "novelty_note": {"type": "string", "default": ""},
+    },
+    "required": ["title", "hypothesis", "method"],
+}
+
+GROUP_CONFIG_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "training_strategy": {"type": "string"},
+        "data_processing": {"type": "string"},
+        "prompt_design": {"type": "string"},
+        "model_config": {"type": "string"},
+        "augmentation": {"type": "string"},
+        "train": {
+            "type": "object",
+            "properties": {
+                "learning_rate": {"type": "number"},
+                "num_train_epochs": {"type": "number"},
+                "max_steps": {"type": "integer"},
+                "warmup_ratio": {"type": "number"},
+                "per_device_train_batch_size": {"type": "integer"},
+                "gradient_accumulation_steps": {"type": "integer"},
+                "max_seq_length": {"type": "integer"},
+            },
+        },
+        "lora": {
+            "type": "object",
+            "properties": {
+                "rank": {"type": "integer"},
+                "alpha": {"type": "integer"},
+                "dropout": {"type": "number"},
+                "target_modules": {"type": "array", "items": {"type": "string"}},
+            },
+        },
+        "data": {
+            "type": "object",
+            "properties": {
+                "max_train_samples": {"type": "integer"},
+                "max_eval_samples": {"type": "integer"},
+            },
+        },
+    },
+}
+
+EXPERIMENT_PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "plan_summary": {"type": "string", "minLength": 1},
+        "variables": {"type": "array", "items": {"type": "string"}, "default": []},
+        "baseline": GROUP_CONFIG_SCHEMA,
+        "treatment": {**GROUP_CONFIG_SCHEMA, "minProperties": 1},
+        "metric": {"type": "string"},
+        "budget_estimate_minutes": {"type": "number"},
+    },
+    "required": ["plan_summary", "treatment"],
+}
@@ -0,0 +1,111 @@
+"""Attribution of LLM calls to (project, stage, prompt type) and budget checks.
+
+state_machine.tick opens llm_context() around a stage with the project's
+Storage as the ledger and meta budget.tokens as the cap.  The router calls
+check_budget() before every billable request and record() after it, so
+token use is persisted per call and a project that has spent its budget
+stops with TokenBudgetExceeded instead of looping on retries or REVISE.
+Calls made outside a context are not accounted; build_kb opens one under
+the pseudo-project "kb_build".
+
+Worker threads do not inherit the context; submit work with
+contextvars.copy_context().run.
+
+    python -m src.llm.usage [--project P2026...] [--by stage --by prompt_type]
+"""
+
+import argparse
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from ..utils.time import utc_now
+
+
+class TokenBudgetExceeded(RuntimeError):
+    """The project has spent its budget.tokens."""
+
+
+@dataclass
+class CallContext:
+    ledger: object  # Storage: record_llm_call / tokens_used
+    project_id: str
+    stage: str
+    budget_tokens: Optional[int] = None
+
+
+_CONTEXT: contextvars.ContextVar = contextvars.ContextVar("llm_call_context", default=None)
+
+
+@contextmanager
+def llm_context(ledger, project_id: str, stage: str, budget_tokens: Optional[int] = None):
+    token = _CONTEXT.set(CallContext(ledger, project_id, stage, budget_tokens))
+    try:
+        yield
+    finally:
+        _CONTEXT.reset(token)
+
+
+def check_budget(prompt_type: str, estimated_tokens: int) -> None:
+    ctx = _CONTEXT.get()
+    if ctx is None or not ctx.budget_tokens:
+        return
+    used = ctx.ledger.tokens_used(ctx.project_id)
+    if used + estimated_tokens > ctx.budget_tokens:
+        raise TokenBudgetExceeded(
+            f"token budget exhausted for {ctx.project_id}: {used} used of "
+            f"{ctx.budget_tokens}, {prompt_type} call needs ~{estimated_tokens}"
+        )
+
+
+def record(prompt_type: str, model: str, prompt_tokens: int, completion_tokens: int,
+           latency_s: float, cached: bool = False, ok: bool = True,
+           sizes: Optional[tuple] = None) -> None:
+    """sizes: (prompt_chars, est_prompt_tokens, est_completion_tokens) for prompt_profile."""
+    ctx = _CONTEXT.get()
+    if ctx is None:
+        return
+    ctx.ledger.record_llm_call(
+        ctx.project_id, ctx.stage, prompt_type or "other", model,
+        prompt_tokens, completion_tokens, latency_s, cached, ok, utc_now(),
+        *(sizes or ()),
+    )
+
+
+def print_table(rows: list[dict]) -> None:
+    headers = list(rows[0])
+    cells = [["" if v is None else str(v) for v in r.values()] for r in rows]
+    widths = [max(len(h), *(len(c[i]) for c in cells)) for i, h in enumerate(headers)]
+    print("  ".join(h.ljust(w) for h, w in zip(headers, widths)))
+    print("  ".join("-" * w for w in widths))
+    for cell in cells:
+        print("  ".join(c.ljust(w) for c, w in zip(cell, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Where LLM tokens go")
+    parser.add_argument("--db", type=Path, default=Path("artifacts") / "fars.db")
+    parser.add_argument("--project", help="only this project")
+    parser.add_argument("--by", action="append", default=[],
+                        help="project_id, stage, prompt_type or model; repeatable")
+    args = parser.parse_args()
+
+    from ..orchestrator.storage import Storage
+
+    storage = Storage(args.db)
+    try:
+        rows = storage.llm_usage(tuple(args.by or ["stage", "prompt_type"]), args.project)
+    finally:
+        storage.close()
+    if not rows:
+        print("(no LLM calls recorded)")
+        return
+    print_table(rows)
+    total = sum(r["total_tokens"] or 0 for r in rows)
+    print(f"\n{total} tokens in {sum(r['calls'] for r in rows)} calls")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,20 +9,12 @@ from ..utils.log import get_logger
 LOGGER = get_logger(__name__)
 
 
-def gate_a_ideation(project_dir: Path, valid_action_ids: list = None) -> Tuple[bool, str]:
-    """Validate idea.json output.
+def check_idea(idea: dict, valid_action_ids: list = None) -> Tuple[bool, str]:
+    """Gate A rules on a parsed idea.
 
     For free-form ideation: checks hypothesis + method fields exist.
     For legacy action-based ideation: checks actions are valid.
     """
-    idea_path = project_dir / "00_idea" / "idea.json"
-    if not idea_path.exists():
-        return False, "idea.json not found"
-    try:
-        idea = json.loads(idea_path.read_text())
-    except json.JSONDecodeError as exc:
-        return False, f"idea.json parse error: {exc}"
-
     if "hypothesis" not in idea or not idea["hypothesis"]:
         return False, "missing hypothesis"
 
@@ -42,6 +34,18 @@ def gate_a_ideation(project_dir: Path, valid_action_ids: list = None) -> Tuple[b
     return False, "idea.json missing both 'method' and 'actions'"
 
 
+def gate_a_ideation(project_dir: Path, valid_action_ids: list = None) -> Tuple[bool, str]:
+    """Validate idea.json output (see check_idea)."""
+    idea_path = project_dir / "00_idea" / "idea.json"
+    if not idea_path.exists():
+        return False, "idea.json not found"
+    try:
+        idea = json.loads(idea_path.read_text())
+    except json.JSONDecodeError as exc:
+        return False, f"idea.json parse error: {exc}"
+    return check_idea(idea, valid_action_ids)
+
+
 def gate_b_experiment(project_dir: Path) -> Tuple[bool, str]:
     """Validate that experiment produced valid metrics.json files."""
     runs_dir = project_dir / "02_exp" / "runs"
@@ -52,6 +56,8 @@ def gate_b_experiment(project_dir: Path) -> Tuple[bool, str]:
         return False, "no run directories"
 
     success_count = 0
+    group_success = {}
+    diverged_groups = set()
     for rd in run_dirs:
         mf = rd / "metrics.json"
         if not mf.exists():
@@ -60,16 +66,27 @@ def gate_b_experiment(project_dir: Path) -> Tuple[bool, str]:
             m = json.loads(mf.read_text())
         except json.JSONDecodeError as exc:
             return False, f"metrics.json parse error in {rd.name}: {exc}"
-        if m.get("status") not in ("SUCCESS", "FAIL"):
+        if m.get("status") not in ("SUCCESS", "FAIL", "ABORTED"):
             return False, f"invalid status in {rd.name}"
+        if m.get("status") == "ABORTED" and not m.get("abort_reason"):
+            return False, f"aborted run without abort_reason in {rd.name}"
+        group = m.get("group", "unknown")
+        group_success.setdefault(group, 0)
         if m.get("status") == "SUCCESS":
             if "primary_metric" not in m:
                 return False, f"missing primary_metric in {rd.name}"
             success_count += 1
+            group_success[group] += 1
+        elif m.get("failure", {}).get("kind") == "divergence":
+            diverged_groups.add(group)
 
     if success_count == 0:
         return False, "all runs failed"
 
+    diverged = sorted(g for g in diverged_groups if group_success.get(g, 0) == 0)
+    if diverged:
+        return False, f"training diverged in all {', '.join(diverged)} runs"
+
     return True, "ok"
 
 
@@ -9,10 +9,13 @@ from typing import Optional
 
 import yaml
 
+from ..compute.memory_planner import DEFAULT_SAFETY
 from ..utils.log import get_logger
 
 LOGGER = get_logger(__name__)
 
+MAX_MEMORY_SAFETY = 2.0
+
 
 @dataclass
 class RecoveryAction:
@@ -20,6 +23,7 @@ class RecoveryAction:
     retry: bool
     description: str = ""
     config_patch: dict = field(default_factory=dict)
+    next_state: Optional[str] = None  # state to resume from instead of the failed one
 
 
 # ---------------------------------------------------------------------------
@@ -33,6 +37,7 @@ _INFRA_PATTERNS = [
     r"PermissionError",
     r"NODE_FAIL",
     r"PREEMPTED",
+    r"STALLED",
     r"ConnectionError",
     r"OSError.*No space left",
 ]
@@ -135,6 +140,17 @@ def _fix_resource(error_msg: str, project_dir: Path) -> RecoveryAction:
         current_batch = train.get("per_device_train_batch_size", 4)
         current_seq = train.get("max_seq_length", 2048)
         current_grad = train.get("gradient_accumulation_steps", 4)
+        current_safety = train.get("memory_safety", DEFAULT_SAFETY)
+
+        if train.get("auto_batch", True) and current_safety < MAX_MEMORY_SAFETY:
+            # The batch planner underestimated: widen its margin and let it
+            # re-plan rather than halving a batch it will override anyway.
+            new_safety = round(min(current_safety + 0.25, MAX_MEMORY_SAFETY), 2)
+            train["memory_safety"] = new_safety
+            patch[f"{group}.memory_safety"] = f"{current_safety} -> {new_safety}"
+            cfg["train"] = train
+            config[group] = cfg
+            continue
 
         if current_batch > 1:
             new_batch = max(1, current_batch // 2)
@@ -182,6 +198,20 @@ def _fix_logic(error_msg: str, project_dir: Path, stage: str) -> RecoveryAction:
             description="Planning output invalid, retrying",
         )
 
+    if stage == "PREFLIGHT":
+        from ..agents.planning_enhanced import record_preflight_errors
+
+        try:
+            record_preflight_errors(project_dir, error_msg.removeprefix("Preflight: "))
+        except (OSError, ValueError) as exc:
+            LOGGER.warning("could not record preflight errors: %s", exc)
+        return RecoveryAction(
+            strategy="replan_after_preflight",
+            retry=True,
+            description="Plan failed preflight, re-running planning",
+            next_state="PLAN",
+        )
+
     if stage == "RUN":
         if "nan" in error_msg.lower():
             config_path = project_dir / "01_plan" / "config.yaml"
@@ -221,6 +251,64 @@ def _fix_logic(error_msg: str, project_dir: Path, stage: str) -> RecoveryAction:
     )
 
 
+def load_failure_records(project_dir: Path) -> list[dict]:
+    """Collect unhandled structured failure records written by training runs."""
+    runs_dir = project_dir / "02_exp" / "runs"
+    if not runs_dir.exists():
+        return []
+    records = []
+    for fp in sorted(runs_dir.glob("*/failure.json")):
+        try:
+            record = json.loads(fp.read_text())
+        except json.JSONDecodeError:
+            continue
+        mf = fp.parent / "metrics.json"
+        if mf.exists():
+            try:
+                record.setdefault("group", json.loads(mf.read_text()).get("group"))
+            except json.JSONDecodeError:
+                pass
+        record["run_id"] = fp.parent.name
+        record["path"] = str(fp)
+        records.append(record)
+    return records
+
+
+def _fix_divergence(records: list[dict], project_dir: Path) -> RecoveryAction:
+    """Act on in-training divergence records: stabilise only the groups that diverged."""
+    groups = sorted({r.get("group") for r in records if r.get("group")}) or ["baseline", "treatment"]
+    reasons = sorted({r["reason"] for r in records})
+    config_path = project_dir / "01_plan" / "config.yaml"
+    patch = {}
+    if config_path.exists():
+        config = yaml.safe_load(config_path.read_text())
+        for group in groups:
+            train = config.get(group, {}).get("train", {})
+            current_lr = train.get("learning_rate", 2e-5)
+            train["learning_rate"] = current_lr * 0.5
+            train["warmup_ratio"] = min(0.2, train.get("warmup_ratio", 0.1) + 0.05)
+            patch[f"{group}.learning_rate"] = f"{current_lr} -> {train['learning_rate']}"
+            if "grad_norm_explosion" in reasons or "nan_grad_norm" in reasons:
+                train["max_grad_norm"] = min(train.get("max_grad_norm", 1.0), 0.5)
+                patch[f"{group}.max_grad_norm"] = train["max_grad_norm"]
+            config.setdefault(group, {})["train"] = train
+        config_path.write_text(yaml.dump(config, default_flow_style=False))
+
+    for r in records:
+        fp = Path(r["path"])
+        if fp.exists():
+            fp.rename(fp.with_name("failure.handled.json"))
+
+    steps = ", ".join(f"{r['run_id']}@{r['step']}" for r in records)
+    return RecoveryAction(
+        strategy="fix_divergence",
+        retry=True,
+        description=f"Training diverged ({', '.join(reasons)}; {steps}): "
+                    f"halved learning rate, increased warmup for {groups}",
+        config_patch=patch,
+    )
+
+
 # ---------------------------------------------------------------------------
 # Main diagnosis entry point
 # ---------------------------------------------------------------------------
@@ -242,13 +330,18 @@ def diagnose_and_recover(
     Returns:
         RecoveryAction with strategy, retry flag, and description
     """
-    category = classify_error(error_msg)
+    divergences = []
+    if stage == "RUN" and "diverged" in error_msg:
+        divergences = [r for r in load_failure_records(project_dir) if r.get("kind") == "divergence"]
+    category = "divergence" if divergences else classify_error(error_msg)
     LOGGER.info("error classified as '%s' in stage %s", category, stage)
 
     recovery_history = meta.get("recovery_history", [])
     past_strategies = {r.get("strategy") for r in recovery_history}
 
-    if category == "infrastructure":
+    if category == "divergence":
+        action = _fix_divergence(divergences, project_dir)
+    elif category == "infrastructure":
         action = _fix_infrastructure(error_msg, project_dir, stage)
     elif category == "resource":
         if "reduce_resources" in past_strategies:
@@ -259,7 +352,7 @@ def diagnose_and_recover(
             )
         else:
             action = _fix_resource(error_msg, project_dir)
-    elif category == "logic":
+    elif category == "logic" or stage == "PREFLIGHT":
         action = _fix_logic(error_msg, project_dir, stage)
     else:
         action = RecoveryAction(
@@ -294,6 +387,8 @@ def run_revise(project_dir: Path, repo_root: Path) -> bool:
     """
     from ..llm.prompts import REVISE_SYSTEM, REVISE_USER
     from ..llm.router import get_router
+    from ..llm.structured import generate_json
+    from ..llm.tool_schemas import RESEARCH_IDEA_SCHEMA
 
     idea_path = project_dir / "00_idea" / "idea.json"
     if not idea_path.exists():
@@ -321,8 +416,8 @@ def run_revise(project_dir: Path, repo_root: Path) -> bool:
 
     try:
         router = get_router("azure_gpt4o")
-        raw = router.generate(REVISE_SYSTEM, user_prompt, json_mode=True)
-        revised_idea = json.loads(raw)
+        revised_idea = generate_json(router, REVISE_SYSTEM, user_prompt, RESEARCH_IDEA_SCHEMA,
+                                     prompt_type="revise")
 
         revised_idea["revised_from"] = idea.get("title", "unknown")
         revised_idea["revision_count"] = idea.get("revision_count", 0) + 1
@@ -353,19 +448,21 @@ def handle_slurm_failure(job_state: str, project_dir: Path, meta: dict) -> Recov
         )
 
     if job_state == "TIMEOUT":
-        slurm_cfg_path = project_dir.parent.parent / "config" / "system.yaml"
-        if slurm_cfg_path.exists():
-            sys_cfg = yaml.safe_load(slurm_cfg_path.read_text())
-            current_time = sys_cfg.get("slurm", {}).get("time", "06:00:00")
-            hours = int(current_time.split(":")[0])
-            new_hours = min(hours * 2, 24)
-            sys_cfg.setdefault("slurm", {})["time"] = f"{new_hours:02d}:00:00"
-            slurm_cfg_path.write_text(yaml.dump(sys_cfg, default_flow_style=False))
-
+        # Per-project: the runtime model under-predicted this workload, so
+        # scale its limit up instead of raising the global default.
+        scale = min(meta.get("slurm_time_scale", 1.0) * 2, 8.0)
+        meta["slurm_time_scale"] = scale
         return RecoveryAction(
             strategy="extend_slurm_timeout",
             retry=True,
-            description=f"Extended Slurm time limit",
+            description=f"Scaled this project's Slurm time limit by {scale:g}x",
+        )
+
+    if job_state == "STALLED":
+        return RecoveryAction(
+            strategy="resubmit_stalled",
+            retry=True,
+            description="Job heartbeat went stale (hung dataloader/download?), resubmitting",
         )
 
     if job_state == "NODE_FAIL":
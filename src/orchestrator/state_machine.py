@@ -5,6 +5,7 @@ from pathlib import Path
 
 import yaml
 
+from ..llm.usage import TokenBudgetExceeded, llm_context
 from ..utils.log import get_logger
 from ..utils.time import utc_now
 from .gates import gate_a_ideation, gate_b_experiment, gate_c_paper
@@ -13,7 +14,7 @@ from .storage import Storage
 
 LOGGER = get_logger(__name__)
 
-TRANSITIONS = ["IDEA", "PLAN", "RUN", "ANALYZE", "WRITE", "PUBLISH", "DONE"]
+TRANSITIONS = ["IDEA", "PLAN", "PREFLIGHT", "RUN", "ANALYZE", "WRITE", "PUBLISH", "DONE"]
 MAX_RETRIES = 3
 MAX_REVISIONS = 1
 
@@ -56,6 +57,8 @@ def _smart_fail_or_retry(
 
     if action.retry and meta["retry_count"] <= MAX_RETRIES:
         meta["failure_reason"] = reason
+        if action.next_state:
+            meta["state"] = action.next_state
         _save_meta(project_dir, meta)
         storage.update_state(pid, meta["state"], meta)
         LOGGER.warning(
@@ -78,14 +81,106 @@ def _smart_fail_or_retry(
             LOGGER.info("project %s: REVISED idea, restarting from PLAN", pid)
             return "PLAN"
 
+    return _abort(project_dir, meta, storage, reason)
+
+
+def _abort(project_dir: Path, meta: dict, storage: Storage, reason: str) -> str:
     meta["state"] = "ABORT"
     meta["failure_reason"] = reason
     _save_meta(project_dir, meta)
-    storage.update_state(pid, "ABORT", meta)
-    LOGGER.error("project %s ABORT: %s", pid, reason)
+    storage.update_state(meta["project_id"], "ABORT", meta)
+    LOGGER.error("project %s ABORT: %s", meta["project_id"], reason)
     return "ABORT"
 
 
+def _system_section(repo_root: Path, section: str) -> dict:
+    sys_path = repo_root / "config" / "system.yaml"
+    if sys_path.exists():
+        cfg = yaml.safe_load(sys_path.read_text()) or {}
+        return cfg.get(section, {})
+    return {}
+
+
+def _dedupe_plan(project_dir: Path, repo_root: Path, meta: dict, dedupe_cfg: dict):
+    """Check the new plan against already-run treatments.
+
+    Returns the state to move to instead of PREFLIGHT/RUN, or None to run
+    the plan.  A match with the same baseline is reused (its run metrics are
+    linked and RUN is skipped) when on_duplicate is "reuse"; otherwise, or
+    when only the treatment matches, ideation is asked for a different idea
+    up to max_reideations times.
+    """
+    from ..agents.ideation_enhanced import record_rejected_idea
+    from ..knowledge.config_index import find_duplicate, link_results, open_kg
+
+    pid = meta["project_id"]
+    kg = open_kg(repo_root)
+    try:
+        dup = find_duplicate(kg, project_dir, pid)
+    finally:
+        kg.close()
+    if dup is None:
+        return None
+
+    if dedupe_cfg.get("on_duplicate", "reuse") == "reuse" and dup["same_baseline"]:
+        n = link_results(Path(dup["project_dir"]), project_dir, dup["project_id"])
+        ok, msg = gate_b_experiment(project_dir)
+        if ok:
+            meta["reused_results_from"] = dup["project_id"]
+            LOGGER.info("project %s: plan duplicates %s, linked %d runs and skipping RUN",
+                        pid, dup["project_id"], n)
+            return "ANALYZE"
+        LOGGER.warning("project %s: results of %s not reusable (%s)", pid, dup["project_id"], msg)
+        return None
+
+    reideations = meta.get("dedupe_reideations", 0)
+    if reideations >= dedupe_cfg.get("max_reideations", 2):
+        LOGGER.info("project %s: treatment duplicates %s, re-ideation limit reached, running it",
+                    pid, dup["project_id"])
+        return None
+    record_rejected_idea(project_dir, f"same treatment config as {dup['project_id']}")
+    meta["dedupe_reideations"] = reideations + 1
+    LOGGER.info("project %s: treatment duplicates %s, asking ideation for another idea",
+                pid, dup["project_id"])
+    return "IDEA"
+
+
+def _admit_plan(project_dir: Path, repo_root: Path, meta: dict, sur_cfg: dict):
+    """Surrogate admission: send plans with too little expected improvement
+    back to ideation (at most surrogate.max_rejections times). Returns the
+    state to move to instead of PREFLIGHT/RUN, or None to run the plan."""
+    from ..agents.ideation_enhanced import record_rejected_idea
+    from ..knowledge.surrogate import assess_plan
+
+    pid = meta["project_id"]
+    try:
+        score = assess_plan(project_dir, repo_root, sur_cfg)
+    except Exception as exc:
+        LOGGER.warning("surrogate unavailable for %s: %s", pid, exc)
+        return None
+    if score is None:
+        return None
+    meta["surrogate"] = {k: score[k] for k in
+                         ("predicted_effect", "uncertainty", "expected_improvement")}
+    if score["admit"]:
+        return None
+
+    rejections = meta.get("surrogate_rejections", 0)
+    if rejections >= sur_cfg.get("max_rejections", 2):
+        LOGGER.info("project %s: low expected improvement, rejection limit reached, running it",
+                    pid)
+        return None
+    record_rejected_idea(
+        project_dir,
+        f"predicted effect {score['predicted_effect']:+.4f} +/- {score['uncertainty']:.4f} "
+        "from past results is unlikely to beat the baseline",
+    )
+    meta["surrogate_rejections"] = rejections + 1
+    LOGGER.info("project %s: expected improvement %.5f below threshold, re-ideating",
+                pid, score["expected_improvement"])
+    return "IDEA"
+
+
 def tick(project_dir: Path, repo_root: Path, storage: Storage) -> str:
     """Advance one state. Returns new state string."""
     meta = _load_meta(project_dir)
@@ -95,6 +190,19 @@ def tick(project_dir: Path, repo_root: Path, storage: Storage) -> str:
     if state in ("DONE", "ABORT"):
         return state
 
+    budget = meta.get("budget", {}).get("tokens")
+    used = storage.tokens_used(pid)
+    if budget and used >= budget:
+        return _abort(project_dir, meta, storage,
+                      f"token budget exhausted: {used} of {budget} tokens used")
+
+    with llm_context(storage, pid, state, budget):
+        return _advance(project_dir, repo_root, storage, meta)
+
+
+def _advance(project_dir: Path, repo_root: Path, storage: Storage, meta: dict) -> str:
+    state = meta["state"]
+    pid = meta["project_id"]
     LOGGER.info("tick project=%s state=%s", pid, state)
 
     try:
@@ -122,35 +230,60 @@ def tick(project_dir: Path, repo_root: Path, storage: Storage) -> str:
             else:
                 from ..agents.planning import run_planning
                 run_planning(project_dir, repo_root)
+            preflight_on = _system_section(repo_root, "preflight").get("enabled", True)
+            next_state = "PREFLIGHT" if preflight_on else "RUN"
+            dedupe_cfg = _system_section(repo_root, "dedupe")
+            if dedupe_cfg.get("enabled", True):
+                next_state = _dedupe_plan(project_dir, repo_root, meta, dedupe_cfg) or next_state
+            sur_cfg = _system_section(repo_root, "surrogate")
+            if next_state in ("PREFLIGHT", "RUN") and sur_cfg.get("enabled", True):
+                next_state = _admit_plan(project_dir, repo_root, meta, sur_cfg) or next_state
+            meta["state"] = next_state
+
+        elif state == "PREFLIGHT":
+            from ..agents.preflight import run_preflight
+            ok, msg = run_preflight(project_dir, repo_root, _system_section(repo_root, "preflight"))
+            if not ok:
+                return _smart_fail_or_retry(
+                    project_dir, repo_root, meta, storage, f"Preflight: {msg}", "PREFLIGHT"
+                )
+            LOGGER.info("preflight passed for %s: %s", pid, msg)
             meta["state"] = "RUN"
 
         elif state == "RUN":
-            from ..compute.sbatch_gen import generate_sbatch_script
-            from ..compute.slurm_runner import submit_job, poll_job
+            from ..compute.backends import get_backend
+            from ..compute.heartbeat import heartbeat_path
 
             sys_cfg = yaml.safe_load(
                 (repo_root / "config" / "system.yaml").read_text()
             )
-            slurm_cfg = sys_cfg.get("slurm", {})
-            log_dir = repo_root / "artifacts" / "slurm_logs" / pid
-            script = generate_sbatch_script(project_dir, repo_root, log_dir, slurm_cfg)
-
-            job_id = submit_job(script, "fars_" + pid, log_dir, slurm_cfg)
-            meta["slurm_job_id"] = job_id
+            hb_path = heartbeat_path(project_dir)
+            if hb_path.exists():
+                hb_path.unlink()
+
+            backend = get_backend(repo_root, sys_cfg)
+            handle = backend.submit(project_dir, repo_root, meta)
+            meta["compute_backend"] = backend.name
+            meta["job_handle"] = handle
             _save_meta(project_dir, meta)
             storage.update_state(pid, "RUN", meta)
 
-            LOGGER.info("experiment submitted as slurm job %d, polling...", job_id)
-            job_state = poll_job(
-                job_id, timeout_minutes=slurm_cfg.get("timeout_minutes", 180)
+            LOGGER.info("experiment submitted to %s backend as %s, waiting...",
+                        backend.name, handle)
+            slurm_cfg = sys_cfg.get("slurm", {})
+            job_state = backend.wait(
+                handle,
+                timeout_minutes=slurm_cfg.get("timeout_minutes", 180),
+                heartbeat_path=hb_path,
+                stall_minutes=slurm_cfg.get("stall_timeout_minutes"),
             )
 
             if job_state != "COMPLETED":
                 slurm_action = handle_slurm_failure(job_state, project_dir, meta)
-                err_log = _read_slurm_error_log(log_dir, job_id)
-                reason = f"Slurm job {job_id}: {job_state}"
-                if err_log:
-                    reason += f"\n{err_log}"
+                reason = f"{backend.name} job {handle}: {job_state}"
+                detail = backend.failure_detail(handle)
+                if detail:
+                    reason += f"\n{detail}"
                 return _smart_fail_or_retry(
                     project_dir, repo_root, meta, storage, reason, "RUN"
                 )
@@ -160,16 +293,30 @@ def tick(project_dir: Path, repo_root: Path, storage: Storage) -> str:
                 return _smart_fail_or_retry(
                     project_dir, repo_root, meta, storage, f"Gate B: {msg}", "RUN"
                 )
+            try:
+                from ..knowledge.config_index import open_kg, register_project
+                kg = open_kg(repo_root)
+                try:
+                    register_project(kg, project_dir, pid)
+                finally:
+                    kg.close()
+            except Exception as exc:
+                LOGGER.warning("could not index config of %s: %s", pid, exc)
             meta["state"] = "ANALYZE"
 
         elif state == "ANALYZE":
             from ..eval.evaluator import run_evaluation
             run_evaluation(project_dir)
+            try:
+                from ..eval.warehouse import ingest
+                ingest(repo_root, project_dir, pid)
+            except Exception as exc:
+                LOGGER.warning("could not add %s to the results warehouse: %s", pid, exc)
             meta["state"] = "WRITE"
 
         elif state == "WRITE":
             from ..agents.writing import run_writing
-            run_writing(project_dir)
+            run_writing(project_dir, _system_section(repo_root, "writing"))
             ok, msg = gate_c_paper(project_dir)
             if not ok:
                 return _smart_fail_or_retry(
@@ -182,6 +329,9 @@ def tick(project_dir: Path, repo_root: Path, storage: Storage) -> str:
             run_publish(project_dir)
             meta["state"] = "DONE"
 
+    except TokenBudgetExceeded as exc:
+        # retrying or REVISE would only spend more of an exhausted budget
+        return _abort(project_dir, meta, storage, str(exc))
     except Exception as exc:
         LOGGER.exception("tick failed for %s at %s", pid, state)
         return _smart_fail_or_retry(
@@ -192,15 +342,3 @@ def tick(project_dir: Path, repo_root: Path, storage: Storage) -> str:
     storage.update_state(pid, meta["state"], meta)
     LOGGER.info("project %s -> %s", pid, meta["state"])
     return meta["state"]
-
-
-def _read_slurm_error_log(log_dir: Path, job_id: int, max_chars: int = 2000) -> str:
-    """Read the last portion of a Slurm .err log file."""
-    err_file = log_dir / f"{job_id}.err"
-    if not err_file.exists():
-        return ""
-    try:
-        text = err_file.read_text()
-        return text[-max_chars:] if len(text) > max_chars else text
-    except Exception:
-        return ""
@@ -1,7 +1,13 @@
-"""SQLite-backed project registry with row-level locking."""
+"""SQLite-backed project registry with row-level locking.
+
+Also holds the LLM call ledger (llm_calls): one row per request with its
+tokens and latency, attributed to project, stage and prompt type, plus the
+prompt size and offline token estimates that prompt_profile.py reports on.
+"""
 
 import json
 import sqlite3
+import threading
 from pathlib import Path
 from typing import Optional
 
@@ -21,16 +27,45 @@ CREATE TABLE IF NOT EXISTS projects (
     updated_at TEXT NOT NULL,
     meta_json TEXT NOT NULL
 );
+
+CREATE TABLE IF NOT EXISTS llm_calls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    prompt_type TEXT NOT NULL,
+    model TEXT,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    latency_s REAL NOT NULL,
+    cached INTEGER NOT NULL DEFAULT 0,
+    ok INTEGER NOT NULL DEFAULT 1,
+    created_at TEXT NOT NULL,
+    prompt_chars INTEGER,
+    est_prompt_tokens INTEGER,
+    est_completion_tokens INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_llm_calls_project ON llm_calls(project_id);
 """
 
+# columns added after llm_calls was first created, for existing databases
+_LLM_CALLS_ADDED = ("prompt_chars", "est_prompt_tokens", "est_completion_tokens")
+
+USAGE_GROUPS = ("project_id", "stage", "prompt_type", "model")
+
 
 class Storage:
     def __init__(self, db_path: Path):
         self._db_path = db_path
-        self._conn = sqlite3.connect(str(db_path), timeout=10)
+        # LLM calls are recorded from worker threads (batched ideation)
+        self._conn = sqlite3.connect(str(db_path), timeout=10, check_same_thread=False)
+        self._lock = threading.Lock()
         self._conn.row_factory = sqlite3.Row
         self._conn.execute("PRAGMA journal_mode=WAL")
         self._conn.executescript(_DDL)
+        have = {r["name"] for r in self._conn.execute("PRAGMA table_info(llm_calls)")}
+        for col in _LLM_CALLS_ADDED:
+            if col not in have:
+                self._conn.execute(f"ALTER TABLE llm_calls ADD COLUMN {col} INTEGER")
 
     def register(self, project_id: str, project_dir: str, meta: dict) -> None:
         self._conn.execute(
@@ -103,5 +138,68 @@ class Storage:
         ).fetchall()
         return [dict(r) for r in rows]
 
+    def record_llm_call(self, project_id: str, stage: str, prompt_type: str, model: str,
+                        prompt_tokens: int, completion_tokens: int, latency_s: float,
+                        cached: bool, ok: bool, created_at: str,
+                        prompt_chars: Optional[int] = None,
+                        est_prompt_tokens: Optional[int] = None,
+                        est_completion_tokens: Optional[int] = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO llm_calls (project_id, stage, prompt_type, model, prompt_tokens, "
+                "completion_tokens, latency_s, cached, ok, created_at, prompt_chars, "
+                "est_prompt_tokens, est_completion_tokens) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (project_id, stage, prompt_type, model, prompt_tokens, completion_tokens,
+                 latency_s, int(cached), int(ok), created_at, prompt_chars,
+                 est_prompt_tokens, est_completion_tokens),
+            )
+            self._conn.commit()
+
+    def tokens_used(self, project_id: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COALESCE(SUM(prompt_tokens + completion_tokens), 0) "
+                "FROM llm_calls WHERE project_id = ?",
+                (project_id,),
+            ).fetchone()
+        return row[0]
+
+    def llm_usage(self, by: tuple = ("stage", "prompt_type"),
+                  project_id: Optional[str] = None) -> list[dict]:
+        """Calls, tokens and latency grouped by columns of USAGE_GROUPS."""
+        for col in by:
+            if col not in USAGE_GROUPS:
+                raise ValueError(f"cannot group LLM usage by {col!r}")
+        cols = ", ".join(by)
+        where, params = ("WHERE project_id = ?", (project_id,)) if project_id else ("", ())
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {cols}, COUNT(*) AS calls, SUM(cached) AS cached, "
+                "SUM(1 - ok) AS errors, SUM(prompt_tokens) AS prompt_tokens, "
+                "SUM(completion_tokens) AS completion_tokens, "
+                "SUM(prompt_tokens + completion_tokens) AS total_tokens, "
+                "ROUND(AVG(CASE WHEN cached = 0 THEN latency_s END), 3) AS mean_latency_s "
+                f"FROM llm_calls {where} GROUP BY {cols} ORDER BY total_tokens DESC",
+                params,
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def llm_call_sizes(self, project_id: Optional[str] = None) -> list[dict]:
+        """Prompt sizes of the successful, billed calls (cache hits carry no usage)."""
+        where = "WHERE cached = 0 AND ok = 1 AND prompt_chars IS NOT NULL"
+        params = ()
+        if project_id:
+            where += " AND project_id = ?"
+            params = (project_id,)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT project_id, stage, prompt_type, model, prompt_chars, prompt_tokens, "
+                "est_prompt_tokens, completion_tokens, est_completion_tokens, latency_s "
+                f"FROM llm_calls {where}",
+                params,
+            ).fetchall()
+        return [dict(r) for r in rows]
+
     def close(self) -> None:
         self._conn.close()
@@ -0,0 +1,160 @@
+"""Lease-based RUN work queue shared by the daemon and pilot workers.
+
+Lives in artifacts/fars.db next to the projects table.  A worker claims the
+oldest pending item inside a BEGIN IMMEDIATE transaction and holds it under
+a time-limited lease it must keep renewing.  Items whose lease expired
+(worker crashed or lost its node) are handed out again until max_attempts
+is reached, so no claim is ever lost or run twice concurrently.
+"""
+
+import sqlite3
+import time
+from pathlib import Path
+from typing import Optional
+
+from ..utils.log import get_logger
+from ..utils.time import utc_now
+
+LOGGER = get_logger(__name__)
+
+PENDING = "PENDING"
+CLAIMED = "CLAIMED"
+COMPLETED = "COMPLETED"
+FAILED = "FAILED"
+CANCELLED = "CANCELLED"
+
+_DDL = """
+CREATE TABLE IF NOT EXISTS run_queue (
+    work_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project_id TEXT NOT NULL,
+    project_dir TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'PENDING',
+    worker_id TEXT,
+    lease_expires_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 2,
+    error TEXT,
+    enqueued_at TEXT NOT NULL,
+    claimed_at TEXT,
+    finished_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_run_queue_state ON run_queue(state, work_id);
+"""
+
+
+class WorkQueue:
+    def __init__(self, db_path: Path):
+        self._db_path = db_path
+        # autocommit mode so claim() controls its own BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(str(db_path), timeout=30, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_DDL)
+
+    def enqueue(self, project_id: str, project_dir: str, max_attempts: int = 2) -> int:
+        """Queue RUN work for a project; returns the existing item if one is live."""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._conn.execute(
+                "SELECT work_id FROM run_queue WHERE project_id = ? AND state IN (?, ?)",
+                (project_id, PENDING, CLAIMED),
+            ).fetchone()
+            if row is not None:
+                work_id = row["work_id"]
+            else:
+                cur = self._conn.execute(
+                    "INSERT INTO run_queue (project_id, project_dir, max_attempts, enqueued_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (project_id, project_dir, max_attempts, utc_now()),
+                )
+                work_id = cur.lastrowid
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        return work_id
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[dict]:
+        """Atomically take the oldest pending item, first reclaiming expired leases."""
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._reclaim_expired(now)
+            row = self._conn.execute(
+                "SELECT * FROM run_queue WHERE state = ? ORDER BY work_id LIMIT 1",
+                (PENDING,),
+            ).fetchone()
+            if row is None:
+                self._conn.execute("COMMIT")
+                return None
+            self._conn.execute(
+                "UPDATE run_queue SET state = ?, worker_id = ?, lease_expires_at = ?, "
+                "attempts = attempts + 1, claimed_at = ? WHERE work_id = ?",
+                (CLAIMED, worker_id, now + lease_seconds, utc_now(), row["work_id"]),
+            )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        item = dict(row)
+        item.update(state=CLAIMED, worker_id=worker_id, attempts=row["attempts"] + 1)
+        LOGGER.info("worker %s claimed work %d (project %s, attempt %d)",
+                    worker_id, item["work_id"], item["project_id"], item["attempts"])
+        return item
+
+    def _reclaim_expired(self, now: float) -> None:
+        expired = self._conn.execute(
+            "SELECT work_id, worker_id, attempts, max_attempts FROM run_queue "
+            "WHERE state = ? AND lease_expires_at < ?",
+            (CLAIMED, now),
+        ).fetchall()
+        for row in expired:
+            if row["attempts"] >= row["max_attempts"]:
+                state, error = FAILED, f"lease expired on worker {row['worker_id']}"
+            else:
+                state, error = PENDING, None
+            self._conn.execute(
+                "UPDATE run_queue SET state = ?, worker_id = NULL, lease_expires_at = NULL, "
+                "error = ?, finished_at = ? WHERE work_id = ?",
+                (state, error, utc_now() if state == FAILED else None, row["work_id"]),
+            )
+            LOGGER.warning("work %d lease expired on %s -> %s",
+                           row["work_id"], row["worker_id"], state)
+
+    def renew(self, work_id: int, worker_id: str, lease_seconds: float) -> bool:
+        """Extend the lease; False means the claim was lost (expired and reclaimed)."""
+        cur = self._conn.execute(
+            "UPDATE run_queue SET lease_expires_at = ? "
+            "WHERE work_id = ? AND worker_id = ? AND state = ?",
+            (time.time() + lease_seconds, work_id, worker_id, CLAIMED),
+        )
+        return cur.rowcount == 1
+
+    def finish(self, work_id: int, worker_id: str, state: str, error: str = None) -> bool:
+        """Record the outcome; ignored unless the caller still holds the claim."""
+        cur = self._conn.execute(
+            "UPDATE run_queue SET state = ?, error = ?, finished_at = ?, lease_expires_at = NULL "
+            "WHERE work_id = ? AND worker_id = ? AND state = ?",
+            (state, error, utc_now(), work_id, worker_id, CLAIMED),
+        )
+        return cur.rowcount == 1
+
+    def cancel(self, work_id: int) -> None:
+        self._conn.execute(
+            "UPDATE run_queue SET state = ?, finished_at = ? WHERE work_id = ? AND state IN (?, ?)",
+            (CANCELLED, utc_now(), work_id, PENDING, CLAIMED),
+        )
+
+    def get(self, work_id: int) -> Optional[dict]:
+        row = self._conn.execute(
+            "SELECT * FROM run_queue WHERE work_id = ?", (work_id,)
+        ).fetchone()
+        return dict(row) if row is not None else None
+
+    def count(self, state: str) -> int:
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM run_queue WHERE state = ?", (state,)
+        ).fetchone()[0]
+
+    def close(self) -> None:
+        self._conn.close()